@@ -3,44 +3,46 @@ from tkinter import ttk, filedialog, messagebox
 from tkcalendar import DateEntry
 import json
 import os
-import shutil
 import threading
-import time
 import subprocess
 import sys
 from datetime import datetime, timedelta
 import logging
+from collections import deque
 import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from email.header import Header
 
+from publish_engine import (
+    DEFAULT_PUBLISH_OPTIONS, HISTORY_PAGE_SIZE, HISTORY_SEARCH_LIMIT, PUBLISH_META_SUFFIX, RETRY_MAX_DELAY,
+    NetUseSessionManager, PublishEngine, PublishListener, format_duration, format_file_size, group_report_records
+)
 
-class WebsitePublisher:
+# 發布進行中取樣進度並更新進度條的間隔（毫秒）
+PROGRESS_POLL_MS = 500
+
+# 日誌控制台：取出緩衝區的間隔（毫秒）、保留行數，超過保留行數再多少行時整批刪除
+CONSOLE_POLL_MS = 200
+CONSOLE_MAX_LINES = 1000
+CONSOLE_TRIM_LINES = 200
+
+
+class WebsitePublisher(PublishListener):
     def __init__(self):
         self.root = tk.Tk()
         self.root.title("網站發布助手")
         self.root.geometry("900x800")
         self.root.configure(bg='#f0f0f0')
         
-        # 設置LOG記錄
-        self.setup_logging()
-        
-        # 設定數據
-        self.config = {
-            'source_files': [],
-            'delete_files': [],
-            'servers': [],
-            'schedule_time': None,
-            'smtp_config': {
-                'smtp_server': '',
-                'smtp_port': 587,
-                'username': '',
-                'password': '',
-                'use_tls': True
-            },
-            'notification_emails': []
-        }
+        # 發布引擎（LOG記錄、設定數據、快取與網路連線），GUI 以事件接收者身分接收發布進度與結果
+        self.engine = PublishEngine()
+        self.engine.add_listener(self)
+        self.config = self.engine.config
+        self.logger = self.engine.logger
+        
+        # 發布進行中定時取樣進度的排程
+        self.progress_poll_id = None
+        
+        # GUI日誌處理器（在create_gui後設置）
+        self.gui_log_handler = None
         
         # 定時器變量
         self.publish_timer = None
@@ -56,49 +58,6 @@ class WebsitePublisher:
         # 設置GUI日誌處理器
         self.setup_gui_logging()
         
-        # 初始化進度相關變數
-        self.total_files = 0
-        self.processed_files = 0
-        
-        # 初始化發布報告變數
-        self.publish_report = {
-            'servers': {},
-            'start_time': None,
-            'end_time': None,
-            'total_stats': {
-                'new_files': 0,
-                'updated_files': 0,
-                'skipped_files': 0,
-                'deleted_files': 0
-            }
-        }
-        
-    def setup_logging(self):
-        """設置LOG記錄"""
-        # 創建logs目錄
-        if not os.path.exists('logs'):
-            os.makedirs('logs')
-            
-        # 設置日誌格式
-        log_format = '%(asctime)s - %(levelname)s - %(message)s'
-        
-        # 配置日誌
-        logging.basicConfig(
-            level=logging.INFO,
-            format=log_format,
-            handlers=[
-                logging.FileHandler(f'logs/publish_{datetime.now().strftime("%Y%m%d")}.log', encoding='utf-8'),
-                logging.StreamHandler()
-            ]
-        )
-        
-        self.logger = logging.getLogger(__name__)
-        
-        # 添加GUI日誌處理器（稍後在create_gui後設置）
-        self.gui_log_handler = None
-        
-        self.logger.info("網站發布助手啟動")
-        
     def create_gui(self):
         # 主框架
         main_frame = ttk.Frame(self.root, padding="10")
@@ -115,6 +74,9 @@ class WebsitePublisher:
         # 設定頁面
         self.create_settings_tab(notebook)
         
+        # 進階設定頁面
+        self.create_advanced_tab(notebook)
+        
         # SMTP設定頁面
         self.create_smtp_tab(notebook)
         
@@ -212,6 +174,264 @@ class WebsitePublisher:
         server_frame.columnconfigure(0, weight=1)
         settings_frame.columnconfigure(0, weight=1)
         
+    def create_advanced_tab(self, notebook):
+        tab_frame = ttk.Frame(notebook)
+        notebook.add(tab_frame, text="進階設定")
+        
+        # 設定項目較多，放在可捲動的畫布中，儲存按鈕固定在頁面下方
+        canvas = tk.Canvas(tab_frame, highlightthickness=0)
+        canvas.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        canvas_scroll = ttk.Scrollbar(tab_frame, orient=tk.VERTICAL, command=canvas.yview)
+        canvas_scroll.grid(row=0, column=1, sticky=(tk.N, tk.S))
+        canvas.configure(yscrollcommand=canvas_scroll.set)
+        
+        advanced_frame = ttk.Frame(canvas, padding="10")
+        frame_window = canvas.create_window((0, 0), window=advanced_frame, anchor='nw')
+        advanced_frame.bind('<Configure>', lambda event: canvas.configure(scrollregion=canvas.bbox('all')))
+        canvas.bind('<Configure>', lambda event: canvas.itemconfigure(frame_window, width=event.width))
+        self._bind_mousewheel(canvas)
+        
+        # 發布效能設定
+        performance_frame = ttk.LabelFrame(advanced_frame, text="發布效能", padding="10")
+        performance_frame.grid(row=0, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(0, 10))
+        
+        # 同時發布的伺服器數量
+        ttk.Label(performance_frame, text="同時發布伺服器數:").grid(row=0, column=0, sticky=tk.W, pady=(0, 5))
+        self.max_parallel_servers_var = tk.StringVar(value=str(DEFAULT_PUBLISH_OPTIONS['max_parallel_servers']))
+        ttk.Spinbox(performance_frame, from_=1, to=32, textvariable=self.max_parallel_servers_var, width=5).grid(row=0, column=1, sticky=tk.W, pady=(0, 5), padx=(10, 0))
+        ttk.Label(performance_frame, text="1 = 依序發布；大於 1 時各伺服器獨立並行，單台失敗不影響其他伺服器",
+                  foreground="gray").grid(row=0, column=2, sticky=tk.W, pady=(0, 5), padx=(10, 0))
+        
+        # 每台伺服器的複製執行緒數量
+        ttk.Label(performance_frame, text="每台伺服器複製執行緒數:").grid(row=1, column=0, sticky=tk.W, pady=(0, 5))
+        self.copy_workers_var = tk.StringVar(value=str(DEFAULT_PUBLISH_OPTIONS['copy_workers']))
+        ttk.Spinbox(performance_frame, from_=1, to=64, textvariable=self.copy_workers_var, width=5).grid(row=1, column=1, sticky=tk.W, pady=(0, 5), padx=(10, 0))
+        ttk.Label(performance_frame, text="高延遲連線可提高此數值，讓多個檔案同時傳輸",
+                  foreground="gray").grid(row=1, column=2, sticky=tk.W, pady=(0, 5), padx=(10, 0))
+        
+        # 中斷續傳
+        self.resume_interrupted_var = tk.BooleanVar(value=DEFAULT_PUBLISH_OPTIONS['resume_interrupted'])
+        ttk.Checkbutton(performance_frame, text="發布失敗或中斷後，下次發布跳過已完成的檔案",
+                        variable=self.resume_interrupted_var).grid(row=2, column=0, columnspan=3, sticky=tk.W, pady=(0, 5))
+        
+        # 全域頻寬上限
+        ttk.Label(performance_frame, text="全部伺服器頻寬上限 (Mbps):").grid(row=3, column=0, sticky=tk.W, pady=(0, 5))
+        self.global_bandwidth_var = tk.StringVar(value=str(DEFAULT_PUBLISH_OPTIONS['global_bandwidth_limit_mbps']))
+        ttk.Entry(performance_frame, textvariable=self.global_bandwidth_var, width=7).grid(row=3, column=1, sticky=tk.W, pady=(0, 5), padx=(10, 0))
+        ttk.Label(performance_frame, text="0 = 不限制；各伺服器可在伺服器設定另外限制，發布中儲存設定會立即生效",
+                  foreground="gray").grid(row=3, column=2, sticky=tk.W, pady=(0, 5), padx=(10, 0))
+        
+        # 網路連線保留時間
+        ttk.Label(performance_frame, text="網路連線保留時間 (分鐘):").grid(row=4, column=0, sticky=tk.W)
+        self.share_session_idle_var = tk.StringVar(value=str(DEFAULT_PUBLISH_OPTIONS['share_session_idle_minutes']))
+        ttk.Entry(performance_frame, textvariable=self.share_session_idle_var, width=7).grid(row=4, column=1, sticky=tk.W, padx=(10, 0))
+        ttk.Label(performance_frame, text="期間內重複發布或測試連接沿用同一連線；0 = 每次用完立即中斷",
+                  foreground="gray").grid(row=4, column=2, sticky=tk.W, padx=(10, 0))
+        
+        # 檔案比對方式
+        compare_frame = ttk.LabelFrame(advanced_frame, text="檔案比對", padding="10")
+        compare_frame.grid(row=1, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(0, 10))
+        
+        self.compare_mode_var = tk.StringVar(value=DEFAULT_PUBLISH_OPTIONS['compare_mode'])
+        ttk.Radiobutton(compare_frame, text="大小 + 修改時間（快速）", variable=self.compare_mode_var,
+                        value='mtime').grid(row=0, column=0, sticky=tk.W, pady=(0, 5))
+        ttk.Radiobutton(compare_frame, text="內容雜湊（精確，重新建置但內容相同的檔案會跳過）", variable=self.compare_mode_var,
+                        value='hash').grid(row=1, column=0, sticky=tk.W, pady=(0, 5))
+        ttk.Label(compare_frame, text="雜湊結果快取於 cache/hash_cache.json，未變動的檔案不會重新計算",
+                  foreground="gray").grid(row=2, column=0, sticky=tk.W)
+        
+        # 遠端部署清單
+        manifest_frame = ttk.LabelFrame(advanced_frame, text="遠端部署清單", padding="10")
+        manifest_frame.grid(row=2, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(0, 10))
+        
+        self.use_remote_manifest_var = tk.BooleanVar(value=DEFAULT_PUBLISH_OPTIONS['use_remote_manifest'])
+        ttk.Checkbutton(manifest_frame, text="使用遠端部署清單比對（不需逐一列出遠端目錄）",
+                        variable=self.use_remote_manifest_var).grid(row=0, column=0, sticky=tk.W, pady=(0, 5))
+        self.verify_remote_manifest_var = tk.BooleanVar(value=DEFAULT_PUBLISH_OPTIONS['verify_remote_manifest'])
+        ttk.Checkbutton(manifest_frame, text="發布前抽樣驗證清單，不符時改用實際掃描",
+                        variable=self.verify_remote_manifest_var).grid(row=1, column=0, sticky=tk.W, pady=(0, 5))
+        ttk.Label(manifest_frame, text=f"清單於每次發布成功後寫入目標路徑旁的 {PUBLISH_META_SUFFIX} 目錄（例如 D:\\websites{PUBLISH_META_SUFFIX}），不在網站目錄內",
+                  foreground="gray").grid(row=2, column=0, sticky=tk.W)
+        
+        # 差異傳輸
+        delta_frame = ttk.LabelFrame(advanced_frame, text="差異傳輸", padding="10")
+        delta_frame.grid(row=3, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(0, 10))
+        
+        self.delta_transfer_var = tk.BooleanVar(value=DEFAULT_PUBLISH_OPTIONS['delta_transfer'])
+        ttk.Checkbutton(delta_frame, text="大型檔案只寫入有變動的區塊",
+                        variable=self.delta_transfer_var).grid(row=0, column=0, columnspan=3, sticky=tk.W, pady=(0, 5))
+        ttk.Label(delta_frame, text="最小檔案大小 (KB):").grid(row=1, column=0, sticky=tk.W, pady=(0, 5))
+        self.delta_min_size_var = tk.StringVar(value=str(DEFAULT_PUBLISH_OPTIONS['delta_min_size_kb']))
+        ttk.Entry(delta_frame, textvariable=self.delta_min_size_var, width=10).grid(row=1, column=1, sticky=tk.W, pady=(0, 5), padx=(10, 0))
+        ttk.Label(delta_frame, text="區塊簽章快取於 cache/delta_signatures.json，首次發布仍為完整複製",
+                  foreground="gray").grid(row=2, column=0, columnspan=3, sticky=tk.W)
+        
+        # 分段部署
+        staging_frame = ttk.LabelFrame(advanced_frame, text="分段部署", padding="10")
+        staging_frame.grid(row=4, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(0, 10))
+        
+        self.staged_deploy_var = tk.BooleanVar(value=DEFAULT_PUBLISH_OPTIONS['staged_deploy'])
+        ttk.Checkbutton(staging_frame, text="先複製到暫存目錄，全部完成後再以更名切換",
+                        variable=self.staged_deploy_var).grid(row=0, column=0, sticky=tk.W, pady=(0, 5))
+        ttk.Label(staging_frame, text=f"暫存目錄位於目標路徑旁的 {PUBLISH_META_SUFFIX} 目錄，新舊版本混合的時間縮短為更名所需時間；此模式不使用差異傳輸",
+                  foreground="gray").grid(row=1, column=0, sticky=tk.W)
+        
+        # 複製引擎
+        copier_frame = ttk.LabelFrame(advanced_frame, text="複製引擎", padding="10")
+        copier_frame.grid(row=5, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(0, 10))
+        
+        ttk.Label(copier_frame, text="複製區塊大小 (KB):").grid(row=0, column=0, sticky=tk.W, pady=(0, 5))
+        self.copy_chunk_var = tk.StringVar(value=str(DEFAULT_PUBLISH_OPTIONS['copy_chunk_kb']))
+        ttk.Entry(copier_frame, textvariable=self.copy_chunk_var, width=10).grid(row=0, column=1, sticky=tk.W, pady=(0, 5), padx=(10, 0))
+        ttk.Label(copier_frame, text="高延遲或高頻寬連線可提高區塊大小（最小 64）",
+                  foreground="gray").grid(row=0, column=2, sticky=tk.W, pady=(0, 5), padx=(10, 0))
+        self.copy_preallocate_var = tk.BooleanVar(value=DEFAULT_PUBLISH_OPTIONS['copy_preallocate'])
+        ttk.Checkbutton(copier_frame, text="大型檔案預先配置目標空間",
+                        variable=self.copy_preallocate_var).grid(row=1, column=0, columnspan=3, sticky=tk.W, pady=(0, 5))
+        self.copy_offload_var = tk.BooleanVar(value=DEFAULT_PUBLISH_OPTIONS['copy_offload'])
+        ttk.Checkbutton(copier_frame, text="兩端支援時使用核心複製（copy_file_range / sendfile）",
+                        variable=self.copy_offload_var).grid(row=2, column=0, columnspan=3, sticky=tk.W)
+        
+        # 失敗重試
+        retry_frame = ttk.LabelFrame(advanced_frame, text="失敗重試", padding="10")
+        retry_frame.grid(row=6, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(0, 10))
+        
+        ttk.Label(retry_frame, text="每個檔案最多嘗試次數:").grid(row=0, column=0, sticky=tk.W, pady=(0, 5))
+        self.retry_attempts_var = tk.StringVar(value=str(DEFAULT_PUBLISH_OPTIONS['retry_attempts']))
+        ttk.Spinbox(retry_frame, from_=1, to=10, textvariable=self.retry_attempts_var, width=5).grid(row=0, column=1, sticky=tk.W, pady=(0, 5), padx=(10, 0))
+        ttk.Label(retry_frame, text="1 = 不重試；網路中斷、逾時等暫時性錯誤才會重試，權限不足等錯誤直接失敗",
+                  foreground="gray").grid(row=0, column=2, sticky=tk.W, pady=(0, 5), padx=(10, 0))
+        ttk.Label(retry_frame, text="初始等待秒數:").grid(row=1, column=0, sticky=tk.W)
+        self.retry_base_delay_var = tk.StringVar(value=str(DEFAULT_PUBLISH_OPTIONS['retry_base_delay']))
+        ttk.Entry(retry_frame, textvariable=self.retry_base_delay_var, width=7).grid(row=1, column=1, sticky=tk.W, padx=(10, 0))
+        ttk.Label(retry_frame, text=f"每次重試等待時間加倍（最長 {RETRY_MAX_DELAY:.0f} 秒）並加入隨機抖動",
+                  foreground="gray").grid(row=1, column=2, sticky=tk.W, padx=(10, 0))
+        
+        # 日誌
+        log_frame = ttk.LabelFrame(advanced_frame, text="日誌", padding="10")
+        log_frame.grid(row=7, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(0, 10))
+        
+        ttk.Label(log_frame, text="逐檔記錄:").grid(row=0, column=0, sticky=tk.W, pady=(0, 5))
+        self.file_log_detail_var = tk.StringVar(value=DEFAULT_PUBLISH_OPTIONS['file_log_detail'])
+        file_log_detail_frame = ttk.Frame(log_frame)
+        file_log_detail_frame.grid(row=0, column=1, columnspan=2, sticky=tk.W, pady=(0, 5), padx=(10, 0))
+        for column, (value, text) in enumerate((('all', "全部檔案"), ('changes', "只記錄新增、更新、刪除"), ('none', "不記錄"))):
+            ttk.Radiobutton(file_log_detail_frame, text=text, variable=self.file_log_detail_var,
+                            value=value).grid(row=0, column=column, sticky=tk.W, padx=(0, 10))
+        ttk.Label(log_frame, text="單一日誌檔案上限 (MB):").grid(row=1, column=0, sticky=tk.W, pady=(0, 5))
+        self.log_max_size_var = tk.StringVar(value=str(DEFAULT_PUBLISH_OPTIONS['log_max_size_mb']))
+        ttk.Entry(log_frame, textvariable=self.log_max_size_var, width=7).grid(row=1, column=1, sticky=tk.W, pady=(0, 5), padx=(10, 0))
+        ttk.Label(log_frame, text="0 = 不限制；超過上限或換日時舊檔案以 gzip 壓縮",
+                  foreground="gray").grid(row=1, column=2, sticky=tk.W, pady=(0, 5), padx=(10, 0))
+        self.stream_file_operations_var = tk.BooleanVar(value=DEFAULT_PUBLISH_OPTIONS['stream_file_operations'])
+        ttk.Checkbutton(log_frame, text="發布報告的逐檔記錄直接寫入 history/runs，記憶體只保留統計",
+                        variable=self.stream_file_operations_var).grid(row=2, column=0, columnspan=3, sticky=tk.W, pady=(0, 5))
+        ttk.Label(log_frame, text="日誌由背景執行緒寫入 logs/publish_YYYYMMDD.log，大量小檔案時建議只記錄變動",
+                  foreground="gray").grid(row=3, column=0, columnspan=3, sticky=tk.W)
+        
+        # 儲存按鈕
+        ttk.Button(tab_frame, text="儲存進階設定", command=self.save_advanced_config).grid(row=1, column=0, columnspan=2, pady=10)
+        
+        # 設定權重
+        performance_frame.columnconfigure(2, weight=1)
+        log_frame.columnconfigure(2, weight=1)
+        advanced_frame.columnconfigure(0, weight=1)
+        tab_frame.columnconfigure(0, weight=1)
+        tab_frame.rowconfigure(0, weight=1)
+    
+    def _bind_mousewheel(self, canvas):
+        """滑鼠在畫布上時以滾輪捲動（Windows / macOS 為 MouseWheel，Linux 為 Button-4 / Button-5）"""
+        def on_mousewheel(event):
+            if event.num == 4:
+                canvas.yview_scroll(-1, 'units')
+            elif event.num == 5:
+                canvas.yview_scroll(1, 'units')
+            else:
+                canvas.yview_scroll(-1 if event.delta > 0 else 1, 'units')
+        
+        def bind_wheel(event):
+            for sequence in ('<MouseWheel>', '<Button-4>', '<Button-5>'):
+                canvas.bind_all(sequence, on_mousewheel)
+        
+        def unbind_wheel(event):
+            for sequence in ('<MouseWheel>', '<Button-4>', '<Button-5>'):
+                canvas.unbind_all(sequence)
+        
+        canvas.bind('<Enter>', bind_wheel)
+        canvas.bind('<Leave>', unbind_wheel)
+        
+    def save_advanced_config(self):
+        try:
+            max_parallel_servers = int(self.max_parallel_servers_var.get())
+            copy_workers = int(self.copy_workers_var.get())
+        except ValueError:
+            messagebox.showerror("錯誤", "執行緒與伺服器數量必須是數字")
+            return
+        
+        try:
+            delta_min_size_kb = int(self.delta_min_size_var.get())
+        except ValueError:
+            messagebox.showerror("錯誤", "差異傳輸最小檔案大小必須是數字")
+            return
+        
+        try:
+            copy_chunk_kb = int(self.copy_chunk_var.get())
+        except ValueError:
+            messagebox.showerror("錯誤", "複製區塊大小必須是數字")
+            return
+        
+        try:
+            global_bandwidth_limit = float(self.global_bandwidth_var.get() or 0)
+        except ValueError:
+            messagebox.showerror("錯誤", "頻寬上限必須是數字")
+            return
+        
+        try:
+            share_session_idle_minutes = float(self.share_session_idle_var.get() or 0)
+        except ValueError:
+            messagebox.showerror("錯誤", "連線保留時間必須是數字")
+            return
+        
+        try:
+            retry_attempts = int(self.retry_attempts_var.get())
+            retry_base_delay = float(self.retry_base_delay_var.get() or 0)
+        except ValueError:
+            messagebox.showerror("錯誤", "重試次數與等待秒數必須是數字")
+            return
+        
+        try:
+            log_max_size_mb = float(self.log_max_size_var.get() or 0)
+        except ValueError:
+            messagebox.showerror("錯誤", "日誌檔案上限必須是數字")
+            return
+        
+        if max_parallel_servers < 1 or copy_workers < 1:
+            messagebox.showerror("錯誤", "同時發布伺服器數與複製執行緒數至少為 1")
+            return
+        
+        self.config['publish_options']['max_parallel_servers'] = max_parallel_servers
+        self.config['publish_options']['copy_workers'] = copy_workers
+        self.config['publish_options']['compare_mode'] = self.compare_mode_var.get()
+        self.config['publish_options']['use_remote_manifest'] = self.use_remote_manifest_var.get()
+        self.config['publish_options']['verify_remote_manifest'] = self.verify_remote_manifest_var.get()
+        self.config['publish_options']['delta_transfer'] = self.delta_transfer_var.get()
+        self.config['publish_options']['delta_min_size_kb'] = max(0, delta_min_size_kb)
+        self.config['publish_options']['staged_deploy'] = self.staged_deploy_var.get()
+        self.config['publish_options']['resume_interrupted'] = self.resume_interrupted_var.get()
+        self.config['publish_options']['copy_chunk_kb'] = max(64, copy_chunk_kb)
+        self.config['publish_options']['copy_preallocate'] = self.copy_preallocate_var.get()
+        self.config['publish_options']['copy_offload'] = self.copy_offload_var.get()
+        self.config['publish_options']['global_bandwidth_limit_mbps'] = max(0, global_bandwidth_limit)
+        self.config['publish_options']['retry_attempts'] = max(1, retry_attempts)
+        self.config['publish_options']['retry_base_delay'] = max(0, retry_base_delay)
+        self.config['publish_options']['share_session_idle_minutes'] = max(0, share_session_idle_minutes)
+        self.config['publish_options']['file_log_detail'] = self.file_log_detail_var.get()
+        self.config['publish_options']['log_max_size_mb'] = max(0, log_max_size_mb)
+        self.config['publish_options']['stream_file_operations'] = self.stream_file_operations_var.get()
+        self.engine.save_config()
+        self.engine.apply_runtime_options()
+        messagebox.showinfo("成功", "進階設定已儲存")
+        
     def create_smtp_tab(self, notebook):
         smtp_frame = ttk.Frame(notebook, padding="10")
         notebook.add(smtp_frame, text="郵件通知")
@@ -355,7 +575,12 @@ class WebsitePublisher:
         target_label.grid(row=2, column=1, sticky=tk.W, padx=(10, 0))
         
         # 手動發布按鈕
-        ttk.Button(publish_frame, text="立即發布", command=self.publish_now, style='Accent.TButton').grid(row=3, column=0, columnspan=2, pady=20)
+        publish_button_frame = ttk.Frame(publish_frame)
+        publish_button_frame.grid(row=3, column=0, columnspan=2, pady=20)
+        self.publish_button = ttk.Button(publish_button_frame, text="立即發布", command=self.publish_now, style='Accent.TButton')
+        self.publish_button.grid(row=0, column=0, padx=(0, 10))
+        self.preview_button = ttk.Button(publish_button_frame, text="預覽發布計畫", command=self.preview_publish_plan)
+        self.preview_button.grid(row=0, column=1)
         
         # 進度和控制台顯示
         progress_frame = ttk.LabelFrame(publish_frame, text="發布進度與狀態", padding="10")
@@ -369,6 +594,10 @@ class WebsitePublisher:
         self.progress_label = ttk.Label(progress_label_frame, text="0 / 0 (0%)")
         self.progress_label.grid(row=0, column=1, sticky=tk.W, padx=(10, 0))
         
+        # 多台伺服器時逐台顯示進度、速率與剩餘時間
+        self.server_progress_label = ttk.Label(progress_label_frame, text="", foreground='gray', justify=tk.LEFT)
+        self.server_progress_label.grid(row=1, column=0, columnspan=2, sticky=tk.W, pady=(5, 0))
+        
         self.progress_bar = ttk.Progressbar(progress_frame, mode='determinate')
         self.progress_bar.grid(row=1, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(0, 10))
         
@@ -416,7 +645,33 @@ class WebsitePublisher:
         
         ttk.Button(control_frame, text="刷新記錄", command=self.refresh_history).grid(row=0, column=0, padx=(0, 10))
         ttk.Button(control_frame, text="清除所有記錄", command=self.clear_all_history).grid(row=0, column=1, padx=(0, 10))
-        ttk.Button(control_frame, text="刪除選中記錄", command=self.delete_selected_history).grid(row=0, column=2)
+        ttk.Button(control_frame, text="刪除選中記錄", command=self.delete_selected_history).grid(row=0, column=2, padx=(0, 20))
+        
+        # 狀態篩選與分頁
+        ttk.Label(control_frame, text="狀態:").grid(row=0, column=3, padx=(0, 5))
+        self.history_status_var = tk.StringVar(value='全部')
+        status_combo = ttk.Combobox(control_frame, textvariable=self.history_status_var, values=('全部', '成功', '失敗'),
+                                    state='readonly', width=6)
+        status_combo.grid(row=0, column=4, padx=(0, 20))
+        status_combo.bind('<<ComboboxSelected>>', lambda event: self.refresh_history(page=0))
+        
+        self.history_page = 0
+        ttk.Button(control_frame, text="上一頁", command=lambda: self.refresh_history(page=self.history_page - 1)).grid(row=0, column=5, padx=(0, 5))
+        ttk.Button(control_frame, text="下一頁", command=lambda: self.refresh_history(page=self.history_page + 1)).grid(row=0, column=6, padx=(0, 10))
+        self.history_page_var = tk.StringVar()
+        ttk.Label(control_frame, textvariable=self.history_page_var).grid(row=0, column=7)
+        
+        # 檔案部署記錄查詢
+        search_frame = ttk.Frame(control_frame)
+        search_frame.grid(row=1, column=0, columnspan=8, sticky=tk.W, pady=(10, 0))
+        ttk.Label(search_frame, text="檔案路徑:").grid(row=0, column=0, padx=(0, 5))
+        self.history_search_var = tk.StringVar()
+        search_entry = ttk.Entry(search_frame, textvariable=self.history_search_var, width=40)
+        search_entry.grid(row=0, column=1, padx=(0, 5))
+        search_entry.bind('<Return>', lambda event: self.search_file_history())
+        ttk.Button(search_frame, text="查詢部署記錄", command=self.search_file_history).grid(row=0, column=2, padx=(0, 10))
+        self.history_search_skipped_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(search_frame, text="包含跳過的檔案", variable=self.history_search_skipped_var).grid(row=0, column=3)
         
         # 歷史記錄列表
         list_frame = ttk.LabelFrame(history_frame, text="歷史記錄", padding="10")
@@ -450,7 +705,7 @@ class WebsitePublisher:
         self.history_tree.bind('<Double-1>', self.view_history_detail)
         
         # 詳細信息區域
-        detail_frame = ttk.LabelFrame(history_frame, text="發布詳情 (雙擊上方記錄查看詳細資訊)", padding="10")
+        detail_frame = ttk.LabelFrame(history_frame, text="發布詳情 (雙擊上方記錄查看詳細資訊，或輸入檔案路徑查詢部署記錄)", padding="10")
         detail_frame.grid(row=3, column=0, columnspan=2, sticky=(tk.W, tk.E, tk.N, tk.S), pady=(0, 10))
         
         # 詳細信息顯示區域
@@ -471,100 +726,161 @@ class WebsitePublisher:
         detail_frame.columnconfigure(0, weight=1)
         detail_frame.rowconfigure(0, weight=1)
         
-        # 初始化載入歷史記錄
-        self.load_history_records()
+        # 歷史列表在第一次切換到此頁面時才載入
+        self.history_loaded = False
+        notebook.bind('<<NotebookTabChanged>>', lambda event: self._on_notebook_tab_changed(notebook, history_frame))
     
     def setup_gui_logging(self):
-        """設置GUI日誌處理器"""
+        """設置GUI日誌處理器
+        
+        日誌記錄只加入環形緩衝區，由主線程定時整批取出寫入控制台，發布執行緒不必等待 GUI；
+        deque 的 append / popleft 為原子操作，取出時不需要鎖。GUI 來不及顯示時捨棄最舊的記錄並提示略過的行數。
+        """
         class GUILogHandler(logging.Handler):
-            def __init__(self, console_widget, root):
+            def __init__(self, capacity):
                 super().__init__()
-                self.console_widget = console_widget
-                self.root = root
+                self.buffer = deque(maxlen=capacity)
+                self.emitted_count = 0
             
             def emit(self, record):
-                # 在主線程中更新GUI
-                self.root.after(0, self._update_console, self.format(record))
-            
-            def _update_console(self, message):
-                # 啟用文字框編輯
-                self.console_widget.config(state='normal')
-                
-                # 添加時間戳和訊息
-                timestamp = datetime.now().strftime('%H:%M:%S')
-                formatted_message = f"[{timestamp}] {message}\n"
-                
-                # 插入訊息
-                self.console_widget.insert(tk.END, formatted_message)
-                
-                # 自動滾動到底部
-                self.console_widget.see(tk.END)
-                
-                # 禁用文字框編輯
-                self.console_widget.config(state='disabled')
-                
-                # 限制最大行數（保留最後1000行）
-                lines = int(self.console_widget.index('end-1c').split('.')[0])
-                if lines > 1000:
-                    self.console_widget.config(state='normal')
-                    self.console_widget.delete('1.0', f'{lines-1000}.0')
-                    self.console_widget.config(state='disabled')
+                # logging 已在處理器的鎖內呼叫 emit，計數不會被其他發布執行緒打斷
+                try:
+                    self.buffer.append(self.format(record))
+                    self.emitted_count += 1
+                except Exception:
+                    self.handleError(record)
         
         # 創建並添加GUI日誌處理器
         if hasattr(self, 'console_text') and self.console_text is not None:
-            self.gui_log_handler = GUILogHandler(self.console_text, self.root)
+            self.gui_log_handler = GUILogHandler(CONSOLE_MAX_LINES)
             self.gui_log_handler.setLevel(logging.INFO)
-            self.gui_log_handler.setFormatter(logging.Formatter('%(levelname)s - %(message)s'))
+            self.gui_log_handler.setFormatter(logging.Formatter('[%(asctime)s] %(levelname)s - %(message)s', '%H:%M:%S'))
+            self.console_drained = 0
             self.logger.addHandler(self.gui_log_handler)
             self.logger.info("GUI日誌處理器已啟用")
+            self._drain_console()
+    
+    def _drain_console(self):
+        """整批取出緩衝區的日誌寫入控制台，超過行數上限時一次刪除最舊的部分"""
+        handler = self.gui_log_handler
+        messages = []
+        try:
+            while True:
+                messages.append(handler.buffer.popleft())
+        except IndexError:
+            pass
+        
+        if messages:
+            # 緩衝區已滿時最舊的記錄被覆蓋，以已發出與已取出的筆數差計算略過的行數
+            self.console_drained += len(messages)
+            skipped = handler.emitted_count - len(handler.buffer) - self.console_drained
+            if skipped > 0:
+                self.console_drained += skipped
+                messages.insert(0, f"... 日誌過多，略過 {skipped} 行（完整內容見 logs 目錄） ...")
+            
+            self.console_text.config(state='normal')
+            self.console_text.insert(tk.END, '\n'.join(messages) + '\n')
+            lines = int(self.console_text.index('end-1c').split('.')[0])
+            if lines > CONSOLE_MAX_LINES + CONSOLE_TRIM_LINES:
+                self.console_text.delete('1.0', f'{lines - CONSOLE_MAX_LINES}.0')
+            self.console_text.see(tk.END)
+            self.console_text.config(state='disabled')
+        
+        self.root.after(CONSOLE_POLL_MS, self._drain_console)
     
     def clear_console(self):
         """清除控制台輸出"""
+        if self.gui_log_handler is not None:
+            try:
+                while True:
+                    self.gui_log_handler.buffer.popleft()
+                    self.console_drained += 1
+            except IndexError:
+                pass
         self.console_text.config(state='normal')
         self.console_text.delete('1.0', tk.END)
         self.console_text.config(state='disabled')
         self.logger.info("控制台日誌已清除")
     
-    def init_progress(self, total_files):
-        """初始化進度條"""
-        self.total_files = total_files
-        self.processed_files = 0
-        self.progress_bar['maximum'] = total_files
-        self.progress_bar['value'] = 0
-        self.update_progress_label()
+    def on_status(self, text):
+        """發布狀態顯示在狀態列（由發布或測試執行緒呼叫，交給主線程更新）"""
+        self.root.after(0, lambda: self.status_var.set(text))
     
-    def update_progress(self, increment=1):
-        """更新進度"""
-        self.processed_files += increment
-        if hasattr(self, 'progress_bar'):
-            self.root.after(0, self._update_progress_gui)
+    def on_progress_start(self, progress):
+        """在主線程中開始定時取樣進度（不由複製執行緒逐檔通知）"""
+        self.root.after(0, self.start_progress_polling)
     
-    def _update_progress_gui(self):
-        """在主線程中更新進度GUI"""
-        self.progress_bar['value'] = self.processed_files
-        self.update_progress_label()
-        
-    def update_progress_label(self):
-        """更新進度標籤"""
-        if self.total_files > 0:
-            percentage = (self.processed_files / self.total_files) * 100
-            self.progress_label.config(text=f"{self.processed_files} / {self.total_files} ({percentage:.1f}%)")
+    def on_finished(self, result):
+        """在主線程中處理發布或預覽的結果"""
+        if result.dry_run:
+            handler = self._handle_plan_success if result.success else self._handle_plan_failure
         else:
-            self.progress_label.config(text="0 / 0 (0%)")
+            handler = self._handle_publish_success if result.success else self._handle_publish_failure
+        
+        def finish():
+            self._set_publish_buttons_state(False)
+            handler(result)
+        self.root.after(0, finish)
+    
+    def start_progress_polling(self):
+        """重設進度條並開始定時更新"""
+        self.stop_progress_polling()
+        self.progress_bar['maximum'] = 100
+        self._poll_progress()
+    
+    def stop_progress_polling(self):
+        """停止定時更新並重設進度條"""
+        if self.progress_poll_id is not None:
+            self.root.after_cancel(self.progress_poll_id)
+            self.progress_poll_id = None
+        self.progress_bar['value'] = 0
+        self.progress_label.config(text="0 / 0 (0%)")
+        self.server_progress_label.config(text="")
+    
+    def _poll_progress(self):
+        """取樣發布進度並更新進度條與標籤"""
+        snapshot = self.engine.progress.sample()
+        self.progress_bar['value'] = self._progress_percentage(snapshot)
+        self.progress_label.config(text=self._format_progress(snapshot))
+        
+        if len(snapshot['servers']) > 1:
+            self.server_progress_label.config(text='\n'.join(
+                f"{server_key}: {self._format_progress(server_snapshot)}"
+                for server_key, server_snapshot in snapshot['servers'].items()))
+        
+        self.progress_poll_id = self.root.after(PROGRESS_POLL_MS, self._poll_progress)
+    
+    def _progress_percentage(self, snapshot):
+        """以位元組計算完成百分比（沒有位元組時以檔案數計算）"""
+        if snapshot['total_bytes']:
+            return snapshot['bytes'] / snapshot['total_bytes'] * 100
+        if snapshot['total_files']:
+            return snapshot['files'] / snapshot['total_files'] * 100
+        return 0
+    
+    def _format_progress(self, snapshot):
+        """進度文字：檔案數、位元組數、百分比、速率與預估剩餘時間"""
+        text = (f"{snapshot['files']} / {snapshot['total_files']} 個檔案，"
+                f"{format_file_size(snapshot['bytes'])} / {format_file_size(snapshot['total_bytes'])} "
+                f"({self._progress_percentage(snapshot):.1f}%)")
+        if snapshot['files'] < snapshot['total_files']:
+            eta = format_duration(snapshot['eta']) if snapshot['eta'] is not None else "計算中"
+            text += f"，{format_file_size(snapshot['transfer_rate'])}/s，剩餘 {eta}"
+        return text
 
     def add_source_file(self):
         filename = filedialog.askopenfilename(title="選擇發行檔案")
         if filename:
             self.config['source_files'].append(filename)
             self.source_listbox.insert(tk.END, filename)
-            self.save_config()
+            self.engine.save_config()
             
     def add_source_folder(self):
         folder_name = filedialog.askdirectory(title="選擇發行資料夾")
         if folder_name:
             self.config['source_files'].append(folder_name)
             self.source_listbox.insert(tk.END, folder_name)
-            self.save_config()
+            self.engine.save_config()
             
     def remove_source(self):
         selection = self.source_listbox.curselection()
@@ -572,7 +888,7 @@ class WebsitePublisher:
             index = selection[0]
             self.source_listbox.delete(index)
             del self.config['source_files'][index]
-            self.save_config()
+            self.engine.save_config()
             
     def add_delete_file(self):
         filename = self.delete_entry.get().strip()
@@ -580,7 +896,7 @@ class WebsitePublisher:
             self.config['delete_files'].append(filename)
             self.delete_listbox.insert(tk.END, filename)
             self.delete_entry.delete(0, tk.END)
-            self.save_config()
+            self.engine.save_config()
             
     def test_delete_files(self):
         if not self.config['delete_files']:
@@ -598,7 +914,7 @@ class WebsitePublisher:
         
     def _test_delete_files_worker(self):
         """在背景線程中測試刪除檔案"""
-        self.status_var.set("正在檢查刪除檔案...")
+        self.on_status("正在檢查刪除檔案...")
         self.logger.info("開始檢查刪除檔案")
         
         results = []
@@ -615,7 +931,7 @@ class WebsitePublisher:
                     # 單個檔案
                     if os.path.basename(source) == delete_file:
                         size = os.path.getsize(source)
-                        size_str = self._format_file_size(size)
+                        size_str = format_file_size(size)
                         found_in_local.append(f"檔案: {source} ({size_str})")
                         
                 elif os.path.isdir(source):
@@ -624,7 +940,7 @@ class WebsitePublisher:
                         if delete_file in files:
                             file_path = os.path.join(root, delete_file)
                             size = os.path.getsize(file_path)
-                            size_str = self._format_file_size(size)
+                            size_str = format_file_size(size)
                             rel_path = os.path.relpath(file_path, source)
                             found_in_local.append(f"目錄 {source} 中的 {rel_path} ({size_str})")
                         
@@ -648,22 +964,10 @@ class WebsitePublisher:
         
         # 顯示結果
         result_text = "\n\n".join(results)
-        self.status_var.set("檢查完成")
+        self.on_status("檢查完成")
         
         self.root.after(0, lambda: self._show_delete_test_results(result_text))
         
-    def _format_file_size(self, size_bytes):
-        """格式化檔案大小"""
-        if size_bytes < 1024:
-            return f"{size_bytes} B"
-        elif size_bytes < 1024 * 1024:
-            return f"{size_bytes / 1024:.1f} KB"
-        elif size_bytes < 1024 * 1024 * 1024:
-            return f"{size_bytes / (1024 * 1024):.1f} MB"
-        else:
-            return f"{size_bytes / (1024 * 1024 * 1024):.1f} GB"
-            
-        
     def _show_delete_test_results(self, result_text):
         """顯示刪除檔案測試結果"""
         # 創建結果對話框
@@ -714,7 +1018,7 @@ class WebsitePublisher:
             index = selection[0]
             self.delete_listbox.delete(index)
             del self.config['delete_files'][index]
-            self.save_config()
+            self.engine.save_config()
     
     def toggle_smtp_password(self):
         if self.show_smtp_password_var.get():
@@ -740,7 +1044,7 @@ class WebsitePublisher:
             'password': self.smtp_password_var.get(),
             'use_tls': self.use_tls_var.get()
         }
-        self.save_config()
+        self.engine.save_config()
         messagebox.showinfo("成功", "SMTP設定已儲存")
     
     def test_smtp_connection(self):
@@ -753,7 +1057,7 @@ class WebsitePublisher:
         test_thread.start()
     
     def _test_smtp_worker(self):
-        self.status_var.set("正在測試SMTP連接...")
+        self.on_status("正在測試SMTP連接...")
         
         try:
             smtp_config = {
@@ -799,7 +1103,7 @@ class WebsitePublisher:
                 self.logger.info("無需身份驗證（開放式 SMTP 中繼）")
             server.quit()
             
-            self.status_var.set("SMTP測試完成")
+            self.on_status("SMTP測試完成")
             self.root.after(0, lambda: messagebox.showinfo("SMTP測試", "SMTP連接測試成功！"))
             self.logger.info("SMTP連接測試成功")
             
@@ -826,7 +1130,7 @@ class WebsitePublisher:
     
     def _handle_smtp_error(self, error_msg, title):
         """處理SMTP錯誤"""
-        self.status_var.set("SMTP測試失敗")
+        self.on_status("SMTP測試失敗")
         self.root.after(0, lambda: messagebox.showerror(title, error_msg))
         self.logger.error(f"SMTP連接測試失敗: {error_msg}")
     
@@ -888,7 +1192,7 @@ class WebsitePublisher:
                 self.config['notification_emails'].append(email)
                 self.notify_listbox.insert(tk.END, email)
                 self.email_entry.delete(0, tk.END)
-                self.save_config()
+                self.engine.save_config()
             else:
                 messagebox.showwarning("警告", "此電子郵件地址已存在")
     
@@ -898,7 +1202,7 @@ class WebsitePublisher:
             index = selection[0]
             self.notify_listbox.delete(index)
             del self.config['notification_emails'][index]
-            self.save_config()
+            self.engine.save_config()
     
     def test_email_to_selected(self):
         selection = self.notify_listbox.curselection()
@@ -914,7 +1218,7 @@ class WebsitePublisher:
         test_thread.start()
     
     def _test_email_worker(self, test_email):
-        self.status_var.set(f"正在發送測試郵件到 {test_email}...")
+        self.on_status(f"正在發送測試郵件到 {test_email}...")
         
         try:
             if not self.config['smtp_config']['smtp_server']:
@@ -937,25 +1241,25 @@ class WebsitePublisher:
 此為系統自動發送的測試郵件，請勿回覆。
 """
             
-            self._send_email([test_email], subject, content)
+            self.engine.send_email([test_email], subject, content)
             
-            self.status_var.set("測試郵件發送完成")
+            self.on_status("測試郵件發送完成")
             self.root.after(0, lambda: messagebox.showinfo("成功", f"測試郵件已發送到 {test_email}"))
             self.logger.info(f"測試郵件發送成功: {test_email}")
             
         except Exception as e:
             error_msg = f"測試郵件發送失敗: {str(e)}"
-            self.status_var.set("測試郵件發送失敗")
+            self.on_status("測試郵件發送失敗")
             self.root.after(0, lambda: messagebox.showerror("發送失敗", error_msg))
             self.logger.error(f"測試郵件發送失敗: {str(e)}")
             
     def add_server(self):
-        server_dialog = ServerDialog(self.root)
+        server_dialog = ServerDialog(self.root, share_sessions=self.engine.share_sessions)
         server_info = server_dialog.get_server_info()
         if server_info:
             self.config['servers'].append(server_info)
             self.server_listbox.insert(tk.END, f"{server_info['ip']} - {server_info['path']}")
-            self.save_config()
+            self.engine.save_config()
             self.update_server_display()
             self.logger.info(f"新增伺服器: {server_info['ip']} - {server_info['path']}")
             
@@ -968,15 +1272,16 @@ class WebsitePublisher:
         index = selection[0]
         current_server = self.config['servers'][index]
         
-        server_dialog = ServerDialog(self.root, current_server)
+        server_dialog = ServerDialog(self.root, current_server, self.engine.share_sessions)
         server_info = server_dialog.get_server_info()
         if server_info:
             self.config['servers'][index] = server_info
             self.server_listbox.delete(index)
             self.server_listbox.insert(index, f"{server_info['ip']} - {server_info['path']}")
             self.server_listbox.selection_set(index)
-            self.save_config()
+            self.engine.save_config()
             self.update_server_display()
+            self.engine.apply_runtime_options()
             self.logger.info(f"編輯伺服器: {server_info['ip']} - {server_info['path']}")
             
     def test_server_connection(self):
@@ -995,80 +1300,60 @@ class WebsitePublisher:
         
     def _test_connection_worker(self, server):
         """在背景線程中測試網路共享連接"""
-        self.status_var.set(f"正在測試連接到 {server['ip']}...")
+        self.on_status(f"正在測試連接到 {server['ip']}...")
         self.logger.info(f"開始測試網路共享連接: {server['ip']}")
         
         try:
-            # 解析遠端路徑
-            remote_path = server['path']
-            remote_ip = server['ip']
-            remote_user = server['username']
-            remote_pass = server['password']
-            
+            # 1. 取得網路連線（保留期間內的連線直接沿用）
             try:
-                drive_letter = remote_path.split(':')[0]
-                dir_path = remote_path.split(':')[1].lstrip('\\')
-                
-                # 完整的 UNC 目標路徑
-                full_unc_path = f"\\\\{remote_ip}\\{drive_letter}$\\{dir_path}"
-                share_to_map = f"\\\\{remote_ip}\\{drive_letter}$"
-                
-            except IndexError:
+                self.logger.info(f"正在連線至 {server['ip']}...")
+                transport, full_unc_path, reused = self.engine.share_sessions.open_transport(server, self.engine.file_copier)
+            except ValueError:
+                remote_path = server['path']
                 error_msg = f"遠端路徑格式不正確: {remote_path}\n應為 'D:\\資料夾' 格式"
                 self.logger.error(f"路徑格式錯誤: {remote_path}")
                 self.root.after(0, lambda: messagebox.showerror("路徑錯誤", error_msg))
-                self.status_var.set("路徑格式錯誤")
+                self.on_status("路徑格式錯誤")
                 return
+            self.logger.info("沿用既有的遠端連線" if reused else "遠端連線成功")
 
-            # 網路連接命令
-            connection_command = [
-                "net", "use", share_to_map, remote_pass, f"/user:{remote_user}", "/persistent:no"
-            ]
-            disconnection_command = [
-                "net", "use", share_to_map, "/delete"
-            ]
-
-            # 1. 建立網路連接
-            self.logger.info(f"正在連線至 {share_to_map}...")
-            result = subprocess.run(connection_command, check=True, capture_output=True, text=True)
-            self.logger.info("網路共享連線成功")
-
-            # 2. 測試目標路徑是否存在
-            if os.path.exists(full_unc_path):
-                # 基本連接和路徑測試成功，進行資料夾結構檢查
-                folder_check_result = self._check_target_folders_network(full_unc_path)
+            try:
+                # 2. 測試目標路徑是否存在
+                if transport.exists(full_unc_path):
+                    # 基本連接和路徑測試成功，進行資料夾結構檢查
+                    folder_check_result = self._check_target_folders_network(full_unc_path, transport)
                 
-                if folder_check_result['success']:
-                    message = f"連接測試成功！\n伺服器: {server['ip']}\n目標路徑: {server['path']}\n網路路徑: {full_unc_path}\n資料夾結構: 正確\n狀態: 正常"
-                    self.logger.info(f"網路共享連接測試成功: {server['ip']}")
-                    self.root.after(0, lambda: messagebox.showinfo("連接測試", message))
+                    if folder_check_result['success']:
+                        message = f"連接測試成功！\n伺服器: {server['ip']}\n目標路徑: {server['path']}\n網路路徑: {full_unc_path}\n資料夾結構: 正確\n狀態: 正常"
+                        self.logger.info(f"網路共享連接測試成功: {server['ip']}")
+                        self.root.after(0, lambda: messagebox.showinfo("連接測試", message))
+                    else:
+                        message = f"連接成功但資料夾結構不完整！\n伺服器: {server['ip']}\n目標路徑: {server['path']}\n\n缺少的資料夾:\n{folder_check_result['missing_folders']}\n\n建議先執行一次發布以建立正確的資料夾結構"
+                        self.logger.warning(f"連接成功但資料夾結構不完整: {server['ip']} - 缺少: {folder_check_result['missing_folders']}")
+                        self.root.after(0, lambda: messagebox.showwarning("資料夾結構檢查", message))
                 else:
-                    message = f"連接成功但資料夾結構不完整！\n伺服器: {server['ip']}\n目標路徑: {server['path']}\n\n缺少的資料夾:\n{folder_check_result['missing_folders']}\n\n建議先執行一次發布以建立正確的資料夾結構"
-                    self.logger.warning(f"連接成功但資料夾結構不完整: {server['ip']} - 缺少: {folder_check_result['missing_folders']}")
-                    self.root.after(0, lambda: messagebox.showwarning("資料夾結構檢查", message))
-            else:
-                message = f"連接成功！\n但目標路徑不存在: {full_unc_path}\n建議檢查路徑設定或手動建立資料夾"
-                self.logger.warning(f"連接成功但路徑不存在: {server['ip']} - {full_unc_path}")
-                self.root.after(0, lambda: messagebox.showwarning("連接測試", message))
-                
-            # 3. 中斷連接
-            subprocess.run(disconnection_command, capture_output=True)
-            self.status_var.set("連接測試完成")
+                    message = f"連接成功！\n但目標路徑不存在: {full_unc_path}\n建議檢查路徑設定或手動建立資料夾"
+                    self.logger.warning(f"連接成功但路徑不存在: {server['ip']} - {full_unc_path}")
+                    self.root.after(0, lambda: messagebox.showwarning("連接測試", message))
+            finally:
+                # 3. 釋放連線（網路共享連線保留供之後的發布使用）
+                self.engine.share_sessions.close_transport(server, transport)
+            self.on_status("連接測試完成")
             
         except subprocess.CalledProcessError as e:
-            error_message = e.stderr if e.stderr else str(e)
+            error_message = e.stderr.decode('cp950', errors='ignore') if e.stderr else str(e)
             error_msg = f"網路共享連接失敗\n伺服器: {server['ip']}\n\n可能原因:\n1. 帳號密碼錯誤\n2. 網路不通\n3. 遠端主機未啟用系統管理分享(C$, D$)\n4. 防火牆阻擋\n\n詳細錯誤: {error_message}"
             self.logger.error(f"網路共享連接失敗: {server['ip']} - {error_message}")
             self.root.after(0, lambda: messagebox.showerror("連接測試失敗", error_msg))
-            self.status_var.set("連接測試失敗")
+            self.on_status("連接測試失敗")
             
         except Exception as e:
             error_msg = f"連接失敗: {str(e)}\n伺服器: {server['ip']}\n\n可能原因:\n1. IP地址錯誤\n2. 網路不通\n3. 遠端主機未開機\n4. 防火牆阻擋"
             self.logger.error(f"連接測試失敗: {server['ip']} - {str(e)}")
             self.root.after(0, lambda: messagebox.showerror("連接測試失敗", error_msg))
-            self.status_var.set("連接測試失敗")
+            self.on_status("連接測試失敗")
     
-    def _check_target_folders_network(self, full_unc_path):
+    def _check_target_folders_network(self, full_unc_path, transport):
         """檢查目標網路路徑上是否包含所有源檔案對應的資料夾"""
         result = {
             'success': True,
@@ -1093,12 +1378,8 @@ class WebsitePublisher:
                 return result
             
             # 檢查目標路徑下的資料夾
-            existing_folders = []
-            if os.path.exists(full_unc_path):
-                for item in os.listdir(full_unc_path):
-                    item_path = os.path.join(full_unc_path, item)
-                    if os.path.isdir(item_path):
-                        existing_folders.append(item)
+            existing_folders = [name for name, remote_info in transport.list_directory(full_unc_path).items()
+                                if remote_info.is_dir]
             
             # 檢查缺少的資料夾
             for expected_folder in expected_folders:
@@ -1124,7 +1405,7 @@ class WebsitePublisher:
             server = self.config['servers'][index]
             self.server_listbox.delete(index)
             del self.config['servers'][index]
-            self.save_config()
+            self.engine.save_config()
             self.update_server_display()
             self.logger.info(f"移除伺服器: {server['ip']} - {server['path']}")
             
@@ -1155,7 +1436,7 @@ class WebsitePublisher:
                 return
                 
             self.config['schedule_time'] = schedule_time.isoformat()
-            self.save_config()
+            self.engine.save_config()
             
             self.next_publish_var.set(schedule_time.strftime("%Y-%m-%d %H:%M:%S"))
             
@@ -1163,7 +1444,7 @@ class WebsitePublisher:
                 self.publish_timer.cancel()
                 
             delay = (schedule_time - now).total_seconds()
-            self.publish_timer = threading.Timer(delay, self.publish_now)
+            self.publish_timer = threading.Timer(delay, lambda: self.root.after(0, self.publish_now))
             self.publish_timer.start()
             
             self.start_countdown()
@@ -1180,7 +1461,7 @@ class WebsitePublisher:
             
         self.is_countdown_active = False
         self.config['schedule_time'] = None
-        self.save_config()
+        self.engine.save_config()
         
         self.next_publish_var.set("無排程")
         self.countdown_var.set("")
@@ -1227,121 +1508,67 @@ class WebsitePublisher:
             messagebox.showerror("錯誤", "請先設定目標伺服器")
             return
             
-        self.status_var.set("發布中...")
-        
         # 在新線程中執行發布
-        publish_thread = threading.Thread(target=self._publish_worker)
-        publish_thread.daemon = True
-        publish_thread.start()
+        self._start_engine_run(self.engine.execute, "發布中...")
         
-    def _count_total_files(self):
-        """計算總檔案數量"""
-        total_files = 0
+    def preview_publish_plan(self):
+        """以預覽模式執行與發布相同的比對，不寫入任何檔案，完成後顯示發布計畫"""
+        if not self.config['source_files']:
+            messagebox.showerror("錯誤", "請先設定發行檔案")
+            return
+            
+        if not self.config['servers']:
+            messagebox.showerror("錯誤", "請先設定目標伺服器")
+            return
         
-        for source in self.config['source_files']:
-            if os.path.isfile(source):
-                total_files += 1
-            elif os.path.isdir(source):
-                for root, dirs, files in os.walk(source):
-                    for file in files:
-                        # 跳過需要刪除的檔案
-                        if file not in self.config['delete_files']:
-                            total_files += 1
-        
-        # 乘以伺服器數量（每個伺服器都要複製一遍）
-        return total_files * len(self.config['servers'])
-
-    def _publish_worker(self):
-        start_time = datetime.now()
-        
-        # 初始化發布報告
-        self.publish_report = {
-            'servers': {},
-            'start_time': start_time,
-            'end_time': None,
-            'total_stats': {
-                'new_files': 0,
-                'updated_files': 0,
-                'skipped_files': 0,
-                'deleted_files': 0
-            }
-        }
+        self._start_engine_run(self.engine.plan, "正在建立發布計畫...")
+    
+    def _start_engine_run(self, target, status_text):
+        """在背景線程執行發布或預覽；執行期間停用發布與預覽按鈕，完成後由 on_finished 恢復"""
+        if self.engine.is_running:
+            messagebox.showwarning("提示", "已有發布或預覽正在執行，請等待完成後再試")
+            return
         
-        self.logger.info("=== 開始發布作業 ===")
-        self.logger.info(f"發布時間: {start_time.strftime('%Y-%m-%d %H:%M:%S')}")
-        self.logger.info(f"源文件數量: {len(self.config['source_files'])}")
-        self.logger.info(f"目標伺服器數量: {len(self.config['servers'])}")
+        self.status_var.set(status_text)
+        self._set_publish_buttons_state(True)
         
-        # 計算總檔案數並初始化進度條
-        total_files = self._count_total_files()
-        self.logger.info(f"預計處理檔案總數: {total_files}")
-        self.root.after(0, lambda: self.init_progress(total_files))
+        def run():
+            try:
+                target()
+            except RuntimeError as e:
+                # 與定時發布等其他執行同時開始時，由先開始的一方完成後恢復按鈕
+                self.logger.warning(str(e))
+                self.root.after(0, lambda: self._set_publish_buttons_state(self.engine.is_running))
+        
+        run_thread = threading.Thread(target=run)
+        run_thread.daemon = True
+        run_thread.start()
+    
+    def _set_publish_buttons_state(self, running):
+        """發布或預覽執行期間停用按鈕"""
+        state = 'disabled' if running else 'normal'
+        self.publish_button.config(state=state)
+        self.preview_button.config(state=state)
         
-        try:
-            success_count = 0
-            for i, server in enumerate(self.config['servers'], 1):
-                self.status_var.set(f"正在發布到 {server['ip']} ({i}/{len(self.config['servers'])})...")
-                self.logger.info(f"開始發布到伺服器 {i}/{len(self.config['servers'])}: {server['ip']}")
-                
-                server_start = datetime.now()
-                self._publish_to_server(server)
-                server_end = datetime.now()
-                server_duration = (server_end - server_start).total_seconds()
-                
-                self.logger.info(f"伺服器 {server['ip']} 發布完成，耗時 {server_duration:.2f} 秒")
-                success_count += 1
-                
-            end_time = datetime.now()
-            total_duration = (end_time - start_time).total_seconds()
-            
-            # 更新報告結束時間
-            self.publish_report['end_time'] = end_time
-            
-            self.status_var.set("發布完成")
-            self.logger.info(f"=== 發布作業完成 ===")
-            self.logger.info(f"成功發布到 {success_count}/{len(self.config['servers'])} 個伺服器")
-            self.logger.info(f"總耗時: {total_duration:.2f} 秒")
-            
-            # 在主線程中處理發布完成的所有操作
-            self.root.after(0, lambda: self._handle_publish_success(start_time, end_time))
-            
-        except Exception as e:
-            error_msg = str(e)
-            end_time = datetime.now()
-            total_duration = (end_time - start_time).total_seconds()
-            
-            self.status_var.set(f"發布失敗: {error_msg}")
-            self.logger.error(f"=== 發布作業失敗 ===")
-            self.logger.error(f"錯誤訊息: {error_msg}")
-            self.logger.error(f"失敗時間: {end_time.strftime('%Y-%m-%d %H:%M:%S')}")
-            self.logger.error(f"已執行時間: {total_duration:.2f} 秒")
-            
-            # 在主線程中處理發布失敗的所有操作
-            self.root.after(0, lambda: self._handle_publish_failure(start_time, end_time, error_msg))
-            
-    def _handle_publish_success(self, start_time, end_time):
+    def _handle_publish_success(self, result):
         """在主線程中處理發布成功的所有操作"""
         try:
             # 完成進度條
-            self.init_progress(0)
-            
-            # 保存到發布歷史（不觸發GUI刷新）
-            self.save_history_record(self.publish_report, is_success=True)
+            self.stop_progress_polling()
             
-            # 刷新歷史記錄顯示
-            if hasattr(self, 'history_tree'):
-                self.refresh_history()
+            # 在背景保存到發布歷史，完成後只加入該筆摘要
+            self._save_history_in_background(result.report, True)
             
             # 發送成功通知郵件（在背景線程中執行）
             email_thread = threading.Thread(
-                target=self._send_deployment_notification, 
-                args=(True, start_time, end_time)
+                target=self.engine.send_deployment_notification, 
+                args=(True, result.start_time, result.end_time)
             )
             email_thread.daemon = True
             email_thread.start()
             
             # 顯示發布報告
-            self._show_publish_report()
+            self._show_publish_report(result.report)
             
             # 顯示成功訊息
             self._show_success_message()
@@ -1349,38 +1576,145 @@ class WebsitePublisher:
         except Exception as e:
             self.logger.error(f"處理發布成功時發生錯誤: {str(e)}")
     
-    def _handle_publish_failure(self, start_time, end_time, error_msg):
+    def _handle_publish_failure(self, result):
         """在主線程中處理發布失敗的所有操作"""
         try:
             # 重置進度條
-            self.init_progress(0)
+            self.stop_progress_polling()
             
-            # 保存失敗記錄到歷史（不觸發GUI刷新）
-            self.save_history_record(self.publish_report, is_success=False)
-            
-            # 刷新歷史記錄顯示
-            if hasattr(self, 'history_tree'):
-                self.refresh_history()
+            # 在背景保存失敗記錄到歷史，完成後只加入該筆摘要
+            self._save_history_in_background(result.report, False)
             
             # 發送失敗通知郵件（在背景線程中執行）
             email_thread = threading.Thread(
-                target=self._send_deployment_notification, 
-                args=(False, start_time, end_time, error_msg)
+                target=self.engine.send_deployment_notification, 
+                args=(False, result.start_time, result.end_time, result.error)
             )
             email_thread.daemon = True
             email_thread.start()
             
             # 顯示錯誤訊息
-            self._show_error_message(error_msg)
+            self._show_error_message(result.error)
             
         except Exception as e:
             self.logger.error(f"處理發布失敗時發生錯誤: {str(e)}")
 
-    def _show_publish_report(self):
+    def _handle_plan_success(self, result):
+        """在主線程中處理發布計畫預覽完成"""
+        try:
+            self.stop_progress_polling()
+            self._show_publish_plan(result.plan)
+        except Exception as e:
+            self.logger.error(f"顯示發布計畫時發生錯誤: {str(e)}")
+            messagebox.showerror("錯誤", f"無法顯示發布計畫: {str(e)}")
+    
+    def _handle_plan_failure(self, result):
+        """在主線程中處理發布計畫預覽失敗（不記錄歷史、不發送通知）"""
+        self.stop_progress_polling()
+        messagebox.showerror("錯誤", f"建立發布計畫失敗: {result.error}")
+    
+    def _show_publish_plan(self, plan):
+        """顯示發布計畫預覽對話框"""
+        plan_dialog = tk.Toplevel(self.root)
+        plan_dialog.title("發布計畫預覽")
+        plan_dialog.geometry("900x550")
+        plan_dialog.resizable(True, True)
+        
+        main_frame = ttk.Frame(plan_dialog, padding="15")
+        main_frame.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        
+        # 標題
+        ttk.Label(main_frame, text="📋 發布計畫預覽（未寫入任何檔案）", font=('Arial', 14, 'bold')).grid(row=0, column=0, pady=(0, 10))
+        
+        # 總體資訊
+        total_stats = plan['total_stats']
+        info_text = (f"🖥️ 伺服器數量: {len(plan['servers'])}    "
+                     f"📁 新增: {total_stats['new_files']}    🔄 更新: {total_stats['updated_files']}    "
+                     f"⏭️ 跳過: {total_stats['skipped_files']}    🗑️ 刪除: {total_stats['deleted_files']}\n"
+                     f"📦 預計傳輸量: {format_file_size(plan['bytes_to_transfer'])}    "
+                     f"⏱️ 預估耗時: {format_duration(plan['estimated_seconds'])}（依歷史平均傳輸速率估算）")
+        ttk.Label(main_frame, text=info_text, font=('Consolas', 10)).grid(row=1, column=0, sticky=tk.W, pady=(0, 10))
+        
+        # 各伺服器與專案明細
+        tree_frame = ttk.Frame(main_frame)
+        tree_frame.grid(row=2, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        
+        columns = ('new', 'updated', 'skipped', 'deleted', 'bytes', 'estimate')
+        tree = ttk.Treeview(tree_frame, columns=columns, show='tree headings', height=15)
+        tree.heading('#0', text='伺服器 / 專案')
+        tree.heading('new', text='新增')
+        tree.heading('updated', text='更新')
+        tree.heading('skipped', text='跳過')
+        tree.heading('deleted', text='刪除')
+        tree.heading('bytes', text='傳輸量')
+        tree.heading('estimate', text='預估耗時')
+        
+        tree.column('#0', width=280, minwidth=200)
+        for column in ('new', 'updated', 'skipped', 'deleted'):
+            tree.column(column, width=70, minwidth=50, anchor=tk.E)
+        tree.column('bytes', width=100, minwidth=80, anchor=tk.E)
+        tree.column('estimate', width=120, minwidth=100)
+        
+        tree.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        
+        v_scrollbar = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL, command=tree.yview)
+        v_scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
+        tree.configure(yscrollcommand=v_scrollbar.set)
+        
+        for server_plan in plan['servers']:
+            stats = server_plan['stats']
+            server_text = server_plan['server']
+            if server_plan.get('error'):
+                server_text += f"（失敗: {server_plan['error']}）"
+            server_node = tree.insert('', 'end', text=server_text, open=True, values=(
+                stats['new_files'], stats['updated_files'], stats['skipped_files'], stats['deleted_files'],
+                format_file_size(server_plan['bytes_to_transfer']),
+                format_duration(server_plan['estimated_seconds'])))
+            
+            for project_plan in server_plan['projects']:
+                stats = project_plan['stats']
+                tree.insert(server_node, 'end', text=project_plan['project'], values=(
+                    stats['new_files'], stats['updated_files'], stats['skipped_files'], stats['deleted_files'],
+                    format_file_size(project_plan['bytes_to_transfer']), ''))
+        
+        # 按鈕區域
+        button_frame = ttk.Frame(main_frame)
+        button_frame.grid(row=3, column=0, pady=(10, 0))
+        
+        ttk.Button(button_frame, text="匯出 JSON", command=lambda: self._export_publish_plan(plan)).grid(row=0, column=0, padx=(0, 10))
+        ttk.Button(button_frame, text="關閉", command=plan_dialog.destroy).grid(row=0, column=1)
+        
+        # 設定權重
+        plan_dialog.columnconfigure(0, weight=1)
+        plan_dialog.rowconfigure(0, weight=1)
+        main_frame.columnconfigure(0, weight=1)
+        main_frame.rowconfigure(2, weight=1)
+        tree_frame.columnconfigure(0, weight=1)
+        tree_frame.rowconfigure(0, weight=1)
+    
+    def _export_publish_plan(self, plan):
+        """將發布計畫匯出為 JSON 檔案"""
+        file_path = filedialog.asksaveasfilename(
+            title="匯出發布計畫",
+            defaultextension=".json",
+            initialfile=f"publish_plan_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
+            filetypes=[("JSON 檔案", "*.json"), ("所有檔案", "*.*")]
+        )
+        if not file_path:
+            return
+        
+        try:
+            with open(file_path, 'w', encoding='utf-8') as f:
+                json.dump(plan, f, ensure_ascii=False, indent=2)
+            messagebox.showinfo("成功", f"發布計畫已匯出至 {file_path}")
+        except Exception as e:
+            messagebox.showerror("錯誤", f"匯出發布計畫失敗: {str(e)}")
+    
+    def _show_publish_report(self, report):
         """顯示發布報告對話框"""
         try:
             # 檢查發布報告是否存在
-            if not hasattr(self, 'publish_report') or not self.publish_report:
+            if not report:
                 self.logger.warning("無法顯示發布報告：報告數據不存在")
                 return
             
@@ -1413,19 +1747,23 @@ class WebsitePublisher:
             info_frame.grid(row=1, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(0, 10))
             
             # 計算總體統計
-            total_stats = self.publish_report['total_stats']
-            start_time = self.publish_report['start_time']
-            end_time = self.publish_report['end_time']
+            total_stats = report['total_stats']
+            start_time = report['start_time']
+            end_time = report['end_time']
             duration = (end_time - start_time).total_seconds() if end_time else 0
             
             info_text = f"""⏰ 發布時間: {start_time.strftime('%Y-%m-%d %H:%M:%S')}
 ⏱️ 總耗時: {duration:.1f} 秒
-🖥️ 伺服器數量: {len(self.publish_report['servers'])}
+🖥️ 伺服器數量: {len(report['servers'])}
 📁 新增檔案: {total_stats['new_files']}
 🔄 更新檔案: {total_stats['updated_files']}
 ⏭️ 跳過檔案: {total_stats['skipped_files']}
 🗑️ 刪除檔案: {total_stats['deleted_files']}
 📊 總檔案操作: {sum(total_stats.values())}"""
+            if report.get('bytes_saved'):
+                info_text += f"\n⚡ 差異傳輸節省: {format_file_size(report['bytes_saved'])}"
+            if report.get('retried_files'):
+                info_text += f"\n🔁 重試後成功: {report['retried_files']} 個檔案"
             
             info_label = ttk.Label(info_frame, text=info_text, font=('Consolas', 10))
             info_label.grid(row=0, column=0, sticky=(tk.W, tk.N))
@@ -1438,14 +1776,23 @@ class WebsitePublisher:
             notebook = ttk.Notebook(detail_frame)
             notebook.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
             
+            # 有實際操作的檔案記錄 (排除跳過的檔案)；串流模式的記錄檔只讀取一次
+            file_records = group_report_records(report, ('new', 'updated', 'deleted'))
+            
             # 為每個伺服器創建一個頁面
-            for server_key, server_data in self.publish_report['servers'].items():
+            for server_key, server_data in report['servers'].items():
                 server_frame = ttk.Frame(notebook)
                 notebook.add(server_frame, text=f"伺服器: {server_key}")
                 
                 # 創建伺服器統計資訊
                 server_stats = server_data['stats']
                 stats_text = f"📁 新增: {server_stats['new_files']} | 🔄 更新: {server_stats['updated_files']} | ⏭️ 跳過: {server_stats['skipped_files']} | 🗑️ 刪除: {server_stats['deleted_files']}"
+                if server_data.get('throughput'):
+                    stats_text += f" | 📶 平均速率: {format_file_size(server_data['throughput'])}/s"
+                if server_data.get('bytes_saved'):
+                    stats_text += f" | ⚡ 差異傳輸節省: {format_file_size(server_data['bytes_saved'])}"
+                if server_data.get('retried_files'):
+                    stats_text += f" | 🔁 重試: {server_data['retried_files']} 個檔案"
                 stats_label = ttk.Label(server_frame, text=stats_text, font=('Arial', 9))
                 stats_label.grid(row=0, column=0, sticky=(tk.W), pady=(0, 10))
                 
@@ -1493,8 +1840,7 @@ class WebsitePublisher:
                     project_node = tree.insert('', 'end', text=project_text, values=('', '', '', ''))
                     
                     # 添加有實際操作的檔案記錄 (排除跳過的檔案)
-                    actual_operations = [f for f in project_data['files'] if f['operation'] != 'skipped']
-                    for file_info in actual_operations:
+                    for file_info in file_records[(server_key, project_name)]:
                         operation_icons = {
                             'new': '📄 新增',
                             'updated': '🔄 更新', 
@@ -1609,97 +1955,94 @@ class WebsitePublisher:
             # 排序出錯時不影響主要功能
             print(f"排序錯誤: {e}")
     
-    def save_history_record(self, report, is_success=True):
-        """保存發布記錄到歷史"""
+    def refresh_history(self, page=None):
+        """刷新歷史記錄顯示（只載入目前頁面的摘要）"""
         try:
-            # 創建歷史記錄目錄
-            if not os.path.exists('history'):
-                os.makedirs('history')
-            
-            # 生成歷史記錄項目
-            history_item = {
-                'id': report['start_time'].strftime('%Y%m%d_%H%M%S'),
-                'start_time': report['start_time'].isoformat(),
-                'end_time': report['end_time'].isoformat() if report['end_time'] else None,
-                'duration': (report['end_time'] - report['start_time']).total_seconds() if report['end_time'] else 0,
-                'server_count': len(report['servers']),
-                'total_stats': report['total_stats'].copy(),
-                'servers': report['servers'].copy(),
-                'status': '成功' if is_success else '失敗'
-            }
+            self.history_loaded = True
             
-            # 載入現有歷史記錄
-            history_file = 'history/publish_history.json'
-            history_records = []
-            if os.path.exists(history_file):
-                try:
-                    with open(history_file, 'r', encoding='utf-8') as f:
-                        history_records = json.load(f)
-                except:
-                    history_records = []
-            
-            # 添加新記錄到列表開頭（最新的在最上面）
-            history_records.insert(0, history_item)
-            
-            # 保留最近100筆記錄
-            if len(history_records) > 100:
-                history_records = history_records[:100]
-            
-            # 保存歷史記錄
-            with open(history_file, 'w', encoding='utf-8') as f:
-                json.dump(history_records, f, ensure_ascii=False, indent=2)
-            
-            self.logger.info(f"發布記錄已保存到歷史 ID: {history_item['id']}")
-            
-        except Exception as e:
-            self.logger.error(f"保存歷史記錄失敗: {str(e)}")
-    
-    def load_history_records(self):
-        """載入歷史記錄"""
-        try:
-            history_file = 'history/publish_history.json'
-            if not os.path.exists(history_file):
-                return []
-            
-            with open(history_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except Exception as e:
-            self.logger.error(f"載入歷史記錄失敗: {str(e)}")
-            return []
-    
-    def refresh_history(self):
-        """刷新歷史記錄顯示"""
-        try:
             # 清空現有項目
             for item in self.history_tree.get_children():
                 self.history_tree.delete(item)
             
+            # 計算頁數，超出範圍時停在第一頁或最後一頁
+            status = self._get_history_status_filter()
+            total = self.engine.count_history_records(status)
+            page_count = max(1, (total + HISTORY_PAGE_SIZE - 1) // HISTORY_PAGE_SIZE)
+            if page is not None:
+                self.history_page = page
+            self.history_page = min(max(0, self.history_page), page_count - 1)
+            self._update_history_page_label(total)
+            
             # 載入歷史記錄
-            history_records = self.load_history_records()
+            history_records = self.engine.load_history_records(HISTORY_PAGE_SIZE, self.history_page * HISTORY_PAGE_SIZE, status)
             
             # 填充到TreeView
             for record in history_records:
-                start_time = datetime.fromisoformat(record['start_time']).strftime('%Y-%m-%d %H:%M:%S')
-                duration = f"{record['duration']:.1f}"
-                server_count = str(record['server_count'])
-                
-                # 計算總檔案操作數
-                total_ops = (record['total_stats']['new_files'] + 
-                           record['total_stats']['updated_files'] + 
-                           record['total_stats']['skipped_files'] + 
-                           record['total_stats']['deleted_files'])
-                
-                status = record['status']
-                
-                self.history_tree.insert('', 'end', iid=record['id'], values=(
-                    start_time, duration, server_count, str(total_ops), status
-                ))
+                self._insert_history_row(record)
             
             self.logger.info(f"已載入 {len(history_records)} 筆歷史記錄")
             
         except Exception as e:
             self.logger.error(f"刷新歷史記錄失敗: {str(e)}")
     
+    def _get_history_status_filter(self):
+        status = self.history_status_var.get()
+        return None if status == '全部' else status
+    
+    def _update_history_page_label(self, total):
+        page_count = max(1, (total + HISTORY_PAGE_SIZE - 1) // HISTORY_PAGE_SIZE)
+        self.history_page_var.set(f"第 {self.history_page + 1} / {page_count} 頁，共 {total} 筆")
+    
+    def _insert_history_row(self, record, index='end'):
+        """將一筆歷史摘要加入列表"""
+        start_time = datetime.fromisoformat(record['start_time']).strftime('%Y-%m-%d %H:%M:%S')
+        duration = f"{record['duration']:.1f}"
+        server_count = str(record['server_count'])
+        
+        # 計算總檔案操作數
+        total_ops = (record['total_stats']['new_files'] + 
+                   record['total_stats']['updated_files'] + 
+                   record['total_stats']['skipped_files'] + 
+                   record['total_stats']['deleted_files'])
+        
+        self.history_tree.insert('', index, iid=str(record['run_id']), values=(
+            start_time, duration, server_count, str(total_ops), record['status']
+        ))
+    
+    def _on_notebook_tab_changed(self, notebook, history_frame):
+        """第一次切換到發布歷史頁面時才載入列表"""
+        if not self.history_loaded and notebook.select() == str(history_frame):
+            self.refresh_history()
+    
+    def _save_history_in_background(self, report, is_success):
+        """在背景執行緒寫入發布歷史（大量檔案時寫入逐檔操作需要時間），完成後只把該筆摘要加入列表"""
+        def save():
+            run_id = self.engine.save_history_record(report, is_success=is_success)
+            if run_id is not None:
+                self.root.after(0, lambda: self._add_history_summary(run_id))
+        
+        history_thread = threading.Thread(target=save)
+        history_thread.daemon = True
+        history_thread.start()
+    
+    def _add_history_summary(self, run_id):
+        """新的發布記錄寫入後更新列表：在第一頁且符合篩選時插入頂端，不重新載入整頁"""
+        if not self.history_loaded:
+            return
+        try:
+            record = self.engine.load_history_summary(run_id)
+            if record is None:
+                return
+            status = self._get_history_status_filter()
+            if self.history_page == 0 and status in (None, record['status']):
+                self._insert_history_row(record, 0)
+                children = self.history_tree.get_children()
+                for item in children[HISTORY_PAGE_SIZE:]:
+                    self.history_tree.delete(item)
+            self._update_history_page_label(self.engine.count_history_records(status))
+        except Exception as e:
+            self.logger.error(f"刷新歷史記錄失敗: {str(e)}")
+    
     def view_history_detail(self, event):
         """查看歷史記錄詳情"""
         try:
@@ -1708,22 +2051,14 @@ class WebsitePublisher:
             if not selection:
                 return
             
-            record_id = selection[0]
-            
-            # 載入歷史記錄
-            history_records = self.load_history_records()
-            target_record = None
-            
-            for record in history_records:
-                if record['id'] == record_id:
-                    target_record = record
-                    break
-            
+            # 只在此時載入該筆歷史記錄的伺服器與專案資料，產生文字後即釋放
+            target_record = self.engine.load_history_record(int(selection[0]))
             if not target_record:
                 return
             
             # 生成詳細報告文字
-            detail_text = self._generate_history_detail_text(target_record)
+            detail_text = self.engine.history_detail_text(target_record)
+            del target_record
             
             # 顯示在詳細信息區域
             self.history_detail_text.config(state='normal')
@@ -1734,60 +2069,50 @@ class WebsitePublisher:
         except Exception as e:
             self.logger.error(f"查看歷史詳情失敗: {str(e)}")
     
-    def _generate_history_detail_text(self, record):
-        """生成歷史記錄詳細文字"""
-        lines = []
-        
-        # 基本資訊
-        start_time = datetime.fromisoformat(record['start_time']).strftime('%Y-%m-%d %H:%M:%S')
-        end_time = datetime.fromisoformat(record['end_time']).strftime('%Y-%m-%d %H:%M:%S') if record['end_time'] else '未知'
-        
-        lines.append(f"📋 發布資訊")
-        lines.append(f"   記錄ID: {record['id']}")
-        lines.append(f"   開始時間: {start_time}")
-        lines.append(f"   結束時間: {end_time}")
-        lines.append(f"   總耗時: {record['duration']:.2f} 秒")
-        lines.append(f"   狀態: {record['status']}")
-        lines.append("")
-        
-        # 總體統計
-        stats = record['total_stats']
-        lines.append(f"📊 總體統計")
-        lines.append(f"   新增檔案: {stats['new_files']} 個")
-        lines.append(f"   覆蓋檔案: {stats['updated_files']} 個")
-        lines.append(f"   跳過檔案: {stats['skipped_files']} 個")
-        lines.append(f"   刪除檔案: {stats['deleted_files']} 個")
-        lines.append("")
-        
-        # 各伺服器詳情
-        lines.append(f"🖥️ 伺服器詳情")
-        for server_key, server_data in record['servers'].items():
-            lines.append(f"   ── {server_key} ──")
-            server_stats = server_data['stats']
-            lines.append(f"   統計: 新增 {server_stats['new_files']}, 覆蓋 {server_stats['updated_files']}, 跳過 {server_stats['skipped_files']}, 刪除 {server_stats['deleted_files']}")
-            
-            for project_name, project_data in server_data['projects'].items():
-                lines.append(f"   📁 {project_name}")
-                project_stats = project_data['stats']
-                lines.append(f"      統計: 新增 {project_stats['new_files']}, 覆蓋 {project_stats['updated_files']}, 跳過 {project_stats['skipped_files']}, 刪除 {project_stats['deleted_files']}")
-                
-                # 過濾並顯示有實際操作的檔案 (排除跳過的檔案)
-                actual_operations = [f for f in project_data['files'] if f['operation'] != 'skipped']
-                if actual_operations:
-                    lines.append(f"      檔案操作 (顯示前10個實際操作):")
-                    for i, file_info in enumerate(actual_operations[:10]):
-                        operation_name = {
-                            'new': '新增',
-                            'updated': '覆蓋',
-                            'deleted': '刪除'
-                        }.get(file_info['operation'], '未知')
-                        lines.append(f"        [{file_info['timestamp']}] {operation_name}: {file_info['path']}")
-                    
-                    if len(actual_operations) > 10:
-                        lines.append(f"        ... 還有 {len(actual_operations) - 10} 個實際操作")
-                lines.append("")
+    def search_file_history(self):
+        """查詢檔案路徑在各次發布的部署記錄，結果顯示在詳細信息區域"""
+        query = self.history_search_var.get().strip()
+        if not query:
+            messagebox.showwarning("提示", "請輸入要查詢的檔案路徑，例如 web.config 或 css/site.css")
+            return
         
-        return '\n'.join(lines)
+        try:
+            results = self.engine.search_file_history(query, include_skipped=self.history_search_skipped_var.get())
+            
+            self.history_detail_text.config(state='normal')
+            self.history_detail_text.delete('1.0', tk.END)
+            self.history_detail_text.insert(tk.END, self._format_file_search_results(query, results))
+            self.history_detail_text.config(state='disabled')
+            
+            self.logger.info(f"查詢檔案部署記錄「{query}」: {len(results)} 筆")
+            
+        except Exception as e:
+            self.logger.error(f"查詢檔案部署記錄失敗: {str(e)}")
+            messagebox.showerror("錯誤", f"查詢部署記錄失敗: {str(e)}")
+    
+    def _format_file_search_results(self, query, results):
+        """將檔案部署記錄整理成文字，依發布時間由新到舊"""
+        if not results:
+            return f"🔍 找不到符合「{query}」的檔案部署記錄"
+        
+        operation_icons = {
+            'new': '📄 新增',
+            'updated': '🔄 更新',
+            'skipped': '⏭️ 跳過',
+            'deleted': '🗑️ 刪除'
+        }
+        lines = [f"🔍 檔案部署記錄「{query}」: {len(results)} 筆（依發布時間由新到舊）"]
+        if len(results) >= HISTORY_SEARCH_LIMIT:
+            lines.append(f"   只顯示最近 {HISTORY_SEARCH_LIMIT} 筆，請輸入更完整的路徑縮小範圍")
+        for record in results:
+            start_time = datetime.fromisoformat(record['start_time']).strftime('%Y-%m-%d %H:%M:%S')
+            operation_text = operation_icons.get(record['operation'], record['operation'])
+            lines.append("")
+            lines.append(f"[{start_time}] {operation_text} {record['path']}")
+            lines.append(f"   伺服器: {record['server']}  專案: {record['project']}  發布狀態: {record['status']}")
+            if record['detail']:
+                lines.append(f"   {record['detail']}")
+        return "\n".join(lines)
     
     def delete_selected_history(self):
         """刪除選中的歷史記錄"""
@@ -1801,17 +2126,8 @@ class WebsitePublisher:
             if not messagebox.askyesno("確認刪除", "確定要刪除選中的發布記錄嗎？"):
                 return
             
-            # 載入歷史記錄
-            history_records = self.load_history_records()
-            
             # 刪除選中的記錄
-            for record_id in selection:
-                history_records = [r for r in history_records if r['id'] != record_id]
-            
-            # 保存更新後的歷史記錄
-            history_file = 'history/publish_history.json'
-            with open(history_file, 'w', encoding='utf-8') as f:
-                json.dump(history_records, f, ensure_ascii=False, indent=2)
+            self.engine.delete_history_records([int(run_id) for run_id in selection])
             
             # 刷新顯示
             self.refresh_history()
@@ -1834,10 +2150,8 @@ class WebsitePublisher:
             if not messagebox.askyesno("確認清除", "確定要清除所有發布歷史記錄嗎？\n此操作無法復原！"):
                 return
             
-            # 清除歷史記錄檔案
-            history_file = 'history/publish_history.json'
-            if os.path.exists(history_file):
-                os.remove(history_file)
+            # 清除歷史記錄
+            self.engine.clear_history()
             
             # 刷新顯示
             self.refresh_history()
@@ -1860,433 +2174,9 @@ class WebsitePublisher:
     def _show_error_message(self, error_msg):
         messagebox.showerror("錯誤", f"發布失敗: {error_msg}")
     
-    def _send_email(self, recipients, subject, content):
-        """發送電子郵件"""
-        if not self.config['smtp_config']['smtp_server'] or not recipients:
-            return
-        
-        try:
-            smtp_config = self.config['smtp_config']
-            
-            # 創建郵件
-            msg = MIMEMultipart()
-            # 如果沒有配置用戶名，使用預設的 VSCC 發件人地址
-            from_email = smtp_config['username'] if smtp_config['username'].strip() else 'noreply@vscc.org.tw'
-            msg['From'] = from_email
-            msg['To'] = ', '.join(recipients)
-            msg['Subject'] = Header(subject, 'utf-8')
-            
-            # 添加郵件內容
-            msg.attach(MIMEText(content, 'plain', 'utf-8'))
-            
-            # 發送郵件
-            server = smtplib.SMTP(smtp_config['smtp_server'], smtp_config['smtp_port'])
-            if smtp_config['use_tls']:
-                # 檢查是否為 IP 地址
-                import re
-                is_ip = re.match(r'^\d+\.\d+\.\d+\.\d+$', smtp_config['smtp_server'])
-                if is_ip:
-                    # 對於 IP 地址，跳過主機名驗證
-                    import ssl
-                    context = ssl.create_default_context()
-                    context.check_hostname = False
-                    context.verify_mode = ssl.CERT_NONE
-                    server.starttls(context=context)
-                else:
-                    server.starttls()
-            
-            # 只有在提供用戶名時才進行身份驗證
-            if smtp_config['username'].strip():
-                server.login(smtp_config['username'], smtp_config['password'])
-            server.send_message(msg)
-            server.quit()
-            
-            self.logger.info(f"郵件發送成功，收件者: {', '.join(recipients)}")
-            
-        except Exception as e:
-            self.logger.error(f"郵件發送失敗: {str(e)}")
-    
-    def _send_deployment_notification(self, is_success, start_time, end_time, error_msg=None):
-        """發送部署結果通知郵件"""
-        if not self.config['notification_emails'] or not self.config['smtp_config']['smtp_server']:
-            return
-        
-        # 只對定時發布發送郵件通知
-        if not self.config.get('schedule_time'):
-            return
-        
-        try:
-            date_str = datetime.now().strftime('%Y-%m-%d')
-            status = "成功" if is_success else "失敗"
-            subject = f"網站發布通知 - {date_str} - {status}"
-            
-            # 讀取日誌檔案內容
-            log_content = ""
-            try:
-                log_file = f'logs/publish_{datetime.now().strftime("%Y%m%d")}.log'
-                if os.path.exists(log_file):
-                    with open(log_file, 'r', encoding='utf-8') as f:
-                        lines = f.readlines()
-                        # 獲取最近的發布日誌（從開始時間之後的日誌）
-                        relevant_lines = []
-                        for line in lines:
-                            if start_time.strftime('%Y-%m-%d %H:%M') in line:
-                                relevant_lines = lines[lines.index(line):]
-                                break
-                        log_content = ''.join(relevant_lines[-50:])  # 最後50行
-            except Exception as e:
-                log_content = f"無法讀取日誌檔案: {str(e)}"
-            
-            duration = (end_time - start_time).total_seconds()
-            
-            content = f"""網站發布助手自動部署通知
-
-部署狀態: {status}
-部署日期: {date_str}
-開始時間: {start_time.strftime('%Y-%m-%d %H:%M:%S')}
-結束時間: {end_time.strftime('%Y-%m-%d %H:%M:%S')}
-執行時間: {duration:.2f} 秒
-目標伺服器數量: {len(self.config['servers'])}
-
-"""
-            
-            if error_msg:
-                content += f"錯誤訊息: {error_msg}\n\n"
-            
-            content += f"""伺服器列表:
-"""
-            for i, server in enumerate(self.config['servers'], 1):
-                content += f"{i}. {server['ip']} - {server['path']}\n"
-            
-            content += f"""
-
-發布日誌:
-==========================================
-{log_content}
-==========================================
-
-此為系統自動發送的通知郵件。
-網站發布助手 v2.0
-"""
-            
-            # 發送郵件
-            self._send_email(self.config['notification_emails'], subject, content)
-            self.logger.info(f"部署通知郵件已發送給 {len(self.config['notification_emails'])} 位收件者")
-            
-        except Exception as e:
-            self.logger.error(f"發送部署通知郵件失敗: {str(e)}")
-    
-    def _send_error_notification(self, error_type, error_msg):
-        """發送程式異常通知郵件"""
-        if not self.config['notification_emails'] or not self.config['smtp_config']['smtp_server']:
-            return
-        
-        try:
-            date_str = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            subject = f"網站發布助手異常通知 - {error_type} - {date_str}"
-            
-            content = f"""網站發布助手程式異常通知
-
-異常類型: {error_type}
-發生時間: {date_str}
-錯誤訊息: {error_msg}
-
-程式狀態: 異常終止
-
-請檢查系統狀態並重新啟動程式。
-
-此為系統自動發送的異常通知郵件。
-網站發布助手 v2.0
-"""
-            
-            # 發送郵件
-            self._send_email(self.config['notification_emails'], subject, content)
-            self.logger.error(f"異常通知郵件已發送: {error_type}")
-            
-        except Exception as e:
-            self.logger.error(f"發送異常通知郵件失敗: {str(e)}")
-            
-    def _publish_to_server(self, server):
-        """使用Windows網路共享方式合併式發布到伺服器"""
-        try:
-            # 初始化伺服器報告
-            server_key = f"{server['ip']} ({server['path']})"
-            self.publish_report['servers'][server_key] = {
-                'projects': {},
-                'stats': {
-                    'new_files': 0,
-                    'updated_files': 0,
-                    'skipped_files': 0,
-                    'deleted_files': 0
-                }
-            }
-            self.current_server_key = server_key
-            
-            # 解析遠端路徑設定
-            remote_path = server['path']
-            remote_ip = server['ip']
-            remote_user = server['username']
-            remote_pass = server['password']
-            
-            try:
-                drive_letter = remote_path.split(':')[0]
-                dir_path = remote_path.split(':')[1].lstrip('\\')
-                
-                # 完整的 UNC 目標路徑
-                full_unc_path = f"\\\\{remote_ip}\\{drive_letter}$\\{dir_path}"
-                share_to_map = f"\\\\{remote_ip}\\{drive_letter}$"
-                
-            except IndexError:
-                raise Exception(f"遠端路徑格式不正確: {remote_path}，應為 'D:\\資料夾' 格式")
-
-            # 網路連接命令
-            connection_command = [
-                "net", "use", share_to_map, remote_pass, f"/user:{remote_user}", "/persistent:no"
-            ]
-            disconnection_command = [
-                "net", "use", share_to_map, "/delete"
-            ]
-
-            try:
-                # 1. 建立網路連接
-                self.logger.info(f"正在連線至 {share_to_map}...")
-                subprocess.run(connection_command, check=True, capture_output=True)
-                self.logger.info("✅ 遠端主機連線成功")
-
-                # 2. 確保遠端目標目錄存在
-                if not os.path.exists(full_unc_path):
-                    self.logger.info(f"⚠️ 警告: 遠端目錄 '{full_unc_path}' 不存在，正在嘗試建立...")
-                    os.makedirs(full_unc_path)
-                
-                # 3. 合併式部署 - 覆蓋衝突檔案，保留其餘檔案
-                for source in self.config['source_files']:
-                    if os.path.isfile(source):
-                        project_name = os.path.splitext(os.path.basename(source))[0]
-                    elif os.path.isdir(source):
-                        project_name = os.path.basename(source)
-                    else:
-                        continue
-                        
-                    remote_target_dir = os.path.join(full_unc_path, project_name)
-                    
-                    # 初始化專案報告
-                    self.publish_report['servers'][self.current_server_key]['projects'][project_name] = {
-                        'files': [],
-                        'stats': {
-                            'new_files': 0,
-                            'updated_files': 0,
-                            'skipped_files': 0,
-                            'deleted_files': 0
-                        }
-                    }
-                    self.current_project = project_name
-                    
-                    self.logger.info(f"正在合併部署 '{source}' 至 '{remote_target_dir}'...")
-                    
-                    try:
-                        # 確保目標專案目錄存在
-                        if not os.path.exists(remote_target_dir):
-                            self.logger.info(f"  建立目標專案目錄: {remote_target_dir}")
-                            os.makedirs(remote_target_dir)
-                        
-                        if os.path.isfile(source):
-                            # 單一檔案處理 - 直接複製覆蓋
-                            target_file = os.path.join(remote_target_dir, os.path.basename(source))
-                            filename = os.path.basename(source)
-                            
-                            # 檢查是否為覆蓋還是新增
-                            if os.path.exists(target_file):
-                                # 比較檔案
-                                src_size = os.path.getsize(source)
-                                dst_size = os.path.getsize(target_file)
-                                src_mtime = os.path.getmtime(source)
-                                dst_mtime = os.path.getmtime(target_file)
-                                
-                                if src_size == dst_size and abs(src_mtime - dst_mtime) < 2:
-                                    operation_type = 'skipped'
-                                    operation_detail = "檔案內容相同"
-                                    self.logger.info(f"  ⏭️ 跳過相同檔案: {filename}")
-                                else:
-                                    operation_type = 'updated'
-                                    operation_detail = f"大小: {src_size} bytes, 修改時間: {datetime.fromtimestamp(src_mtime).strftime('%Y-%m-%d %H:%M:%S')}"
-                                    self.logger.info(f"  🔄 覆蓋檔案: {filename}")
-                                    shutil.copy2(source, target_file)
-                            else:
-                                operation_type = 'new'
-                                src_size = os.path.getsize(source)
-                                src_mtime = os.path.getmtime(source)
-                                operation_detail = f"大小: {src_size} bytes, 修改時間: {datetime.fromtimestamp(src_mtime).strftime('%Y-%m-%d %H:%M:%S')}"
-                                self.logger.info(f"  ➕ 新增檔案: {filename}")
-                                shutil.copy2(source, target_file)
-                            
-                            # 記錄檔案操作
-                            self._record_file_operation(operation_type, "", filename, operation_detail)
-                            
-                            # 更新進度
-                            if hasattr(self, 'update_progress'):
-                                self.update_progress(1)
-                            
-                        elif os.path.isdir(source):
-                            # 目錄處理 - 合併複製，保留不衝突的檔案
-                            self.logger.info(f"  📁 開始合併目錄內容...")
-                            self._merge_directory_to_target(source, remote_target_dir)
-                        
-                        self.logger.info(f"  ✅ 專案 '{project_name}' 合併部署成功！")
-                        
-                    except Exception as e:
-                        self.logger.error(f"  ❌ 合併部署失敗: {e}")
-                        raise  # 重新拋出異常以中止後續操作
-                
-                self.logger.info("✅ 所有專案合併式部署成功！")
-
-            except subprocess.CalledProcessError as e:
-                error_message = e.stderr.decode('cp950', errors='ignore') if e.stderr else str(e)
-                self.logger.error("❌ 錯誤: 建立遠端連線失敗")
-                self.logger.error("請確認：1.帳號密碼正確 2.防火牆設定 3.遠端主機已啟用系統管理分享(C$, D$)")
-                self.logger.error(f"詳細錯誤: {error_message.strip()}")
-                raise Exception(f"網路連線失敗: {error_message.strip()}")
-            
-            finally:
-                # 4. 中斷連線
-                self.logger.info("正在中斷遠端連線...")
-                subprocess.run(disconnection_command, capture_output=True)
-                self.logger.info("--- 遠端傳輸流程結束 ---")
-                
-        except Exception as e:
-            self.logger.error(f"發布到伺服器失敗: {server['ip']} - {str(e)}")
-            raise
-    
-    def _record_file_operation(self, operation_type, relative_path, filename, detail):
-        """記錄檔案操作到報告中"""
-        if not hasattr(self, 'current_server_key') or not hasattr(self, 'current_project'):
-            return
-            
-        # 構建完整的檔案路徑
-        if relative_path:
-            full_path = f"{relative_path}/{filename}" if relative_path else filename
-        else:
-            full_path = filename
-            
-        # 記錄到專案報告
-        project_report = self.publish_report['servers'][self.current_server_key]['projects'][self.current_project]
-        project_report['files'].append({
-            'path': full_path,
-            'operation': operation_type,
-            'detail': detail,
-            'timestamp': datetime.now().strftime('%H:%M:%S')
-        })
-        
-        # 更新統計
-        if operation_type == 'new':
-            key = 'new_files'
-        elif operation_type == 'updated':
-            key = 'updated_files'
-        elif operation_type == 'skipped':
-            key = 'skipped_files'
-        elif operation_type == 'deleted':
-            key = 'deleted_files'
-        else:
-            return
-            
-        # 更新專案統計
-        project_report['stats'][key] += 1
-        
-        # 更新伺服器統計
-        self.publish_report['servers'][self.current_server_key]['stats'][key] += 1
-        
-        # 更新總體統計
-        self.publish_report['total_stats'][key] += 1
-    
-    def _merge_directory_to_target(self, src_dir, dst_dir, relative_path=""):
-        """合併式複製目錄到目標位置，覆蓋衝突檔案，保留不衝突檔案"""
-        # 確保目標目錄存在
-        if not os.path.exists(dst_dir):
-            os.makedirs(dst_dir)
-        
-        for item in os.listdir(src_dir):
-            # 檢查是否為需要刪除的檔案，如果是則跳過
-            if item in self.config['delete_files']:
-                self.logger.info(f"    ⏭️ 跳過複製需刪除的檔案: {item}")
-                self._record_file_operation('deleted', relative_path, item, "跳過複製需刪除的檔案")
-                continue
-                
-            src_item = os.path.join(src_dir, item)
-            dst_item = os.path.join(dst_dir, item)
-            item_relative_path = os.path.join(relative_path, item) if relative_path else item
-            
-            if os.path.isfile(src_item):
-                # 檔案處理：檢查是否需要複製
-                should_copy = True
-                operation_type = 'new'
-                operation_detail = ""
-                
-                if os.path.exists(dst_item):
-                    # 比較檔案大小和修改時間
-                    src_size = os.path.getsize(src_item)
-                    dst_size = os.path.getsize(dst_item)
-                    src_mtime = os.path.getmtime(src_item)
-                    dst_mtime = os.path.getmtime(dst_item)
-                    
-                    if src_size == dst_size and abs(src_mtime - dst_mtime) < 2:
-                        # 檔案相同，跳過複製
-                        self.logger.info(f"    ⏭️ 跳過相同檔案: {item}")
-                        should_copy = False
-                        operation_type = 'skipped'
-                        operation_detail = "檔案內容相同"
-                        # 更新進度
-                        if hasattr(self, 'update_progress'):
-                            self.update_progress(1)
-                    else:
-                        self.logger.info(f"    🔄 覆蓋檔案: {item} (大小或時間不同)")
-                        operation_type = 'updated'
-                        operation_detail = f"大小: {src_size} bytes, 修改時間: {datetime.fromtimestamp(src_mtime).strftime('%Y-%m-%d %H:%M:%S')}"
-                else:
-                    self.logger.info(f"    ➕ 新增檔案: {item}")
-                    operation_type = 'new'
-                    src_size = os.path.getsize(src_item)
-                    src_mtime = os.path.getmtime(src_item)
-                    operation_detail = f"大小: {src_size} bytes, 修改時間: {datetime.fromtimestamp(src_mtime).strftime('%Y-%m-%d %H:%M:%S')}"
-                
-                # 記錄檔案操作
-                self._record_file_operation(operation_type, relative_path, item, operation_detail)
-                
-                if should_copy:
-                    shutil.copy2(src_item, dst_item)
-                    # 更新進度
-                    if hasattr(self, 'update_progress'):
-                        self.update_progress(1)
-                
-            elif os.path.isdir(src_item):
-                # 目錄處理：遞迴合併
-                if os.path.exists(dst_item):
-                    self.logger.info(f"    📁 合併目錄: {item}")
-                else:
-                    self.logger.info(f"    📁 建立目錄: {item}")
-                self._merge_directory_to_target(src_item, dst_item, item_relative_path)
-            
-
-                
     def load_config(self):
         try:
-            if os.path.exists('config.json'):
-                with open('config.json', 'r', encoding='utf-8') as f:
-                    loaded_config = json.load(f)
-                    # 合併配置，確保新鍵不會丟失
-                    for key, value in loaded_config.items():
-                        self.config[key] = value
-                    
-                    # 確保所有必要的鍵都存在
-                    if 'notification_emails' not in self.config:
-                        self.config['notification_emails'] = []
-                    if 'smtp_config' not in self.config:
-                        self.config['smtp_config'] = {
-                            'smtp_server': '',
-                            'smtp_port': 587,
-                            'username': '',
-                            'password': '',
-                            'use_tls': True
-                        }
-                    
+            if self.engine.read_config_file():
                 # 清空現有GUI內容
                 self.source_listbox.delete(0, tk.END)
                 self.delete_listbox.delete(0, tk.END)
@@ -2314,6 +2204,29 @@ class WebsitePublisher:
                     self.smtp_password_var.set(smtp_config.get('password', ''))
                     self.use_tls_var.set(smtp_config.get('use_tls', True))
                 
+                # 載入進階設定
+                publish_options = self.config['publish_options']
+                if hasattr(self, 'max_parallel_servers_var'):
+                    self.max_parallel_servers_var.set(str(publish_options['max_parallel_servers']))
+                    self.copy_workers_var.set(str(publish_options['copy_workers']))
+                    self.compare_mode_var.set(publish_options['compare_mode'])
+                    self.use_remote_manifest_var.set(publish_options['use_remote_manifest'])
+                    self.verify_remote_manifest_var.set(publish_options['verify_remote_manifest'])
+                    self.delta_transfer_var.set(publish_options['delta_transfer'])
+                    self.delta_min_size_var.set(str(publish_options['delta_min_size_kb']))
+                    self.staged_deploy_var.set(publish_options['staged_deploy'])
+                    self.resume_interrupted_var.set(publish_options['resume_interrupted'])
+                    self.copy_chunk_var.set(str(publish_options['copy_chunk_kb']))
+                    self.copy_preallocate_var.set(publish_options['copy_preallocate'])
+                    self.copy_offload_var.set(publish_options['copy_offload'])
+                    self.global_bandwidth_var.set(str(publish_options['global_bandwidth_limit_mbps']))
+                    self.retry_attempts_var.set(str(publish_options['retry_attempts']))
+                    self.retry_base_delay_var.set(str(publish_options['retry_base_delay']))
+                    self.share_session_idle_var.set(str(publish_options['share_session_idle_minutes']))
+                    self.file_log_detail_var.set(publish_options['file_log_detail'])
+                    self.log_max_size_var.set(str(publish_options['log_max_size_mb']))
+                    self.stream_file_operations_var.set(publish_options['stream_file_operations'])
+                
                 # 載入通知人員名單
                 if hasattr(self, 'notify_listbox'):
                     for email in self.config.get('notification_emails', []):
@@ -2325,7 +2238,7 @@ class WebsitePublisher:
                     if schedule_time > datetime.now():
                         self.next_publish_var.set(schedule_time.strftime("%Y-%m-%d %H:%M:%S"))
                         delay = (schedule_time - datetime.now()).total_seconds()
-                        self.publish_timer = threading.Timer(delay, self.publish_now)
+                        self.publish_timer = threading.Timer(delay, lambda: self.root.after(0, self.publish_now))
                         self.publish_timer.start()
                         self.start_countdown()
                     else:
@@ -2334,13 +2247,6 @@ class WebsitePublisher:
         except Exception as e:
             print(f"載入配置失敗: {e}")
             
-    def save_config(self):
-        try:
-            with open('config.json', 'w', encoding='utf-8') as f:
-                json.dump(self.config, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            print(f"儲存配置失敗: {e}")
-            
     def run(self):
         try:
             self.root.mainloop()
@@ -2348,11 +2254,12 @@ class WebsitePublisher:
             error_msg = str(e)
             self.logger.error(f"程式異常終止: {error_msg}")
             # 發送異常通知郵件
-            self._send_error_notification("程式異常終止", error_msg)
+            self.engine.send_error_notification("程式異常終止", error_msg)
             raise
         finally:
             if self.publish_timer:
                 self.publish_timer.cancel()
+            self.engine.share_sessions.close_all()
 
     def get_directory_info(self, directory):
         """獲取資料夾的檔案數量和總大小"""
@@ -2414,7 +2321,7 @@ class WebsitePublisher:
                 os.makedirs(dst_dir)
             
             # 複製檔案
-            shutil.copy2(src_file, dst_file)
+            self.engine.file_copier.copy(src_file, dst_file)
             
             # 更新進度
             try:
@@ -2444,13 +2351,15 @@ class WebsitePublisher:
 
 
 class ServerDialog:
-    def __init__(self, parent, server_info=None):
+    def __init__(self, parent, server_info=None, share_sessions=None):
         self.result = None
         self.server_info = server_info
+        # 與主程式共用的網路共享連線管理（測試連接後保留連線供發布使用）
+        self.share_sessions = share_sessions or NetUseSessionManager(idle_seconds=0)
         
         self.dialog = tk.Toplevel(parent)
         self.dialog.title("編輯伺服器" if server_info else "新增伺服器")
-        self.dialog.geometry("700x350")
+        self.dialog.geometry("700x500")
         self.dialog.resizable(False, False)
         self.dialog.grab_set()
         
@@ -2504,9 +2413,38 @@ class ServerDialog:
         path_entry = ttk.Entry(main_frame, textvariable=self.path_var, width=80)
         path_entry.grid(row=5, column=1, sticky=(tk.W, tk.E), pady=(0, 5))
         
-        # 路徑說明
-        path_help = "格式: D:\\VSCC_3G1 (必須包含磁碟機代號，系統會自動轉換為UNC路徑)"
-        ttk.Label(main_frame, text=path_help, foreground="gray", font=('Arial', 8)).grid(row=6, column=1, sticky=tk.W, pady=(0, 15))
+        # 路徑說明（依傳輸方式切換）
+        self.path_help_var = tk.StringVar()
+        ttk.Label(main_frame, textvariable=self.path_help_var, foreground="gray", font=('Arial', 8)).grid(row=6, column=1, sticky=tk.W, pady=(0, 15))
+        
+        # 頻寬上限
+        ttk.Label(main_frame, text="頻寬上限 (Mbps):").grid(row=7, column=0, sticky=tk.W, pady=(0, 5))
+        bandwidth_frame = ttk.Frame(main_frame)
+        bandwidth_frame.grid(row=7, column=1, sticky=(tk.W, tk.E), pady=(0, 5))
+        self.bandwidth_var = tk.StringVar(value="0")
+        ttk.Entry(bandwidth_frame, textvariable=self.bandwidth_var, width=10).grid(row=0, column=0, sticky=tk.W)
+        ttk.Label(bandwidth_frame, text="0 = 不限制，發布中修改會立即生效", foreground="gray",
+                  font=('Arial', 8)).grid(row=0, column=1, sticky=tk.W, padx=(10, 0))
+        
+        # 傳輸方式
+        ttk.Label(main_frame, text="傳輸方式:").grid(row=8, column=0, sticky=tk.W, pady=(0, 5))
+        transport_frame = ttk.Frame(main_frame)
+        transport_frame.grid(row=8, column=1, sticky=(tk.W, tk.E), pady=(0, 5))
+        self.transport_var = tk.StringVar(value='smb')
+        ttk.Radiobutton(transport_frame, text="Windows 網路共享", variable=self.transport_var, value='smb',
+                        command=self.update_path_help).grid(row=0, column=0, sticky=tk.W)
+        ttk.Radiobutton(transport_frame, text="SFTP", variable=self.transport_var, value='sftp',
+                        command=self.update_path_help).grid(row=0, column=1, sticky=tk.W, padx=(10, 0))
+        ttk.Label(transport_frame, text="SFTP 連接埠:").grid(row=0, column=2, sticky=tk.W, padx=(20, 0))
+        self.port_var = tk.StringVar(value="22")
+        ttk.Entry(transport_frame, textvariable=self.port_var, width=6).grid(row=0, column=3, sticky=tk.W, padx=(5, 0))
+        
+        # SFTP 主機金鑰指紋
+        ttk.Label(main_frame, text="主機金鑰指紋:").grid(row=9, column=0, sticky=tk.W, pady=(0, 5))
+        self.host_key_var = tk.StringVar()
+        ttk.Entry(main_frame, textvariable=self.host_key_var, width=80).grid(row=9, column=1, sticky=(tk.W, tk.E), pady=(0, 5))
+        ttk.Label(main_frame, text="僅限 SFTP，格式: SHA256:... (ssh-keygen -lf 顯示的指紋)；留空時以 ~/.ssh/known_hosts 驗證，未知的主機拒絕連線",
+                  foreground="gray", font=('Arial', 8)).grid(row=10, column=1, sticky=tk.W, pady=(0, 15))
         
         # 如果是編輯模式，填入現有資料
         if self.server_info:
@@ -2514,15 +2452,20 @@ class ServerDialog:
             self.username_var.set(self.server_info.get('username', ''))
             self.password_var.set(self.server_info.get('password', ''))
             self.path_var.set(self.server_info.get('path', ''))
+            self.bandwidth_var.set(str(self.server_info.get('bandwidth_limit_mbps', 0)))
+            self.transport_var.set(self.server_info.get('transport', 'smb'))
+            self.port_var.set(str(self.server_info.get('port', 22)))
+            self.host_key_var.set(self.server_info.get('host_key_fingerprint', ''))
         
         # 設定預設值
         if not self.server_info:
             self.username_var.set("Administrator")
             self.path_var.set("D:\\VSCC_3G1")
+        self.update_path_help()
         
         # 按鈕
         button_frame = ttk.Frame(main_frame)
-        button_frame.grid(row=7, column=0, columnspan=2, pady=(10, 0))
+        button_frame.grid(row=11, column=0, columnspan=2, pady=(10, 0))
         
         ttk.Button(button_frame, text="測試連接", command=self.test_connection).grid(row=0, column=0, padx=(0, 10))
         ttk.Button(button_frame, text="確定", command=self.ok_clicked).grid(row=0, column=1, padx=(0, 10))
@@ -2530,6 +2473,12 @@ class ServerDialog:
         
         main_frame.columnconfigure(1, weight=1)
         
+    def update_path_help(self):
+        if self.transport_var.get() == 'sftp':
+            self.path_help_var.set("格式: /var/www (遠端主機上的絕對路徑)")
+        else:
+            self.path_help_var.set("格式: D:\\VSCC_3G1 (必須包含磁碟機代號，系統會自動轉換為UNC路徑)")
+    
     def toggle_password(self):
         if self.show_password_var.get():
             self.password_entry.configure(show="")
@@ -2545,7 +2494,10 @@ class ServerDialog:
             'ip': self.ip_var.get(),
             'username': self.username_var.get(),
             'password': self.password_var.get(),
-            'path': self.path_var.get()
+            'path': self.path_var.get(),
+            'transport': self.transport_var.get(),
+            'port': self.port_var.get() or 22,
+            'host_key_fingerprint': self.host_key_var.get().strip()
         }
         
         # 在新線程中測試連接
@@ -2555,41 +2507,19 @@ class ServerDialog:
         
     def _test_connection(self, server_info):
         try:
-            # 解析遠端路徑
-            remote_path = server_info['path']
-            remote_ip = server_info['ip']
-            remote_user = server_info['username']
-            remote_pass = server_info['password']
-            
+            # 測試網路連接（保留期間內的連線直接沿用）
             try:
-                drive_letter = remote_path.split(':')[0]
-                dir_path = remote_path.split(':')[1].lstrip('\\')
-                
-                # 完整的 UNC 目標路徑
-                full_unc_path = f"\\\\{remote_ip}\\{drive_letter}$\\{dir_path}"
-                share_to_map = f"\\\\{remote_ip}\\{drive_letter}$"
-                
-            except IndexError:
-                error_msg = f"遠端路徑格式不正確: {remote_path}\n應為 'D:\\資料夾' 格式"
+                transport, full_unc_path, _ = self.share_sessions.open_transport(server_info)
+            except ValueError:
+                error_msg = f"遠端路徑格式不正確: {server_info['path']}\n應為 'D:\\資料夾' 格式"
                 self.dialog.after(0, lambda: messagebox.showerror("路徑錯誤", error_msg))
                 return
-
-            # 網路連接命令
-            connection_command = [
-                "net", "use", share_to_map, remote_pass, f"/user:{remote_user}", "/persistent:no"
-            ]
-            disconnection_command = [
-                "net", "use", share_to_map, "/delete"
-            ]
-
-            # 測試網路連接
-            subprocess.run(connection_command, check=True, capture_output=True, text=True)
             
             # 測試目標路徑存取
-            access_test = os.path.exists(full_unc_path)
-            
-            # 中斷連接
-            subprocess.run(disconnection_command, capture_output=True)
+            try:
+                access_test = transport.exists(full_unc_path)
+            finally:
+                self.share_sessions.close_transport(server_info, transport)
             
             if access_test:
                 success_msg = f"連接測試成功！\n伺服器: {server_info['ip']}\n網路路徑: {full_unc_path}\n狀態: 可正常存取"
@@ -2599,7 +2529,7 @@ class ServerDialog:
                 self.dialog.after(0, lambda: messagebox.showwarning("連接測試", warning_msg))
                 
         except subprocess.CalledProcessError as e:
-            error_message = e.stderr if e.stderr else str(e)
+            error_message = e.stderr.decode('cp950', errors='ignore') if e.stderr else str(e)
             error_msg = f"網路共享連接失敗\n伺服器: {server_info['ip']}\n\n可能原因:\n1. 帳號密碼錯誤\n2. 網路不通\n3. 遠端主機未啟用系統管理分享(C$, D$)\n4. 防火牆阻擋\n\n詳細錯誤: {error_message}"
             self.dialog.after(0, lambda: messagebox.showerror("連接測試失敗", error_msg))
             
@@ -2610,15 +2540,35 @@ class ServerDialog:
     def ok_clicked(self):
         if all([self.ip_var.get(), self.username_var.get(), self.password_var.get(), self.path_var.get()]):
             # 簡單驗證路徑格式
-            if ':' not in self.path_var.get():
+            if self.transport_var.get() == 'sftp':
+                if not self.path_var.get().startswith('/'):
+                    messagebox.showerror("錯誤", "SFTP 路徑必須是絕對路徑，例如 '/var/www'")
+                    return
+            elif ':' not in self.path_var.get():
                 messagebox.showerror("錯誤", "路徑格式不正確，應為 'D:\\資料夾' 格式")
                 return
+            
+            try:
+                bandwidth_limit = float(self.bandwidth_var.get() or 0)
+            except ValueError:
+                messagebox.showerror("錯誤", "頻寬上限必須是數字")
+                return
+            
+            try:
+                port = int(self.port_var.get() or 22)
+            except ValueError:
+                messagebox.showerror("錯誤", "連接埠必須是數字")
+                return
                 
             self.result = {
                 'ip': self.ip_var.get(),
                 'username': self.username_var.get(),
                 'password': self.password_var.get(),
-                'path': self.path_var.get()
+                'path': self.path_var.get(),
+                'bandwidth_limit_mbps': max(0, bandwidth_limit),
+                'transport': self.transport_var.get(),
+                'port': port,
+                'host_key_fingerprint': self.host_key_var.get().strip()
             }
             self.dialog.destroy()
         else:
@@ -2641,5 +2591,5 @@ if __name__ == "__main__":
     except Exception as e:
         print(f"程式發生未預期的錯誤: {e}")
         if 'app' in locals():
-            app._send_error_notification("未預期的錯誤", str(e))
+            app.engine.send_error_notification("未預期的錯誤", str(e))
         raise
\ No newline at end of file
@@ -0,0 +1,103 @@
+"""發布流程效能測試
+
+以 PublishEngine 在本機目錄模擬網路共享（LocalDirectorySessionManager），
+量測大量小檔案的首次發布（全部新增）與重複發布（全部跳過）耗時，不需要 GUI 或網路。
+
+用法:
+    python benchmarks/bench_publish.py [--files 5000] [--file-kb 4] [--compare-mode mtime] [--profile]
+
+--profile 時以 cProfile 執行並輸出累計耗時最高的函式。結果同時輸出到畫面與 bench_publish_output.txt。
+"""
+import argparse
+import cProfile
+import io
+import logging
+import os
+import pstats
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from publish_engine import LocalDirectorySessionManager, PublishEngine  # noqa: E402
+
+
+def create_source_tree(directory, file_count, file_kb):
+    """建立含子目錄的測試網站，每個子目錄 100 個檔案"""
+    site_dir = os.path.join(directory, 'site')
+    content = os.urandom(file_kb * 1024)
+    for i in range(file_count):
+        sub_dir = os.path.join(site_dir, f'dir{i // 100:04d}')
+        if i % 100 == 0:
+            os.makedirs(sub_dir)
+        with open(os.path.join(sub_dir, f'file{i:06d}.txt'), 'wb') as f:
+            f.write(content)
+    return site_dir
+
+
+def run_publish(engine, profiler=None):
+    """執行一次發布，回傳耗時秒數"""
+    start = time.perf_counter()
+    if profiler is not None:
+        result = profiler.runcall(engine.execute)
+    else:
+        result = engine.execute()
+    elapsed = time.perf_counter() - start
+    if not result.success:
+        raise RuntimeError(f"發布失敗: {result.error}")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='發布流程效能測試')
+    parser.add_argument('--files', type=int, default=5000, help='測試檔案數量')
+    parser.add_argument('--file-kb', type=int, default=4, help='每個檔案大小 (KB)')
+    parser.add_argument('--compare-mode', choices=['mtime', 'hash'], default='mtime', help='檔案比對方式')
+    parser.add_argument('--profile', action='store_true', help='以 cProfile 執行並輸出熱點函式')
+    parser.add_argument('--output', default='bench_publish_output.txt', help='結果輸出檔案')
+    args = parser.parse_args()
+
+    output_path = os.path.abspath(args.output)
+    original_dir = os.getcwd()
+    work_dir = tempfile.mkdtemp(prefix='bench_publish_')
+    try:
+        # 快取與檢查點日誌都寫在目前目錄，切換到暫存目錄避免留下測試資料
+        os.chdir(work_dir)
+        site_dir = create_source_tree(work_dir, args.files, args.file_kb)
+
+        logger = logging.getLogger('bench_publish')
+        logger.addHandler(logging.NullHandler())
+        logger.propagate = False
+        engine = PublishEngine(share_sessions=LocalDirectorySessionManager(os.path.join(work_dir, 'remote')),
+                               logger=logger)
+        engine.apply_config({
+            'source_files': [site_dir],
+            'servers': [{'ip': '127.0.0.1', 'path': 'D:\\www', 'username': '', 'password': ''}],
+            'publish_options': {'compare_mode': args.compare_mode}
+        })
+
+        profiler = cProfile.Profile() if args.profile else None
+        lines = [f"測試檔案: {args.files} 個 × {args.file_kb} KB，比對方式: {args.compare_mode}"]
+        for name in ('首次發布（全部新增）', '重複發布（全部跳過）'):
+            elapsed = run_publish(engine, profiler)
+            lines.append(f"{name:<16} {elapsed:8.2f} 秒  {args.files / elapsed:10.0f} 檔案/秒")
+        engine.share_sessions.close_all()
+
+        if profiler is not None:
+            stream = io.StringIO()
+            pstats.Stats(profiler, stream=stream).sort_stats('cumulative').print_stats(25)
+            lines.append(stream.getvalue())
+
+        output = '\n'.join(lines)
+        print(output)
+        with open(output_path, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    finally:
+        os.chdir(original_dir)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
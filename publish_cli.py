@@ -0,0 +1,219 @@
+"""網站發布助手命令列模式
+
+不載入 tkinter / tkcalendar，讀取設定檔後直接執行發布或預覽發布計畫，
+可由工作排程器或服務管理程式呼叫，不需要保持桌面登入。
+
+用法:
+    python publish_cli.py [--config config.json] [--dry-run] [--json] [--notify] [--wait-schedule]
+                          [--progress-interval 1.0]
+
+--json 時標準輸出每行一個 JSON 事件（status、progress、server、plan、finished），
+日誌仍寫入 logs/ 與標準錯誤。
+
+結束代碼:
+    0    發布（或預覽）成功
+    1    發布失敗
+    2    設定檔錯誤
+    130  使用者中斷
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+from datetime import datetime
+
+from publish_engine import CONFIG_FILE, PublishEngine, PublishListener, format_duration, format_file_size
+
+EXIT_SUCCESS = 0
+EXIT_PUBLISH_FAILED = 1
+EXIT_CONFIG_ERROR = 2
+EXIT_INTERRUPTED = 130
+
+# 發布進行中輸出進度的預設間隔（秒）
+PROGRESS_OUTPUT_INTERVAL = 1.0
+
+
+class ConsoleReporter(PublishListener):
+    """命令列模式的事件接收者：狀態與進度輸出到標準輸出，結束時記錄歷史並發送通知"""
+    def __init__(self, engine, json_output=False, notify=False, progress_interval=PROGRESS_OUTPUT_INTERVAL):
+        self.engine = engine
+        self.json_output = json_output
+        self.notify = notify
+        self.progress_interval = progress_interval
+        self.output_lock = threading.Lock()
+        self.progress_stop = None
+        self.progress_thread = None
+
+    def emit(self, event, message=None, **fields):
+        """輸出一個事件；JSON 模式輸出完整欄位，文字模式只輸出訊息"""
+        with self.output_lock:
+            if self.json_output:
+                record = {'event': event, 'time': datetime.now().isoformat()}
+                if message is not None:
+                    record['message'] = message
+                record.update(fields)
+                sys.stdout.write(json.dumps(record, ensure_ascii=False, default=str) + '\n')
+            elif message is not None:
+                sys.stdout.write(message + '\n')
+            sys.stdout.flush()
+
+    def on_status(self, text):
+        self.emit('status', text)
+
+    def on_progress_start(self, progress):
+        """以固定間隔取樣並輸出進度，直到發布結束"""
+        self.stop_progress_output(progress)
+        self.progress_stop = threading.Event()
+        self.progress_thread = threading.Thread(target=self._progress_loop, args=(progress, self.progress_stop),
+                                                name='progress', daemon=True)
+        self.progress_thread.start()
+
+    def _progress_loop(self, progress, stop_event):
+        while not stop_event.wait(self.progress_interval):
+            self.emit_progress(progress.sample())
+
+    def stop_progress_output(self, progress):
+        """停止定時輸出並輸出最後一次進度"""
+        if self.progress_thread is None:
+            return
+        self.progress_stop.set()
+        self.progress_thread.join()
+        self.progress_thread = None
+        self.emit_progress(progress.sample())
+
+    def emit_progress(self, snapshot):
+        percentage = snapshot['bytes'] / snapshot['total_bytes'] * 100 if snapshot['total_bytes'] else 100.0
+        message = (f"進度: {snapshot['files']} / {snapshot['total_files']} 個檔案，"
+                   f"{format_file_size(snapshot['bytes'])} / {format_file_size(snapshot['total_bytes'])} "
+                   f"({percentage:.1f}%)")
+        if snapshot['files'] < snapshot['total_files']:
+            eta = format_duration(snapshot['eta']) if snapshot['eta'] is not None else "計算中"
+            message += f"，{format_file_size(snapshot['transfer_rate'])}/s，剩餘 {eta}"
+        self.emit('progress', message, **snapshot)
+
+    def on_server_finished(self, server_key, server_report):
+        stats = server_report['stats']
+        message = (f"{server_key} {server_report['status']}：新增 {stats['new_files']}、更新 {stats['updated_files']}、"
+                   f"跳過 {stats['skipped_files']}、刪除 {stats['deleted_files']}")
+        if server_report.get('error'):
+            message += f"（{server_report['error']}）"
+        self.emit('server', message, server=server_key, status=server_report['status'],
+                  error=server_report.get('error'), stats=stats, duration=server_report.get('duration'))
+
+    def on_finished(self, result):
+        self.stop_progress_output(self.engine.progress)
+        if result.dry_run:
+            self._report_plan(result)
+        else:
+            self._report_publish(result)
+
+    def _report_publish(self, result):
+        engine = self.engine
+        engine.save_history_record(result.report, is_success=result.success)
+        engine.send_deployment_notification(result.success, result.start_time, result.end_time, result.error,
+                                            force=self.notify)
+
+        report = result.report
+        stats = report['total_stats']
+        message = (f"發布{'成功' if result.success else '失敗'}：新增 {stats['new_files']}、更新 {stats['updated_files']}、"
+                   f"跳過 {stats['skipped_files']}、刪除 {stats['deleted_files']}，"
+                   f"傳輸 {format_file_size(report.get('bytes_transferred', 0))}，"
+                   f"耗時 {format_duration(result.duration)}")
+        if result.error:
+            message += f"\n錯誤訊息: {result.error}"
+
+        self.emit('finished', message,
+                  status='success' if result.success else 'failed',
+                  error=result.error,
+                  duration=result.duration,
+                  total_stats=stats,
+                  bytes_transferred=report.get('bytes_transferred', 0),
+                  bytes_saved=report.get('bytes_saved', 0),
+                  retried_files=report.get('retried_files', 0))
+
+    def _report_plan(self, result):
+        if not result.success:
+            self.emit('finished', f"建立發布計畫失敗: {result.error}", status='failed', error=result.error)
+            return
+
+        plan = result.plan
+        if self.json_output:
+            self.emit('plan', plan=plan)
+        else:
+            lines = ["發布計畫:"]
+            for server_plan in plan['servers']:
+                stats = server_plan['stats']
+                estimate = (format_duration(server_plan['estimated_seconds'])
+                            if server_plan['estimated_seconds'] is not None else '無歷史資料')
+                lines.append(f"  {server_plan['server']}: 新增 {stats['new_files']}、更新 {stats['updated_files']}、"
+                             f"跳過 {stats['skipped_files']}，預計傳輸 "
+                             f"{format_file_size(server_plan['bytes_to_transfer'])}，預估耗時 {estimate}")
+            self.emit('plan', '\n'.join(lines))
+        self.emit('finished', "發布計畫預覽完成", status='success')
+
+
+def wait_for_schedule(engine, reporter):
+    """等待設定檔中的定時發布時間；未設定或時間已過時立即返回"""
+    schedule_time = engine.config.get('schedule_time')
+    if not schedule_time:
+        return
+
+    schedule_time = datetime.fromisoformat(schedule_time)
+    delay = (schedule_time - datetime.now()).total_seconds()
+    if delay <= 0:
+        return
+
+    reporter.emit('status', f"等待定時發布: {schedule_time.strftime('%Y-%m-%d %H:%M:%S')}",
+                  schedule_time=schedule_time.isoformat())
+    while delay > 0:
+        time.sleep(min(delay, 60))
+        delay = (schedule_time - datetime.now()).total_seconds()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='網站發布助手命令列模式（不啟動 GUI）')
+    parser.add_argument('--config', default=CONFIG_FILE, help=f'設定檔路徑（預設 {CONFIG_FILE}）')
+    parser.add_argument('--dry-run', action='store_true', help='只預覽發布計畫，不寫入任何遠端檔案')
+    parser.add_argument('--json', action='store_true', help='以 JSON Lines 格式輸出事件')
+    parser.add_argument('--notify', action='store_true', help='發布後發送部署通知郵件（預設只有定時發布才發送）')
+    parser.add_argument('--wait-schedule', action='store_true', help='等待設定檔中的定時發布時間後再執行')
+    parser.add_argument('--progress-interval', type=float, default=PROGRESS_OUTPUT_INTERVAL,
+                        help=f'進度輸出間隔秒數（預設 {PROGRESS_OUTPUT_INTERVAL}）')
+    args = parser.parse_args(argv)
+
+    engine = PublishEngine(args.config)
+    reporter = ConsoleReporter(engine, json_output=args.json, notify=args.notify,
+                               progress_interval=max(0.1, args.progress_interval))
+    engine.add_listener(reporter)
+    try:
+        try:
+            if not engine.read_config_file():
+                raise ValueError(f"找不到設定檔: {args.config}")
+        except (OSError, ValueError) as e:
+            reporter.emit('finished', f"載入配置失敗: {e}", status='config_error', error=str(e))
+            return EXIT_CONFIG_ERROR
+
+        if not engine.config['source_files'] or not engine.config['servers']:
+            error_msg = "請先設定發行檔案與目標伺服器"
+            reporter.emit('finished', error_msg, status='config_error', error=error_msg)
+            return EXIT_CONFIG_ERROR
+
+        if args.wait_schedule:
+            wait_for_schedule(engine, reporter)
+
+        result = engine.execute(dry_run=args.dry_run)
+        return EXIT_SUCCESS if result.success else EXIT_PUBLISH_FAILED
+
+    except KeyboardInterrupt:
+        reporter.emit('finished', "程式被使用者中斷", status='interrupted')
+        return EXIT_INTERRUPTED
+    except Exception as e:
+        engine.logger.error(f"程式異常終止: {str(e)}")
+        engine.send_error_notification("程式異常終止", str(e))
+        raise
+    finally:
+        engine.share_sessions.close_all()
+
+if __name__ == "__main__":
+    sys.exit(main())
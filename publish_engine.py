@@ -0,0 +1,3836 @@
+"""網站發布引擎
+
+不依賴 tkinter 的發布核心：來源掃描、比對、複製、報告、歷史記錄與郵件通知。
+GUI（app.py）、命令列模式（publish_cli.py）與其他工具都透過 PublishEngine 執行發布，
+並以 PublishListener 接收狀態、進度與結果事件：
+
+    engine = PublishEngine()
+    engine.read_config_file()
+    engine.add_listener(my_listener)
+    result = engine.plan()       # 預覽，result.plan 為發布計畫
+    result = engine.execute()    # 實際發布，result.report 為發布報告
+"""
+import json
+import os
+import sys
+import shutil
+import threading
+import queue
+import time
+import random
+import posixpath
+import subprocess
+from datetime import datetime
+import logging
+import logging.handlers
+import gzip
+import glob
+import atexit
+import re
+import hashlib
+import base64
+import sqlite3
+import math
+import zlib
+import errno
+import uuid
+from array import array
+from collections import namedtuple
+import smtplib
+from contextlib import contextmanager
+from stat import S_ISDIR
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+from email.header import Header
+
+try:
+    import paramiko
+except ImportError:
+    paramiko = None
+
+
+# 設定檔路徑（GUI 與命令列模式共用）
+CONFIG_FILE = 'config.json'
+
+# 發布選項預設值（儲存在 config.json 的 publish_options）
+DEFAULT_PUBLISH_OPTIONS = {
+    'max_parallel_servers': 1,
+    'copy_workers': 4,
+    'compare_mode': 'mtime',
+    'use_remote_manifest': False,
+    'verify_remote_manifest': True,
+    'delta_transfer': False,
+    'delta_min_size_kb': 1024,
+    'staged_deploy': False,
+    'resume_interrupted': True,
+    'copy_chunk_kb': 1024,
+    'copy_preallocate': True,
+    'copy_offload': True,
+    'global_bandwidth_limit_mbps': 0,
+    'retry_attempts': 3,
+    'retry_base_delay': 1.0,
+    'share_session_idle_minutes': 10,
+    'file_log_detail': 'all',
+    'log_max_size_mb': 50,
+    'stream_file_operations': False
+}
+
+# 來源清單中的單一項目（相對路徑、大小、修改時間、是否為目錄）
+SourceEntry = namedtuple('SourceEntry', ['rel_path', 'size', 'mtime', 'mtime_ns', 'is_dir'])
+
+# 目標目錄列表中的單一項目（大小、修改時間、是否為目錄）
+RemoteEntry = namedtuple('RemoteEntry', ['size', 'mtime', 'mtime_ns', 'is_dir'])
+
+# 複製佇列中的工作項目；verify 為 True 時由複製執行緒先比對內容雜湊再決定是否複製，
+# stage_path 不為 None 時（分段部署）先寫入暫存路徑，待切換時才取代 dst_path
+CopyTask = namedtuple('CopyTask', ['src_path', 'dst_path', 'operation_type', 'relative_path', 'filename',
+                                   'source_entry', 'remote_info', 'verify', 'stage_path'])
+
+# 單一檔案複製的結果（差異傳輸節省的位元組數、傳輸耗時秒數）
+CopyResult = namedtuple('CopyResult', ['bytes_saved', 'seconds'])
+
+# 部署清單與分段部署的暫存目錄放在目標根目錄旁的中繼資料目錄（目標根目錄名稱加上此後綴），
+# 不在網站提供的目錄內；目標根目錄為磁碟根目錄或無法建立時改用目標根目錄下同名的子目錄
+PUBLISH_META_SUFFIX = '.publish'
+
+# 中繼資料目錄中保存各專案部署清單（專案名稱.json）的子目錄
+REMOTE_MANIFEST_DIR_NAME = 'manifests'
+REMOTE_MANIFEST_VERSION = 1
+
+# 舊版寫在各專案目標目錄中的部署清單，讀取後移除
+LEGACY_REMOTE_MANIFEST_NAME = '.publish_manifest.json'
+
+# 驗證部署清單時抽樣檢查的檔案數量
+REMOTE_MANIFEST_VERIFY_SAMPLES = 20
+
+# 分段部署時在中繼資料目錄中建立的暫存目錄名稱
+STAGING_DIR_NAME = 'staging'
+
+# 估算發布計畫耗時時參考的最近歷史記錄筆數
+PLAN_HISTORY_RECORDS = 20
+
+# 發布歷史資料庫、舊版 JSON 歷史檔案與歷史頁面每頁筆數
+HISTORY_DB_FILE = os.path.join('history', 'publish_history.db')
+LEGACY_HISTORY_FILE = os.path.join('history', 'publish_history.json')
+HISTORY_PAGE_SIZE = 100
+
+# 檔案部署記錄查詢的最多結果筆數、單次查詢最多比對的路徑數（查詢詞太籠統時截斷），
+# 以及挑選查詢詞時每個詞最多計算的索引筆數
+HISTORY_SEARCH_LIMIT = 200
+HISTORY_SEARCH_MAX_PATHS = 500
+HISTORY_SEARCH_TERM_SCAN = 10000
+
+# 內容雜湊快取檔案位置
+HASH_CACHE_FILE = os.path.join('cache', 'hash_cache.json')
+
+# 差異傳輸的區塊簽章快取檔案位置與區塊大小
+DELTA_SIGNATURE_CACHE_FILE = os.path.join('cache', 'delta_signatures.json')
+DELTA_BLOCK_SIZE = 64 * 1024
+
+# 發布檢查點日誌檔案位置
+JOURNAL_FILE = os.path.join('journal', 'publish_journal.jsonl')
+
+# 串流模式下各次發布的逐檔操作記錄檔目錄（檔名為歷史記錄ID）與寫入緩衝大小
+RUN_OPERATIONS_DIR = os.path.join('history', 'runs')
+RUN_OPERATIONS_BUFFER_SIZE = 1024 * 1024
+
+# 複製引擎：一般複製的預設區塊大小、預先配置空間的最小檔案大小、單次核心複製的上限
+COPY_CHUNK_SIZE = 1024 * 1024
+PREALLOCATE_MIN_SIZE = 16 * 1024 * 1024
+OFFLOAD_MAX_BYTES = 1024 * 1024 * 1024
+
+# 核心複製不支援時回傳的錯誤碼（改用一般複製）
+OFFLOAD_UNSUPPORTED_ERRNOS = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EBADF,
+                              errno.EOPNOTSUPP, getattr(errno, 'ENOTSUP', errno.EOPNOTSUPP),
+                              getattr(errno, 'ENOTSOCK', errno.EBADF)}
+
+# 限速器最多累積的權杖秒數，以及單次等待的上限（讓速率調整能及時生效）
+TOKEN_BUCKET_BURST_SECONDS = 1.0
+TOKEN_BUCKET_MAX_WAIT = 0.5
+
+# 重試等待時間的上限（秒），以及視為暫時性網路錯誤、值得重試的錯誤碼
+RETRY_MAX_DELAY = 30.0
+RETRYABLE_ERRNOS = {errno.EIO, errno.EAGAIN, errno.EBUSY, errno.ETIMEDOUT, errno.ECONNRESET,
+                    errno.ECONNABORTED, errno.ECONNREFUSED, errno.ENETDOWN, errno.ENETRESET,
+                    errno.ENETUNREACH, errno.EHOSTDOWN, errno.EHOSTUNREACH, getattr(errno, 'ESTALE', errno.EIO)}
+# Windows 錯誤碼：找不到網路路徑、非預期的網路錯誤、網路名稱已無法使用、信號等待逾時、
+# 共用違規、鎖定違規、網路位置無法連線等
+RETRYABLE_WINERRORS = {32, 33, 51, 53, 59, 64, 67, 121, 1231, 1232, 1236}
+
+# SFTP 連線的 SSH 視窗大小與封包大小（高延遲連線需要較大的視窗才能填滿頻寬）
+SFTP_WINDOW_SIZE = 64 * 1024 * 1024
+SFTP_MAX_PACKET_SIZE = 32 * 1024
+SFTP_CONNECT_TIMEOUT = 15
+
+# 驗證 SFTP 主機金鑰的 known_hosts 檔案（伺服器設定了 host_key_fingerprint 時改以指紋比對）
+SFTP_KNOWN_HOSTS_FILE = os.path.join(os.path.expanduser('~'), '.ssh', 'known_hosts')
+
+# 網路共享連線在最後一次使用後保留的預設秒數
+SHARE_SESSION_IDLE_SECONDS = 600
+
+# 進度速率的平滑時間常數（秒），越大越穩定但反應越慢
+PROGRESS_RATE_WINDOW = 5.0
+
+# 日誌檔案目錄與檔名（每天一個檔案，換日或超過大小上限時換下的檔案以 gzip 壓縮）
+LOG_DIR = 'logs'
+LOG_FILE_PATTERN = re.compile(r'^publish_(\d{8})(\.\d+)?\.log$')
+
+# 逐檔日誌詳細程度（file_log_detail）對應要記錄的檔案操作
+FILE_LOG_OPERATIONS = {
+    'all': frozenset({'new', 'updated', 'skipped', 'deleted', 'directory'}),
+    'changes': frozenset({'new', 'updated', 'deleted'}),
+    'none': frozenset()
+}
+
+# 背景日誌執行緒與日誌檔案處理器（setup_logging 第一次呼叫時建立，程序內共用）
+_log_setup_lock = threading.Lock()
+_log_listener = None
+_log_file_handler = None
+
+# 顯示傳輸速率的最小檔案大小（小檔案的速率主要反映延遲，沒有參考價值）
+THROUGHPUT_REPORT_MIN_SIZE = 1024 * 1024
+
+# 跳過或刪除檔案時的說明（發布報告中只保存鍵，顯示時才轉為文字）
+# 檔案操作對應的統計欄位
+OPERATION_STAT_KEYS = {
+    'new': 'new_files',
+    'updated': 'updated_files',
+    'skipped': 'skipped_files',
+    'deleted': 'deleted_files'
+}
+
+FILE_OPERATION_NOTES = {
+    'same': "檔案內容相同",
+    'same_hash': "檔案內容相同（雜湊比對）",
+    'resumed': "已於上次中斷的發布完成（續傳）",
+    'excluded': "跳過複製需刪除的檔案"
+}
+
+# 每個複製執行緒對應的佇列容量，限制走訪領先複製的檔案數量
+COPY_QUEUE_SIZE_PER_WORKER = 64
+
+
+class JsonFileCache:
+    """以 JSON 檔案保存在本機的快取，可由多個複製執行緒同時存取"""
+    def __init__(self, cache_file):
+        self.cache_file = cache_file
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.dirty = False
+        self.load()
+    
+    def load(self):
+        """從磁碟載入快取，檔案損毀時從空快取開始"""
+        try:
+            if os.path.exists(self.cache_file):
+                with open(self.cache_file, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f)
+        except Exception:
+            self.entries = {}
+    
+    def save(self):
+        """將有變動的快取寫回磁碟"""
+        with self.lock:
+            if not self.dirty:
+                return
+            entries = dict(self.entries)
+            self.dirty = False
+        
+        cache_dir = os.path.dirname(self.cache_file)
+        if cache_dir and not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        
+        temp_file = self.cache_file + '.tmp'
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(entries, f)
+        os.replace(temp_file, self.cache_file)
+
+
+def remote_cache_key(server_key, path):
+    """目標檔案在雜湊與區塊簽章快取中的鍵（SFTP 各伺服器的路徑相同，需加上伺服器識別名稱區分）"""
+    return f"{server_key}|{path}"
+
+
+class HashCache(JsonFileCache):
+    """檔案內容雜湊快取
+    
+    以 (路徑, 大小, mtime_ns) 判斷快取是否仍有效，檔案未變動時不會重新計算雜湊。
+    快取儲存在本機磁碟，可跨發布重複使用。遠端檔案以 remote_cache_key() 加上伺服器識別名稱作為鍵，
+    不同伺服器上相同路徑（SFTP）的檔案不會共用記錄。
+    """
+    def get_hash(self, path, size, mtime_ns, opener=open, key=None):
+        """取得檔案雜湊，快取有效時直接回傳，否則以 opener 開啟檔案計算（遠端檔案使用傳輸層的 open）
+        
+        key 為快取記錄的鍵，預設為檔案路徑。
+        """
+        key = os.path.normcase(key or path)
+        with self.lock:
+            cached = self.entries.get(key)
+        if cached and cached[0] == size and cached[1] == mtime_ns:
+            return cached[2]
+        
+        digest = self.hash_file(path, opener=opener)
+        self.put(key, size, mtime_ns, digest)
+        return digest
+    
+    def put(self, key, size, mtime_ns, digest):
+        """記錄已知的檔案雜湊（例如剛複製完成的目標檔案），key 為檔案路徑或 remote_cache_key()"""
+        with self.lock:
+            self.entries[os.path.normcase(key)] = [size, mtime_ns, digest]
+            self.dirty = True
+    
+    @staticmethod
+    def hash_file(path, chunk_size=1024 * 1024, opener=open):
+        """計算檔案的 SHA-256"""
+        sha256 = hashlib.sha256()
+        with opener(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                sha256.update(chunk)
+        return sha256.hexdigest()
+
+
+class BlockSignatureCache(JsonFileCache):
+    """目標檔案的區塊簽章快取（差異傳輸用）
+    
+    記錄上次寫入目標檔案時每個區塊的弱校驗碼（Adler-32）與強雜湊，
+    以目標檔案的 (伺服器與路徑, 大小, mtime_ns) 判斷簽章是否仍對應遠端內容，鍵為 remote_cache_key()。
+    """
+    def get_signatures(self, key, size, mtime_ns):
+        """取得目標檔案的區塊簽章，檔案已變動或沒有記錄時回傳 None"""
+        with self.lock:
+            cached = self.entries.get(os.path.normcase(key))
+        if cached and cached[0] == size and cached[1] == mtime_ns and cached[2] == DELTA_BLOCK_SIZE:
+            return cached[3]
+        return None
+    
+    def put_signatures(self, key, size, mtime_ns, signatures):
+        """記錄目標檔案目前內容的區塊簽章"""
+        with self.lock:
+            self.entries[os.path.normcase(key)] = [size, mtime_ns, DELTA_BLOCK_SIZE, signatures]
+            self.dirty = True
+    
+    @staticmethod
+    def block_signature(block):
+        """計算單一區塊的弱校驗碼與強雜湊"""
+        return [zlib.adler32(block), hashlib.blake2b(block, digest_size=16).hexdigest()]
+    
+    @classmethod
+    def compute_signatures(cls, path):
+        """讀取檔案計算所有區塊的簽章"""
+        signatures = []
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(DELTA_BLOCK_SIZE), b''):
+                signatures.append(cls.block_signature(block))
+        return signatures
+
+
+class PublishJournal:
+    """發布檢查點日誌
+    
+    每完成一個檔案就附加一行 JSON（伺服器、專案、相對路徑、大小、mtime_ns），
+    發布失敗或中斷後，相同設定的下一次發布可載入日誌，跳過已完成的檔案只處理剩餘部分。
+    第一行為設定指紋，設定變更後舊日誌不會被沿用；發布全部成功時刪除日誌。
+    """
+    def __init__(self, journal_file, fingerprint):
+        self.journal_file = journal_file
+        self.fingerprint = fingerprint
+        self.lock = threading.Lock()
+        self.completed = {}
+        self.file = None
+    
+    def open(self, resume=True):
+        """開啟日誌並回傳可續傳的檔案數；日誌屬於其他設定或不續傳時重新開始"""
+        if resume:
+            self._load()
+        
+        journal_dir = os.path.dirname(self.journal_file)
+        if journal_dir and not os.path.exists(journal_dir):
+            os.makedirs(journal_dir)
+        
+        if self.completed:
+            self.file = open(self.journal_file, 'a', encoding='utf-8')
+        else:
+            self.file = open(self.journal_file, 'w', encoding='utf-8')
+            self._write({'type': 'header', 'fingerprint': self.fingerprint,
+                         'started_at': datetime.now().isoformat()})
+        return len(self.completed)
+    
+    def _load(self):
+        """載入日誌中已完成的檔案，最後一行寫到一半（中斷）時忽略該行"""
+        self.completed = {}
+        if not os.path.exists(self.journal_file):
+            return
+        
+        try:
+            with open(self.journal_file, 'r', encoding='utf-8') as f:
+                header = json.loads(f.readline() or '{}')
+                if header.get('type') != 'header' or header.get('fingerprint') != self.fingerprint:
+                    return
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break
+                    key = (record['server'], record['project'], record['path'])
+                    self.completed[key] = (record['size'], record['mtime_ns'], record.get('staged', False))
+        except Exception:
+            self.completed = {}
+    
+    def get_completed(self, server_key, project_name, source_entry):
+        """檔案已於先前的發布完成且來源未變動時回傳是否為暫存檔案，否則回傳 None"""
+        completed = self.completed.get((server_key, project_name, source_entry.rel_path.replace(os.sep, '/')))
+        if completed is None or completed[0] != source_entry.size or completed[1] != source_entry.mtime_ns:
+            return None
+        return completed[2]
+    
+    def record(self, server_key, project_name, source_entry, staged=False):
+        """記錄已完成的檔案"""
+        record = {
+            'server': server_key,
+            'project': project_name,
+            'path': source_entry.rel_path.replace(os.sep, '/'),
+            'size': source_entry.size,
+            'mtime_ns': source_entry.mtime_ns
+        }
+        if staged:
+            record['staged'] = True
+        self._write(record)
+    
+    def _write(self, record):
+        with self.lock:
+            if self.file is None:
+                return
+            self.file.write(json.dumps(record, ensure_ascii=False) + '\n')
+            self.file.flush()
+    
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+    
+    def discard(self):
+        """發布全部成功後刪除日誌"""
+        self.close()
+        if os.path.exists(self.journal_file):
+            os.remove(self.journal_file)
+
+
+class TokenBucket:
+    """權杖桶限速器
+    
+    每秒補充 rate 個位元組的權杖，最多累積 TOKEN_BUCKET_BURST_SECONDS 秒的量；
+    權杖不足時呼叫端等待。rate 為 0 表示不限速，發布進行中可隨時調整。
+    """
+    def __init__(self, rate=0):
+        self.lock = threading.Lock()
+        self.rate = 0
+        self.capacity = 0
+        self.tokens = 0
+        self.last_refill = time.monotonic()
+        self.set_rate(rate)
+    
+    def set_rate(self, rate):
+        """調整速率（bytes/秒），正在等待的傳輸會在下次檢查時套用"""
+        with self.lock:
+            self._refill()
+            self.rate = max(0, rate)
+            self.capacity = self.rate * TOKEN_BUCKET_BURST_SECONDS
+            self.tokens = min(self.tokens, self.capacity)
+    
+    def consume(self, amount):
+        """取得 amount 個位元組的權杖，不足時等待；超過桶容量的請求以預支方式處理"""
+        while True:
+            with self.lock:
+                if self.rate <= 0:
+                    return
+                self._refill()
+                needed = min(amount, self.capacity)
+                if self.tokens >= needed:
+                    self.tokens -= amount
+                    return
+                wait = (needed - self.tokens) / self.rate
+            time.sleep(min(wait, TOKEN_BUCKET_MAX_WAIT))
+    
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+
+
+class FileCopier:
+    """檔案複製引擎
+    
+    依序嘗試核心複製（copy_file_range、sendfile），兩端不支援時改用可調整區塊大小的
+    readinto 迴圈；大型檔案先預先配置目標空間，複製完成後保留來源的修改時間與屬性
+    （與 shutil.copy2 相同）。
+    """
+    def __init__(self, chunk_size=COPY_CHUNK_SIZE, preallocate=True, use_offload=True):
+        self.chunk_size = max(64 * 1024, int(chunk_size))
+        self.preallocate = preallocate
+        self.use_offload = use_offload
+    
+    def copy(self, src_path, dst_path, throttle=None):
+        """複製檔案，回傳 (複製位元組數, 耗時秒數)
+        
+        throttle 為限速函式，每寫入一個區塊前以該區塊的位元組數呼叫。
+        """
+        start = time.perf_counter()
+        with open(src_path, 'rb', buffering=0) as src, open(dst_path, 'wb', buffering=0) as dst:
+            size = os.fstat(src.fileno()).st_size
+            if self.preallocate and size >= PREALLOCATE_MIN_SIZE:
+                self._preallocate(dst, size)
+            
+            copied = 0
+            if self.use_offload and size:
+                copied = self._copy_offload(src.fileno(), dst.fileno(), size, throttle)
+            if copied < size or not size:
+                # 核心複製不支援或中途停止時，從已複製的位置接續一般複製
+                src.seek(copied)
+                dst.seek(copied)
+                copied += self._copy_buffered(src, dst, throttle)
+            
+            # 預先配置的空間大於實際內容時（來源在複製中縮小）截斷
+            dst.truncate(copied)
+        
+        shutil.copystat(src_path, dst_path)
+        return copied, time.perf_counter() - start
+    
+    def _preallocate(self, dst, size):
+        """預先配置目標檔案空間，減少檔案系統碎片與逐次延伸的成本；不支援時略過"""
+        try:
+            if hasattr(os, 'posix_fallocate'):
+                os.posix_fallocate(dst.fileno(), 0, size)
+            else:
+                dst.truncate(size)
+        except OSError:
+            pass
+    
+    def _copy_offload(self, src_fd, dst_fd, size, throttle=None):
+        """使用核心複製，回傳已複製的位元組數（0 表示兩端不支援）"""
+        # 限速時每次只複製一個區塊，讓限速器能控制節奏
+        max_bytes = self.chunk_size if throttle else OFFLOAD_MAX_BYTES
+        for method in ('copy_file_range', 'sendfile'):
+            if not hasattr(os, method):
+                continue
+            
+            copied = 0
+            try:
+                while copied < size:
+                    count = min(size - copied, max_bytes)
+                    if throttle:
+                        throttle(count)
+                    if method == 'copy_file_range':
+                        sent = os.copy_file_range(src_fd, dst_fd, count)
+                    else:
+                        sent = os.sendfile(dst_fd, src_fd, copied, count)
+                    if sent == 0:
+                        break
+                    copied += sent
+                return copied
+            except OSError as e:
+                if e.errno not in OFFLOAD_UNSUPPORTED_ERRNOS:
+                    raise
+                if copied:
+                    return copied
+        return 0
+    
+    def _copy_buffered(self, src, dst, throttle=None):
+        """以固定大小的緩衝區複製，避免每個區塊重新配置記憶體"""
+        buffer = bytearray(self.chunk_size)
+        view = memoryview(buffer)
+        copied = 0
+        while True:
+            length = src.readinto(buffer)
+            if not length:
+                break
+            if throttle:
+                throttle(length)
+            written = 0
+            while written < length:
+                written += dst.write(view[written:length])
+            copied += length
+        return copied
+
+
+class ShareSessionManager:
+    """網路共享連線管理
+    
+    以分享名稱為單位保留已驗證的連線，並以參考計數記錄使用中的發布與連線測試；
+    最後一個使用者釋放後再保留 idle_seconds 秒，期間內重複發布或測試不必重新連線；
+    閒置連線由單一計時器（reaper）在最早到期的時間中斷，不論釋放幾次都只有一個計時器。
+    子類別實作 _resolve、_connect 與 _disconnect。
+    """
+    def __init__(self, idle_seconds=SHARE_SESSION_IDLE_SECONDS):
+        self.lock = threading.Lock()
+        self.sessions = {}
+        self.idle_seconds = idle_seconds
+        self.connect_count = 0
+        self.reaper = None
+    
+    @staticmethod
+    def parse_remote_path(server):
+        """將 'D:\\資料夾' 格式的路徑轉換為 (分享名稱, 完整 UNC 路徑)，格式不正確時拋出 ValueError"""
+        remote_path = server['path']
+        try:
+            drive_letter = remote_path.split(':')[0]
+            dir_path = remote_path.split(':')[1].lstrip('\\')
+        except IndexError:
+            raise ValueError(f"遠端路徑格式不正確: {remote_path}，應為 'D:\\資料夾' 格式")
+        share = f"\\\\{server['ip']}\\{drive_letter}$"
+        return share, f"{share}\\{dir_path}"
+    
+    def acquire(self, server):
+        """取得伺服器的連線，回傳 (目標路徑, 是否沿用既有連線)；使用完畢必須呼叫 release"""
+        share, target_path = self._resolve(server)
+        credentials = (server['username'], server['password'])
+        
+        with self.lock:
+            session = self.sessions.get(share)
+            if session is None:
+                session = {'lock': threading.Lock(), 'refs': 0, 'connected': False, 'owned': False,
+                           'credentials': None, 'last_used': 0}
+                self.sessions[share] = session
+            session['refs'] += 1
+        
+        # 連線在各分享自己的鎖內建立，並行發布時不同伺服器不會互相等待
+        try:
+            with session['lock']:
+                reused = session['connected']
+                if reused and session['credentials'] != credentials and session['refs'] == 1:
+                    # 帳號密碼已變更，沒有其他使用者時重新連線
+                    self._drop(share, session)
+                    reused = False
+                if not reused:
+                    session['owned'] = self._connect(share, server)
+                    session['connected'] = True
+                    session['credentials'] = credentials
+                    self.connect_count += 1
+        except Exception:
+            self.release(server, discard=True)
+            raise
+        return target_path, reused
+    
+    def release(self, server, discard=False):
+        """釋放連線；discard 為 True（例如發布失敗）時沒有其他使用者就立即中斷，下次重新連線"""
+        share, _ = self._resolve(server)
+        with self.lock:
+            session = self.sessions.get(share)
+            if session is None:
+                return
+            session['refs'] -= 1
+            session['last_used'] = time.monotonic()
+            if session['refs'] > 0:
+                return
+            if not (discard or self.idle_seconds <= 0):
+                self._schedule_reaper(self.idle_seconds)
+                return
+        
+        # 只中斷這個分享的連線，其他伺服器保留中的連線不受影響
+        self._drop_if_unused(share, session)
+    
+    def expire_idle(self, force=False):
+        """中斷閒置超過保留時間的連線；force 為 True 時中斷所有未使用的連線"""
+        now = time.monotonic()
+        with self.lock:
+            expired = [(share, session) for share, session in self.sessions.items()
+                       if session['connected'] and session['refs'] == 0
+                       and (force or now - session['last_used'] >= self.idle_seconds)]
+        
+        for share, session in expired:
+            self._drop_if_unused(share, session)
+    
+    def _drop_if_unused(self, share, session):
+        """沒有使用者時中斷連線"""
+        with session['lock']:
+            # 等待鎖的期間可能已有新的使用者，此時保留連線
+            with self.lock:
+                if session['refs'] > 0:
+                    return
+            self._drop(share, session)
+    
+    def _schedule_reaper(self, delay):
+        """在 delay 秒後中斷閒置的連線（呼叫端持有 self.lock）；計時器已在等待時沿用"""
+        if self.reaper is not None:
+            return
+        self.reaper = threading.Timer(delay, self._reap)
+        self.reaper.daemon = True
+        self.reaper.start()
+    
+    def _reap(self):
+        """計時器到期：中斷已閒置的連線，仍有保留中的連線時排定到最早到期的時間"""
+        with self.lock:
+            self.reaper = None
+        self.expire_idle()
+        with self.lock:
+            idle_since = [session['last_used'] for session in self.sessions.values()
+                          if session['connected'] and session['refs'] == 0]
+            if idle_since:
+                delay = min(idle_since) + self.idle_seconds - time.monotonic()
+                self._schedule_reaper(max(delay, 0.01))
+    
+    def open_transport(self, server, file_copier=None, sock=None):
+        """依伺服器設定建立遠端傳輸，回傳 (傳輸物件, 目標路徑, 是否沿用既有連線)
+        
+        transport 為 'sftp' 的伺服器建立 SFTP 連線（sock 為已連線的 socket 時直接使用），
+        其餘取得網路共享連線；使用完畢必須呼叫 close_transport。
+        """
+        file_copier = file_copier or FileCopier()
+        if server.get('transport') == 'sftp':
+            return SftpTransport(server, chunk_size=file_copier.chunk_size, sock=sock), server['path'], False
+        target_path, reused = self.acquire(server)
+        return LocalTransport(file_copier), target_path, reused
+    
+    def share_root(self, server):
+        """目標路徑所在分享的根目錄（SFTP 為 /），目標路徑即為此目錄時其上層不可寫入"""
+        if server.get('transport') == 'sftp':
+            return '/'
+        return self._resolve(server)[0]
+    
+    def close_transport(self, server, transport, discard=False):
+        """關閉 open_transport 建立的傳輸（網路共享連線依保留時間釋放）"""
+        if server.get('transport') == 'sftp':
+            transport.close()
+        else:
+            self.release(server, discard=discard)
+    
+    def close_all(self):
+        """程式結束時中斷所有未使用的連線"""
+        with self.lock:
+            if self.reaper is not None:
+                self.reaper.cancel()
+                self.reaper = None
+        self.expire_idle(force=True)
+    
+    def _drop(self, share, session):
+        """中斷連線（不是由本程式建立的連線只放棄使用，不中斷）"""
+        if session['connected'] and session['owned']:
+            self._disconnect(share)
+        session['connected'] = False
+        session['owned'] = False
+    
+    def _resolve(self, server):
+        """回傳 (分享名稱, 目標路徑)"""
+        raise NotImplementedError
+    
+    def _connect(self, share, server):
+        """建立連線，回傳是否由本程式建立（False 表示沿用其他程式的連線，釋放時不中斷）"""
+        raise NotImplementedError
+    
+    def _disconnect(self, share):
+        raise NotImplementedError
+
+
+class NetUseSessionManager(ShareSessionManager):
+    """以 net use 連線 Windows 系統管理分享"""
+    def _resolve(self, server):
+        return self.parse_remote_path(server)
+    
+    def _connect(self, share, server):
+        # 其他程式已建立的連線直接沿用，釋放時也不中斷，避免影響正在使用的程式
+        if subprocess.run(["net", "use", share], capture_output=True).returncode == 0:
+            return False
+        subprocess.run(["net", "use", share, server['password'], f"/user:{server['username']}", "/persistent:no"],
+                       check=True, capture_output=True)
+        return True
+    
+    def _disconnect(self, share):
+        subprocess.run(["net", "use", share, "/delete"], capture_output=True)
+
+
+class LocalDirectorySessionManager(ShareSessionManager):
+    """以本機目錄模擬網路共享（root/伺服器IP/D$/資料夾），用於在非 Windows 環境測試發布流程"""
+    def __init__(self, root, idle_seconds=SHARE_SESSION_IDLE_SECONDS):
+        super().__init__(idle_seconds)
+        self.root = root
+    
+    def _resolve(self, server):
+        share, full_path = self.parse_remote_path(server)
+        share_path = os.path.join(self.root, *share.strip('\\').split('\\'))
+        return share_path, os.path.join(self.root, *[part for part in full_path.strip('\\').split('\\') if part])
+    
+    def _connect(self, share, server):
+        os.makedirs(share, exist_ok=True)
+        return True
+    
+    def _disconnect(self, share):
+        pass
+
+
+class LocalTransport:
+    """以本機檔案系統 API 存取目標（Windows 網路共享的 UNC 路徑或本機目錄）"""
+    def __init__(self, file_copier):
+        self.file_copier = file_copier
+    
+    def join(self, *parts):
+        return os.path.join(*parts)
+    
+    def dirname(self, path):
+        return os.path.dirname(path)
+    
+    def exists(self, path):
+        return os.path.exists(path)
+    
+    def makedirs(self, path, exist_ok=False):
+        os.makedirs(path, exist_ok=exist_ok)
+    
+    def list_directory(self, directory):
+        """以單次 os.scandir 列出目標目錄，回傳 {名稱: RemoteEntry}
+        
+        Windows 上 DirEntry.stat() 直接使用列目錄時取得的資訊，
+        因此每個目錄只需一次網路往返，不必對每個檔案分別查詢。
+        目錄不存在時回傳空列表。
+        """
+        listing = {}
+        try:
+            with os.scandir(directory) as scanner:
+                for entry in scanner:
+                    if entry.is_dir():
+                        listing[entry.name] = RemoteEntry(0, 0, 0, True)
+                    else:
+                        stat = entry.stat()
+                        listing[entry.name] = RemoteEntry(stat.st_size, stat.st_mtime, stat.st_mtime_ns, False)
+        except FileNotFoundError:
+            pass
+        return listing
+    
+    def stat(self, path):
+        stat = os.stat(path)
+        return RemoteEntry(stat.st_size, stat.st_mtime, stat.st_mtime_ns, False)
+    
+    def open(self, path, mode='rb'):
+        return open(path, mode)
+    
+    def upload(self, src_path, dst_path, throttle=None):
+        """複製檔案，回傳 (複製位元組數, 耗時秒數)"""
+        return self.file_copier.copy(src_path, dst_path, throttle)
+    
+    def copystat(self, src_path, dst_path):
+        shutil.copystat(src_path, dst_path)
+    
+    def replace(self, src_path, dst_path):
+        os.replace(src_path, dst_path)
+    
+    def remove(self, path):
+        """刪除檔案，不存在時忽略"""
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+    
+    def rmtree(self, path):
+        if os.path.exists(path):
+            shutil.rmtree(path, ignore_errors=True)
+    
+    def close(self):
+        pass
+
+
+class SftpTransport:
+    """以 SFTP 存取目標（paramiko）
+    
+    每台伺服器使用一條 SSH 連線，連線上依並行需求開啟多個 SFTP 通道，
+    各複製執行緒借用閒置的通道同時傳輸；上傳使用管線化寫入，不必等待每個區塊的確認。
+    目錄列表使用 listdir_attr，一次往返取得整個目錄的大小與修改時間。
+    """
+    def __init__(self, server, chunk_size=COPY_CHUNK_SIZE, sock=None, known_hosts_file=SFTP_KNOWN_HOSTS_FILE):
+        if paramiko is None:
+            raise Exception("使用 SFTP 需要安裝 paramiko（pip install -r requirements.txt）")
+        self.chunk_size = chunk_size
+        self.lock = threading.Lock()
+        self.channels = []
+        self.idle_channels = queue.LifoQueue()
+        
+        port = int(server.get('port') or 22)
+        self.host_name = server['ip'] if port == 22 else f"[{server['ip']}]:{port}"
+        known_keys = self._load_known_keys(known_hosts_file) if not server.get('host_key_fingerprint') else None
+        
+        # sock 可傳入已連線的 socket（例如測試用的本機 SFTP 伺服器）
+        if sock is None:
+            sock = (server['ip'], port)
+        self.transport = paramiko.Transport(sock, default_window_size=SFTP_WINDOW_SIZE,
+                                            default_max_packet_size=SFTP_MAX_PACKET_SIZE)
+        self.transport.banner_timeout = SFTP_CONNECT_TIMEOUT
+        try:
+            if known_keys:
+                # 優先協商 known_hosts 已記錄的金鑰類型，避免伺服器改用另一種金鑰而無法比對
+                security_options = self.transport.get_security_options()
+                key_type = next(iter(known_keys))
+                if key_type in security_options.key_types:
+                    security_options.key_types = [key_type] + [
+                        other for other in security_options.key_types if other != key_type]
+            self.transport.start_client(timeout=SFTP_CONNECT_TIMEOUT)
+            # 先驗證主機金鑰再送出帳號密碼，密碼不會交給冒充的主機
+            self._verify_host_key(server, known_keys, known_hosts_file)
+            self.transport.auth_password(server['username'], server['password'])
+        except Exception:
+            self.transport.close()
+            raise
+    
+    @staticmethod
+    def fingerprint(key):
+        """主機金鑰的 SHA256 指紋，格式與 ssh-keygen -lf 相同（SHA256:...）"""
+        return 'SHA256:' + base64.b64encode(hashlib.sha256(key.asbytes()).digest()).decode('ascii').rstrip('=')
+    
+    def _load_known_keys(self, known_hosts_file):
+        """讀取 known_hosts 中此主機的金鑰，回傳 {金鑰類型: 金鑰}；沒有記錄時回傳 None"""
+        host_keys = paramiko.HostKeys()
+        if known_hosts_file and os.path.exists(known_hosts_file):
+            host_keys.load(known_hosts_file)
+        known_keys = host_keys.lookup(self.host_name)
+        return dict(known_keys) if known_keys else None
+    
+    def _verify_host_key(self, server, known_keys, known_hosts_file):
+        """比對伺服器的主機金鑰，未知或不符時拋出 paramiko.SSHException 並拒絕連線
+        
+        伺服器設定了 host_key_fingerprint 時以指紋比對，否則與 known_hosts 的記錄比對。
+        """
+        remote_key = self.transport.get_remote_server_key()
+        actual = self.fingerprint(remote_key)
+        expected = (server.get('host_key_fingerprint') or '').strip()
+        if expected:
+            if not expected.startswith('SHA256:'):
+                expected = 'SHA256:' + expected
+            if expected.rstrip('=') != actual:
+                raise paramiko.SSHException(
+                    f"主機 {self.host_name} 的金鑰指紋 {actual} 與設定的 {expected} 不符，可能遭到冒充，已拒絕連線")
+            return
+        
+        if not known_keys:
+            raise paramiko.SSHException(
+                f"主機 {self.host_name} 不在 {known_hosts_file} 中，已拒絕連線（伺服器金鑰指紋 {actual}）。"
+                f"請向主機管理員確認指紋後填入伺服器設定的「主機金鑰指紋」，或先以 ssh 連線一次加入 known_hosts")
+        known_key = known_keys.get(remote_key.get_name())
+        if known_key is None or known_key != remote_key:
+            raise paramiko.SSHException(
+                f"主機 {self.host_name} 的金鑰（{actual}）與 {known_hosts_file} 的記錄不符，可能遭到冒充，已拒絕連線")
+    
+    @contextmanager
+    def _channel(self):
+        """借用一個閒置的 SFTP 通道，沒有閒置通道時在同一條連線上開啟新通道"""
+        try:
+            sftp = self.idle_channels.get_nowait()
+        except queue.Empty:
+            sftp = paramiko.SFTPClient.from_transport(self.transport, window_size=SFTP_WINDOW_SIZE,
+                                                      max_packet_size=SFTP_MAX_PACKET_SIZE)
+            with self.lock:
+                self.channels.append(sftp)
+        try:
+            yield sftp
+        finally:
+            self.idle_channels.put(sftp)
+    
+    def join(self, *parts):
+        return posixpath.join(*[part.replace(os.sep, '/') for part in parts])
+    
+    def dirname(self, path):
+        return posixpath.dirname(path)
+    
+    def exists(self, path):
+        with self._channel() as sftp:
+            try:
+                sftp.stat(path)
+                return True
+            except FileNotFoundError:
+                return False
+    
+    def makedirs(self, path, exist_ok=False):
+        with self._channel() as sftp:
+            try:
+                sftp.stat(path)
+                if not exist_ok:
+                    raise FileExistsError(errno.EEXIST, "目錄已存在", path)
+                return
+            except FileNotFoundError:
+                pass
+            
+            # 由上而下建立不存在的各層目錄
+            current = '/' if path.startswith('/') else ''
+            for part in path.strip('/').split('/'):
+                current = posixpath.join(current, part) if current else part
+                try:
+                    sftp.stat(current)
+                except FileNotFoundError:
+                    sftp.mkdir(current)
+    
+    def list_directory(self, directory):
+        """以 listdir_attr 列出目標目錄，回傳 {名稱: RemoteEntry}；目錄不存在時回傳空列表"""
+        listing = {}
+        with self._channel() as sftp:
+            try:
+                attributes = sftp.listdir_attr(directory)
+            except FileNotFoundError:
+                return listing
+        for attr in attributes:
+            if S_ISDIR(attr.st_mode):
+                listing[attr.filename] = RemoteEntry(0, 0, 0, True)
+            else:
+                listing[attr.filename] = RemoteEntry(attr.st_size, attr.st_mtime, attr.st_mtime * 1000000000, False)
+        return listing
+    
+    def stat(self, path):
+        with self._channel() as sftp:
+            attr = sftp.stat(path)
+        return RemoteEntry(attr.st_size, attr.st_mtime, attr.st_mtime * 1000000000, False)
+    
+    @contextmanager
+    def open(self, path, mode='rb'):
+        with self._channel() as sftp:
+            with sftp.open(path, mode, bufsize=self.chunk_size) as remote_file:
+                yield remote_file
+    
+    def upload(self, src_path, dst_path, throttle=None):
+        """上傳檔案，回傳 (複製位元組數, 耗時秒數)"""
+        start = time.perf_counter()
+        copied = 0
+        with self._channel() as sftp:
+            with open(src_path, 'rb') as src, sftp.open(dst_path, 'wb', bufsize=self.chunk_size) as dst:
+                # 管線化寫入：連續送出寫入要求，關閉檔案時才一次確認所有回應
+                dst.set_pipelined(True)
+                for chunk in iter(lambda: src.read(self.chunk_size), b''):
+                    if throttle:
+                        throttle(len(chunk))
+                    dst.write(chunk)
+                    copied += len(chunk)
+        self.copystat(src_path, dst_path)
+        return copied, time.perf_counter() - start
+    
+    def copystat(self, src_path, dst_path):
+        """保留來源的修改時間（SFTP 只記錄到秒），下次比對才能判斷為相同檔案"""
+        stat = os.stat(src_path)
+        with self._channel() as sftp:
+            sftp.utime(dst_path, (stat.st_atime, stat.st_mtime))
+    
+    def replace(self, src_path, dst_path):
+        with self._channel() as sftp:
+            sftp.posix_rename(src_path, dst_path)
+    
+    def remove(self, path):
+        """刪除檔案，不存在時忽略"""
+        with self._channel() as sftp:
+            try:
+                sftp.remove(path)
+            except FileNotFoundError:
+                pass
+    
+    def rmtree(self, path):
+        """遞迴刪除目錄，忽略錯誤"""
+        with self._channel() as sftp:
+            try:
+                attributes = sftp.listdir_attr(path)
+            except OSError:
+                return
+            for attr in attributes:
+                child = posixpath.join(path, attr.filename)
+                if S_ISDIR(attr.st_mode):
+                    self.rmtree(child)
+                else:
+                    try:
+                        sftp.remove(child)
+                    except OSError:
+                        pass
+            try:
+                sftp.rmdir(path)
+            except OSError:
+                pass
+    
+    def close(self):
+        with self.lock:
+            channels, self.channels = self.channels, []
+        for sftp in channels:
+            sftp.close()
+        self.transport.close()
+
+
+class DailyLogFileHandler(logging.Handler):
+    """寫入 logs/publish_YYYYMMDD.log 的日誌處理器
+    
+    依記錄時間換日時改寫入新的檔案，單日檔案超過 max_bytes 時改名為 publish_YYYYMMDD.N.log 後重新開始；
+    換下來的檔案與前幾天未壓縮的日誌以 gzip 壓縮。由背景日誌執行緒呼叫，壓縮不會拖慢發布。
+    """
+    def __init__(self, directory=LOG_DIR, max_bytes=0):
+        super().__init__()
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.stream = None
+        self.date = None
+        self.size = 0
+    
+    def get_log_path(self, date):
+        return os.path.join(self.directory, f'publish_{date}.log')
+    
+    def emit(self, record):
+        try:
+            data = (self.format(record) + '\n').encode('utf-8')
+            date = datetime.fromtimestamp(record.created).strftime('%Y%m%d')
+            if date != self.date:
+                self._open(date)
+            elif self.max_bytes and self.size and self.size + len(data) > self.max_bytes:
+                self._rollover()
+            self.stream.write(data)
+            self.stream.flush()
+            self.size += len(data)
+        except Exception:
+            self.handleError(record)
+    
+    def _open(self, date):
+        """開始寫入指定日期的檔案，並壓縮其他日期未壓縮的日誌"""
+        self._close_stream()
+        self.date = date
+        os.makedirs(self.directory, exist_ok=True)
+        self.stream = open(self.get_log_path(date), 'ab')
+        self.size = self.stream.tell()
+        
+        for path in glob.glob(os.path.join(self.directory, 'publish_*.log')):
+            match = LOG_FILE_PATTERN.match(os.path.basename(path))
+            if match and match.group(1) != date:
+                self._compress(path)
+    
+    def _rollover(self):
+        """目前檔案超過大小上限：改名為下一個編號並壓縮"""
+        self._close_stream()
+        current_path = self.get_log_path(self.date)
+        index = 1
+        while (os.path.exists(f'{current_path[:-4]}.{index}.log') or
+               os.path.exists(f'{current_path[:-4]}.{index}.log.gz')):
+            index += 1
+        rotated_path = f'{current_path[:-4]}.{index}.log'
+        os.replace(current_path, rotated_path)
+        self._compress(rotated_path)
+        self.stream = open(current_path, 'ab')
+        self.size = 0
+    
+    def _compress(self, path):
+        try:
+            with open(path, 'rb') as src, gzip.open(path + '.gz', 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(path)
+        except OSError:
+            # 其他程式仍開啟該檔案時下次再壓縮
+            pass
+    
+    def _close_stream(self):
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None
+    
+    def close(self):
+        self.acquire()
+        try:
+            self._close_stream()
+        finally:
+            self.release()
+        super().close()
+
+
+def format_file_size(size_bytes):
+    """格式化檔案大小"""
+    if size_bytes < 1024:
+        return f"{size_bytes} B"
+    elif size_bytes < 1024 * 1024:
+        return f"{size_bytes / 1024:.1f} KB"
+    elif size_bytes < 1024 * 1024 * 1024:
+        return f"{size_bytes / (1024 * 1024):.1f} MB"
+    else:
+        return f"{size_bytes / (1024 * 1024 * 1024):.1f} GB"
+
+
+def format_duration(seconds):
+    """格式化預估耗時"""
+    if seconds is None:
+        return "無法估算"
+    if seconds < 60:
+        return f"約 {seconds:.0f} 秒"
+    minutes, seconds = divmod(int(seconds), 60)
+    if minutes < 60:
+        return f"約 {minutes} 分 {seconds} 秒"
+    hours, minutes = divmod(minutes, 60)
+    return f"約 {hours} 小時 {minutes} 分"
+
+
+def build_file_record(operation, path, note, size, mtime, timestamp, bytes_saved=0, bytes_transferred=0,
+                      transfer_seconds=0, attempts=1):
+    """由原始數值組合檔案操作記錄 dict（與發布歷史中保存的格式相同），說明文字與時間在此時才格式化"""
+    if note is not None:
+        # 舊版歷史匯入的記錄直接保存說明文字
+        detail = FILE_OPERATION_NOTES.get(note, note)
+    else:
+        detail = f"大小: {size} bytes, 修改時間: {datetime.fromtimestamp(mtime).strftime('%Y-%m-%d %H:%M:%S')}"
+        if transfer_seconds > 0 and bytes_transferred >= THROUGHPUT_REPORT_MIN_SIZE:
+            detail += f", 速率 {format_file_size(bytes_transferred / transfer_seconds)}/s"
+        if bytes_saved:
+            detail += f", 差異傳輸節省 {format_file_size(bytes_saved)}"
+    
+    file_record = {
+        'path': path,
+        'operation': operation,
+        'detail': detail,
+        'timestamp': datetime.fromtimestamp(timestamp).strftime('%H:%M:%S')
+    }
+    if bytes_saved:
+        file_record['bytes_saved'] = bytes_saved
+    if bytes_transferred:
+        file_record['bytes_transferred'] = bytes_transferred
+    if transfer_seconds:
+        file_record['transfer_seconds'] = round(transfer_seconds, 3)
+    if attempts > 1:
+        file_record['attempts'] = attempts
+        file_record['detail'] += f", 嘗試 {attempts} 次"
+    return file_record
+
+
+class FileOperationLog:
+    """單一專案的檔案操作記錄，以欄位陣列保存
+    
+    每個檔案只佔數十位元組：操作與說明以代碼保存，目錄與檔名字串以 sys.intern 在各伺服器間共用，
+    大小、修改時間、記錄時間與傳輸量保存原始數值，說明文字與時間格式在 records() 顯示時才組合。
+    差異傳輸節省量與重試次數很少出現，另存在以索引為鍵的 dict。
+    """
+    OPERATIONS = ('new', 'updated', 'skipped', 'deleted')
+    NOTES = (None,) + tuple(FILE_OPERATION_NOTES)
+    
+    __slots__ = ('dirs', 'names', 'codes', 'notes', 'sizes', 'mtimes', 'times', 'transferred', 'seconds', 'extras')
+    
+    _operation_codes = {operation: code for code, operation in enumerate(OPERATIONS)}
+    _note_codes = {note: code for code, note in enumerate(NOTES)}
+    
+    def __init__(self):
+        self.dirs = []
+        self.names = []
+        self.codes = array('B')
+        self.notes = array('B')
+        self.sizes = array('q')
+        self.mtimes = array('d')
+        self.times = array('d')
+        self.transferred = array('q')
+        self.seconds = array('f')
+        self.extras = {}
+    
+    def __len__(self):
+        return len(self.codes)
+    
+    def __iter__(self):
+        return self.records()
+    
+    def append(self, operation, relative_path, filename, note=None, size=0, mtime=0.0,
+               bytes_saved=0, bytes_transferred=0, transfer_seconds=0.0, attempts=1):
+        """新增一筆操作（呼叫端負責加鎖）"""
+        if bytes_saved or attempts > 1:
+            self.extras[len(self.codes)] = (bytes_saved, attempts)
+        self.dirs.append(sys.intern(relative_path))
+        self.names.append(sys.intern(filename))
+        self.codes.append(self._operation_codes[operation])
+        self.notes.append(self._note_codes[note])
+        self.sizes.append(size)
+        self.mtimes.append(mtime)
+        self.times.append(time.time())
+        self.transferred.append(bytes_transferred)
+        self.seconds.append(transfer_seconds)
+    
+    def records(self, operations=None):
+        """依序產生操作記錄 dict（與發布歷史中的格式相同）
+        
+        operations 指定時只產生這些操作類型，其餘記錄不會組合文字。
+        """
+        for row in self.raw_records(operations):
+            yield build_file_record(*row)
+    
+    def raw_records(self, operations=None):
+        """依序產生原始數值的操作記錄 tuple（欄位順序同 build_file_record 的參數），寫入發布歷史使用"""
+        wanted = None
+        if operations is not None:
+            wanted = {self._operation_codes[operation] for operation in operations}
+        for index, code in enumerate(self.codes):
+            if wanted is None or code in wanted:
+                directory = self.dirs[index]
+                name = self.names[index]
+                bytes_saved, attempts = self.extras.get(index, (0, 1))
+                yield (self.OPERATIONS[code], f"{directory}/{name}" if directory else name,
+                       self.NOTES[self.notes[index]], self.sizes[index], self.mtimes[index], self.times[index],
+                       bytes_saved, self.transferred[index], self.seconds[index], attempts)
+
+
+class FileOperationRunFile:
+    """單次發布的逐檔操作記錄檔（history/runs/<記錄ID>_<隨機碼>.jsonl）
+    
+    串流模式下每個檔案操作發生時附加一行 JSON（伺服器、專案、路徑、操作與原始數值），
+    記憶體中只保留統計；報告或歷史檢視需要檔案清單時，records() 才逐行讀取並組合記錄。
+    需要多個專案的記錄時以 project_raw_records() 讀取一次再依伺服器與專案分配，不必逐一重新掃描。
+    寫入發布歷史後由 release() 刪除；報告正在讀取時（acquire_reader() 登記）延後到最後一個讀取者結束才刪除。
+    """
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+        self.lock = threading.Lock()
+        self.readers = 0
+        self.released = False
+    
+    def open(self):
+        run_dir = os.path.dirname(self.path)
+        if run_dir and not os.path.exists(run_dir):
+            os.makedirs(run_dir)
+        self.file = open(self.path, 'w', encoding='utf-8', buffering=RUN_OPERATIONS_BUFFER_SIZE)
+    
+    def write(self, server_key, project_name, operation, relative_path, filename, note=None, size=0, mtime=0.0,
+              bytes_saved=0, bytes_transferred=0, transfer_seconds=0.0, attempts=1):
+        """附加一筆操作（呼叫端負責加鎖）"""
+        record = {
+            'server': server_key,
+            'project': project_name,
+            'path': f"{relative_path}/{filename}" if relative_path else filename,
+            'operation': operation,
+            'time': time.time()
+        }
+        if note is not None:
+            record['note'] = note
+        else:
+            record['size'] = size
+            record['mtime'] = mtime
+        if bytes_saved:
+            record['bytes_saved'] = bytes_saved
+        if bytes_transferred:
+            record['bytes_transferred'] = bytes_transferred
+        if transfer_seconds:
+            record['transfer_seconds'] = transfer_seconds
+        if attempts > 1:
+            record['attempts'] = attempts
+        self.file.write(json.dumps(record, ensure_ascii=False) + '\n')
+    
+    def flush(self):
+        if self.file is not None:
+            self.file.flush()
+    
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+    
+    def records(self, server_key=None, project_name=None, operations=None):
+        """逐行讀取並產生符合條件的操作記錄 dict；檔案不存在時不產生任何記錄"""
+        for row in self.raw_records(server_key, project_name, operations):
+            yield build_file_record(*row)
+    
+    def raw_records(self, server_key=None, project_name=None, operations=None):
+        """逐行讀取並產生符合條件的原始數值操作記錄 tuple（欄位順序同 build_file_record 的參數）"""
+        for record_server, record_project, row in self.project_raw_records(operations):
+            if ((server_key is None or record_server == server_key) and
+                    (project_name is None or record_project == project_name)):
+                yield row
+    
+    def acquire_reader(self):
+        """登記一個讀取者，讀取結束時呼叫 release_reader()
+        
+        記錄檔已寫入歷史時回傳 False，呼叫端改由資料庫讀取。
+        """
+        with self.lock:
+            if self.released:
+                return False
+            self.readers += 1
+            return True
+    
+    def release_reader(self):
+        """讀取結束；記錄檔已寫入歷史且沒有其他讀取者時刪除（失敗時留待下次發布清理）"""
+        with self.lock:
+            self.readers -= 1
+            remove = self.released and self.readers == 0
+        if remove:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+    
+    def release(self, use_history):
+        """記錄檔已寫入歷史：在鎖內呼叫 use_history() 讓報告改由資料庫讀取，再刪除記錄檔
+        
+        仍有讀取者時不刪除，由最後一個讀取者結束時刪除；回傳是否已刪除，刪除失敗時拋出 OSError。
+        """
+        with self.lock:
+            use_history()
+            self.released = True
+            if self.readers:
+                return False
+        os.remove(self.path)
+        return True
+    
+    def project_raw_records(self, operations=None):
+        """逐行讀取一次，依寫入順序產生 (伺服器, 專案, 原始數值記錄 tuple)"""
+        self.flush()
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # 程式中斷時最後一行可能只寫了一半
+                    break
+                if operations is not None and record['operation'] not in operations:
+                    continue
+                yield record['server'], record['project'], (
+                    record['operation'], record['path'], record.get('note'),
+                    record.get('size', 0), record.get('mtime', 0.0), record['time'],
+                    record.get('bytes_saved', 0), record.get('bytes_transferred', 0),
+                    record.get('transfer_seconds', 0), record.get('attempts', 1))
+
+
+class FileOperationStream:
+    """串流模式下專案報告的 files：操作寫入 FileOperationRunFile，記憶體中只保留筆數
+    
+    與 FileOperationLog 有相同的 append() / records() 介面，寫入發布歷史時不展開檔案清單。
+    寫入發布歷史後 history 指向資料庫中的記錄（HistoryFileOperations），記錄檔刪除後改由資料庫讀取。
+    """
+    __slots__ = ('run_file', 'server_key', 'project_name', 'count', 'history')
+    
+    def __init__(self, run_file, server_key, project_name):
+        self.run_file = run_file
+        self.server_key = server_key
+        self.project_name = project_name
+        self.count = 0
+        self.history = None
+    
+    def __len__(self):
+        return self.count
+    
+    def __iter__(self):
+        return self.records()
+    
+    def append(self, operation, relative_path, filename, note=None, size=0, mtime=0.0,
+               bytes_saved=0, bytes_transferred=0, transfer_seconds=0.0, attempts=1):
+        """新增一筆操作（呼叫端負責加鎖）"""
+        self.run_file.write(self.server_key, self.project_name, operation, relative_path, filename, note, size, mtime,
+                            bytes_saved, bytes_transferred, transfer_seconds, attempts)
+        self.count += 1
+    
+    def records(self, operations=None):
+        # 讀取期間記錄檔不會被刪除；已寫入歷史時改由資料庫讀取
+        if not self.run_file.acquire_reader():
+            yield from self.history.records(operations)
+            return
+        try:
+            yield from self.run_file.records(self.server_key, self.project_name, operations)
+        finally:
+            self.run_file.release_reader()
+    
+    def raw_records(self, operations=None):
+        return self.run_file.raw_records(self.server_key, self.project_name, operations)
+
+
+def group_report_records(report, operations=None):
+    """一次取得報告中所有專案的檔案操作記錄，回傳 {(伺服器, 專案): [記錄 dict, ...]}
+    
+    串流模式的記錄檔只讀取一次再依伺服器與專案分組，不會為每個專案重新掃描整個檔案；
+    讀取期間背景寫入歷史也不會刪除記錄檔，已寫入歷史的記錄檔改由資料庫讀取。
+    """
+    grouped = {}
+    run_files = {}
+    for server_key, server_data in report['servers'].items():
+        for project_name, project_data in server_data['projects'].items():
+            files = project_data['files']
+            if isinstance(files, FileOperationStream):
+                run_files.setdefault(files.run_file.path, (files.run_file, {}))[1][(server_key, project_name)] = files
+            else:
+                grouped[(server_key, project_name)] = list(files.records(operations))
+    
+    for run_file, streams in run_files.values():
+        if not run_file.acquire_reader():
+            for key, files in streams.items():
+                grouped[key] = list(files.history.records(operations))
+            continue
+        try:
+            stream_records = {key: [] for key in streams}
+            for server_key, project_name, row in run_file.project_raw_records(operations):
+                records = stream_records.get((server_key, project_name))
+                if records is not None:
+                    records.append(build_file_record(*row))
+            grouped.update(stream_records)
+        finally:
+            run_file.release_reader()
+    return grouped
+
+
+class HistoryFileOperations:
+    """歷史記錄中單一專案的檔案操作，需要時才查詢資料庫"""
+    __slots__ = ('store', 'project_id')
+    
+    def __init__(self, store, project_id):
+        self.store = store
+        self.project_id = project_id
+    
+    def __iter__(self):
+        return self.records()
+    
+    def records(self, operations=None, retried_only=False, limit=None):
+        return self.store.file_records(self.project_id, operations, retried_only, limit)
+    
+    def count(self, operations=None, retried_only=False):
+        return self.store.count_file_records(self.project_id, operations, retried_only)
+
+
+class HistoryStore:
+    """發布歷史資料庫（SQLite，history/publish_history.db）
+    
+    runs、servers、projects、file_ops 四個資料表分別保存每次發布、各伺服器、各專案的統計與逐檔操作，
+    發布時間、狀態與檔案路徑都有索引：列出歷史只讀取 runs 的一頁，查看詳情時才讀取該次發布的資料，
+    逐檔操作以游標逐筆讀取。每次操作各自開啟連線，可在發布執行緒與 GUI 主線程同時使用。
+    paths 與 path_terms 為檔案路徑的反向索引（路徑各段的小寫字串 → 路徑），search_file_ops() 以此查詢
+    某個檔案在哪些發布、哪些伺服器被新增或更新過。
+    舊版的 history/publish_history.json 於第一次開啟時匯入，匯入後改名為 .json.bak。
+    """
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS runs (
+            id INTEGER PRIMARY KEY,
+            record_id TEXT NOT NULL,
+            start_time TEXT NOT NULL,
+            end_time TEXT,
+            duration REAL,
+            server_count INTEGER,
+            status TEXT,
+            new_files INTEGER, updated_files INTEGER, skipped_files INTEGER, deleted_files INTEGER,
+            bytes_saved INTEGER, bytes_transferred INTEGER, retried_files INTEGER
+        );
+        CREATE INDEX IF NOT EXISTS idx_runs_start_time ON runs (start_time);
+        CREATE INDEX IF NOT EXISTS idx_runs_status ON runs (status, start_time);
+        CREATE TABLE IF NOT EXISTS servers (
+            id INTEGER PRIMARY KEY,
+            run_id INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+            server_key TEXT NOT NULL,
+            status TEXT,
+            error TEXT,
+            duration REAL,
+            switch_duration REAL,
+            throughput REAL,
+            new_files INTEGER, updated_files INTEGER, skipped_files INTEGER, deleted_files INTEGER,
+            bytes_saved INTEGER, bytes_transferred INTEGER, transfer_seconds REAL, retried_files INTEGER
+        );
+        CREATE INDEX IF NOT EXISTS idx_servers_run ON servers (run_id);
+        CREATE TABLE IF NOT EXISTS projects (
+            id INTEGER PRIMARY KEY,
+            server_id INTEGER NOT NULL REFERENCES servers (id) ON DELETE CASCADE,
+            project_name TEXT NOT NULL,
+            new_files INTEGER, updated_files INTEGER, skipped_files INTEGER, deleted_files INTEGER,
+            bytes_saved INTEGER, bytes_transferred INTEGER, transfer_seconds REAL
+        );
+        CREATE INDEX IF NOT EXISTS idx_projects_server ON projects (server_id);
+        CREATE TABLE IF NOT EXISTS file_ops (
+            project_id INTEGER NOT NULL REFERENCES projects (id) ON DELETE CASCADE,
+            operation TEXT NOT NULL,
+            path TEXT NOT NULL,
+            note TEXT,
+            size INTEGER,
+            mtime REAL,
+            time REAL,
+            bytes_saved INTEGER,
+            bytes_transferred INTEGER,
+            transfer_seconds REAL,
+            attempts INTEGER
+        );
+        CREATE INDEX IF NOT EXISTS idx_file_ops_project ON file_ops (project_id);
+        CREATE INDEX IF NOT EXISTS idx_file_ops_path ON file_ops (path);
+        CREATE TABLE IF NOT EXISTS paths (
+            id INTEGER PRIMARY KEY,
+            path TEXT NOT NULL UNIQUE
+        );
+        CREATE TABLE IF NOT EXISTS path_terms (
+            term TEXT NOT NULL,
+            path_id INTEGER NOT NULL,
+            PRIMARY KEY (term, path_id)
+        ) WITHOUT ROWID;
+    """
+    # 資料庫結構版本（PRAGMA user_version）；2 起有檔案路徑反向索引
+    SCHEMA_VERSION = 2
+    STATS_COLUMNS = ('new_files', 'updated_files', 'skipped_files', 'deleted_files')
+    RUN_COLUMNS = ('id', 'record_id', 'start_time', 'end_time', 'duration', 'server_count', 'status') + STATS_COLUMNS + (
+        'bytes_saved', 'bytes_transferred', 'retried_files')
+    SERVER_COLUMNS = ('id', 'server_key', 'status', 'error', 'duration', 'switch_duration', 'throughput') + STATS_COLUMNS + (
+        'bytes_saved', 'bytes_transferred', 'transfer_seconds', 'retried_files')
+    PROJECT_COLUMNS = ('id', 'project_name') + STATS_COLUMNS + ('bytes_saved', 'bytes_transferred', 'transfer_seconds')
+    FILE_OPS_INSERT = ('INSERT INTO file_ops (project_id, operation, path, note, size, mtime, time, bytes_saved, '
+                       'bytes_transferred, transfer_seconds, attempts) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)')
+    
+    def __init__(self, db_file, legacy_file=None):
+        self.db_file = db_file
+        self.legacy_file = legacy_file
+        self.init_lock = threading.Lock()
+        self.initialized = False
+    
+    @contextmanager
+    def connect(self):
+        """開啟連線並在區塊結束時提交（發生例外時復原）"""
+        self._initialize()
+        connection = sqlite3.connect(self.db_file)
+        try:
+            connection.execute('PRAGMA foreign_keys = ON')
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+    
+    def _initialize(self):
+        """第一次使用時建立資料表並匯入舊版 JSON 歷史"""
+        with self.init_lock:
+            if self.initialized:
+                return
+            db_dir = os.path.dirname(self.db_file)
+            if db_dir and not os.path.exists(db_dir):
+                os.makedirs(db_dir)
+            connection = sqlite3.connect(self.db_file)
+            try:
+                connection.execute('PRAGMA journal_mode = WAL')
+                connection.executescript(self.SCHEMA)
+                if connection.execute('PRAGMA user_version').fetchone()[0] < self.SCHEMA_VERSION:
+                    # 舊版資料庫補建路徑索引
+                    with connection:
+                        self._index_paths(connection)
+                        connection.execute(f'PRAGMA user_version = {self.SCHEMA_VERSION}')
+                if self.legacy_file and os.path.exists(self.legacy_file):
+                    with connection:
+                        self._import_legacy(connection)
+                    os.replace(self.legacy_file, self.legacy_file + '.bak')
+            finally:
+                connection.close()
+            self.initialized = True
+    
+    def _import_legacy(self, connection):
+        """匯入舊版 publish_history.json（由舊到新，逐檔操作的說明文字保留在 note 欄位）"""
+        with open(self.legacy_file, 'r', encoding='utf-8') as f:
+            records = json.load(f)
+        
+        for record in reversed(records):
+            run_date = record['start_time'][:10]
+            servers = {}
+            for server_key, server_data in record.get('servers', {}).items():
+                projects = {}
+                for project_name, project_data in server_data.get('projects', {}).items():
+                    projects[project_name] = dict(project_data, files=[
+                        self._legacy_file_row(file_info, run_date) for file_info in project_data.get('files') or []])
+                servers[server_key] = dict(server_data, projects=projects)
+            # 串流模式的舊記錄從記錄檔讀取一次，依伺服器與專案寫入
+            run_files = [FileOperationRunFile(record['operations_file'])] if record.get('operations_file') else []
+            self._insert_run(connection, record['id'], record, servers, run_files)
+    
+    @staticmethod
+    def _legacy_file_row(file_info, run_date):
+        """將舊版記錄 dict 轉為 file_ops 的原始數值列"""
+        attempts = file_info.get('attempts', 1)
+        detail = file_info.get('detail', '')
+        suffix = f", 嘗試 {attempts} 次"
+        if attempts > 1 and detail.endswith(suffix):
+            detail = detail[:-len(suffix)]
+        try:
+            timestamp = datetime.fromisoformat(f"{run_date}T{file_info['timestamp']}").timestamp()
+        except (KeyError, ValueError):
+            timestamp = 0.0
+        return (file_info['operation'], file_info['path'], detail, 0, 0.0, timestamp,
+                file_info.get('bytes_saved', 0), file_info.get('bytes_transferred', 0),
+                file_info.get('transfer_seconds', 0), attempts)
+    
+    def add_run(self, report, status):
+        """保存一次發布的報告，回傳新記錄的 id"""
+        summary = {
+            'start_time': report['start_time'].isoformat(),
+            'end_time': report['end_time'].isoformat() if report['end_time'] else None,
+            'duration': (report['end_time'] - report['start_time']).total_seconds() if report['end_time'] else 0,
+            'server_count': len(report['servers']),
+            'status': status,
+            'total_stats': report['total_stats'],
+            'bytes_saved': report.get('bytes_saved', 0),
+            'bytes_transferred': report.get('bytes_transferred', 0),
+            'retried_files': report.get('retried_files', 0)
+        }
+        servers = {}
+        run_files = {}
+        for server_key, server_data in report['servers'].items():
+            projects = {}
+            for project_name, project_data in server_data['projects'].items():
+                files = project_data['files']
+                if isinstance(files, FileOperationStream):
+                    # 串流模式的記錄檔在所有專案建立後讀取一次，依伺服器與專案寫入
+                    run_files[files.run_file.path] = files.run_file
+                    projects[project_name] = dict(project_data, files=())
+                else:
+                    projects[project_name] = dict(project_data, files=files.raw_records())
+            servers[server_key] = dict(server_data, projects=projects)
+        with self.connect() as connection:
+            return self._insert_run(connection, report['start_time'].strftime('%Y%m%d_%H%M%S'), summary, servers,
+                                    run_files.values())
+    
+    def _insert_run(self, connection, record_id, summary, servers, run_files=()):
+        """寫入一次發布；run_files 為串流模式的記錄檔，其中的記錄依伺服器與專案寫入對應的專案"""
+        stats = summary['total_stats']
+        cursor = connection.execute(
+            'INSERT INTO runs (record_id, start_time, end_time, duration, server_count, status, new_files, updated_files, '
+            'skipped_files, deleted_files, bytes_saved, bytes_transferred, retried_files) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (record_id, summary['start_time'], summary['end_time'], summary['duration'], summary['server_count'],
+             summary['status']) + tuple(stats[key] for key in self.STATS_COLUMNS) +
+            (summary.get('bytes_saved', 0), summary.get('bytes_transferred', 0), summary.get('retried_files', 0)))
+        run_id = cursor.lastrowid
+        project_ids = {}
+        
+        for server_key, server_data in servers.items():
+            server_stats = server_data['stats']
+            cursor = connection.execute(
+                'INSERT INTO servers (run_id, server_key, status, error, duration, switch_duration, throughput, new_files, '
+                'updated_files, skipped_files, deleted_files, bytes_saved, bytes_transferred, transfer_seconds, retried_files) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (run_id, server_key, server_data.get('status'), server_data.get('error'), server_data.get('duration'),
+                 server_data.get('switch_duration'), server_data.get('throughput')) +
+                tuple(server_stats[key] for key in self.STATS_COLUMNS) +
+                (server_data.get('bytes_saved', 0), server_data.get('bytes_transferred', 0),
+                 server_data.get('transfer_seconds', 0), server_data.get('retried_files', 0)))
+            server_id = cursor.lastrowid
+            
+            for project_name, project_data in server_data['projects'].items():
+                project_stats = project_data['stats']
+                cursor = connection.execute(
+                    'INSERT INTO projects (server_id, project_name, new_files, updated_files, skipped_files, deleted_files, '
+                    'bytes_saved, bytes_transferred, transfer_seconds) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    (server_id, project_name) + tuple(project_stats[key] for key in self.STATS_COLUMNS) +
+                    (project_data.get('bytes_saved', 0), project_data.get('bytes_transferred', 0),
+                     project_data.get('transfer_seconds', 0)))
+                project_id = cursor.lastrowid
+                project_ids[(server_key, project_name)] = project_id
+                
+                # 逐檔操作以產生器寫入，不需先展開成清單
+                connection.executemany(self.FILE_OPS_INSERT, ((project_id,) + tuple(row) for row in project_data['files']))
+        
+        for run_file in run_files:
+            connection.executemany(self.FILE_OPS_INSERT, (
+                (project_ids[(server_key, project_name)],) + row
+                for server_key, project_name, row in run_file.project_raw_records()
+                if (server_key, project_name) in project_ids))
+        
+        self._index_paths(connection, run_id)
+        return run_id
+    
+    @staticmethod
+    def _path_terms(path):
+        """路徑的索引詞：以 / 或 \\ 分隔的各段，轉為小寫"""
+        return {segment.lower() for segment in re.split(r'[\\/]', path) if segment}
+    
+    def _index_paths(self, connection, run_id=None):
+        """將尚未索引的檔案路徑（run_id 指定時只處理該次發布）加入 paths，並為新路徑建立 path_terms"""
+        last_id = connection.execute('SELECT COALESCE(MAX(id), 0) FROM paths').fetchone()[0]
+        if run_id is None:
+            connection.execute('INSERT OR IGNORE INTO paths (path) SELECT DISTINCT path FROM file_ops')
+        else:
+            connection.execute(
+                'INSERT OR IGNORE INTO paths (path) SELECT DISTINCT file_ops.path FROM file_ops '
+                'JOIN projects ON file_ops.project_id = projects.id '
+                'JOIN servers ON projects.server_id = servers.id WHERE servers.run_id = ?', (run_id,))
+        new_paths = connection.execute('SELECT id, path FROM paths WHERE id > ?', (last_id,)).fetchall()
+        connection.executemany('INSERT OR IGNORE INTO path_terms (term, path_id) VALUES (?, ?)',
+                               ((term, path_id) for path_id, path in new_paths for term in self._path_terms(path)))
+    
+    def _run_summary(self, row):
+        summary = dict(zip(self.RUN_COLUMNS, row))
+        summary['run_id'] = summary.pop('id')
+        summary['id'] = summary.pop('record_id')
+        summary['total_stats'] = {key: summary.pop(key) for key in self.STATS_COLUMNS}
+        return summary
+    
+    def list_runs(self, limit=None, offset=0, status=None):
+        """依發布時間由新到舊列出一頁發布摘要（不含伺服器與檔案資料）"""
+        query = f"SELECT {', '.join(self.RUN_COLUMNS)} FROM runs"
+        params = []
+        if status:
+            query += ' WHERE status = ?'
+            params.append(status)
+        query += ' ORDER BY start_time DESC, id DESC LIMIT ? OFFSET ?'
+        params += [limit if limit is not None else -1, offset]
+        with self.connect() as connection:
+            return [self._run_summary(row) for row in connection.execute(query, params)]
+    
+    def count_runs(self, status=None):
+        with self.connect() as connection:
+            if status:
+                return connection.execute('SELECT COUNT(*) FROM runs WHERE status = ?', (status,)).fetchone()[0]
+            return connection.execute('SELECT COUNT(*) FROM runs').fetchone()[0]
+    
+    def get_run_summary(self, run_id):
+        """讀取單次發布的摘要（只查詢 runs）"""
+        with self.connect() as connection:
+            row = connection.execute(f"SELECT {', '.join(self.RUN_COLUMNS)} FROM runs WHERE id = ?", (run_id,)).fetchone()
+        return self._run_summary(row) if row is not None else None
+    
+    def get_run(self, run_id):
+        """讀取單次發布的摘要、各伺服器與各專案統計；專案的 files 為逐筆讀取 file_ops 的產生器"""
+        with self.connect() as connection:
+            row = connection.execute(f"SELECT {', '.join(self.RUN_COLUMNS)} FROM runs WHERE id = ?", (run_id,)).fetchone()
+            if row is None:
+                return None
+            record = self._run_summary(row)
+            record['servers'] = {}
+            server_rows = connection.execute(
+                f"SELECT {', '.join(self.SERVER_COLUMNS)} FROM servers WHERE run_id = ? ORDER BY id", (run_id,)).fetchall()
+            for server_row in server_rows:
+                server_data = dict(zip(self.SERVER_COLUMNS, server_row))
+                server_id = server_data.pop('id')
+                server_data['stats'] = {key: server_data.pop(key) for key in self.STATS_COLUMNS}
+                server_data['projects'] = {}
+                project_rows = connection.execute(
+                    f"SELECT {', '.join(self.PROJECT_COLUMNS)} FROM projects WHERE server_id = ? ORDER BY id",
+                    (server_id,)).fetchall()
+                for project_row in project_rows:
+                    project_data = dict(zip(self.PROJECT_COLUMNS, project_row))
+                    project_id = project_data.pop('id')
+                    project_data['stats'] = {key: project_data.pop(key) for key in self.STATS_COLUMNS}
+                    project_data['files'] = HistoryFileOperations(self, project_id)
+                    server_data['projects'][project_data.pop('project_name')] = project_data
+                record['servers'][server_data.pop('server_key')] = server_data
+        return record
+    
+    @staticmethod
+    def _file_ops_filter(project_id, operations=None, retried_only=False):
+        """組合 file_ops 的查詢條件與參數"""
+        condition = 'project_id = ?'
+        params = [project_id]
+        if operations is not None:
+            condition += f" AND operation IN ({', '.join('?' * len(operations))})"
+            params += list(operations)
+        if retried_only:
+            condition += ' AND attempts > 1'
+        return condition, params
+    
+    def file_records(self, project_id, operations=None, retried_only=False, limit=None):
+        """逐筆產生專案的檔案操作記錄 dict（依寫入順序），limit 為最多筆數"""
+        condition, params = self._file_ops_filter(project_id, operations, retried_only)
+        query = ('SELECT operation, path, note, size, mtime, time, bytes_saved, bytes_transferred, transfer_seconds, '
+                 f'attempts FROM file_ops WHERE {condition} ORDER BY rowid LIMIT ?')
+        with self.connect() as connection:
+            for row in connection.execute(query, params + [limit if limit is not None else -1]):
+                yield build_file_record(*row)
+    
+    def count_file_records(self, project_id, operations=None, retried_only=False):
+        condition, params = self._file_ops_filter(project_id, operations, retried_only)
+        with self.connect() as connection:
+            return connection.execute(f'SELECT COUNT(*) FROM file_ops WHERE {condition}', params).fetchone()[0]
+    
+    def recent_server_transfers(self, limit):
+        """最近 limit 次成功發布中各伺服器的 (識別名稱, 傳輸位元組數, 耗時秒數)"""
+        with self.connect() as connection:
+            return connection.execute(
+                'SELECT servers.server_key, servers.bytes_transferred, servers.duration FROM servers '
+                'JOIN (SELECT id FROM runs WHERE status = ? ORDER BY start_time DESC LIMIT ?) recent '
+                'ON servers.run_id = recent.id', ('成功', limit)).fetchall()
+    
+    def search_file_ops(self, query, include_skipped=False, limit=HISTORY_SEARCH_LIMIT):
+        """查詢路徑符合 query 的檔案操作，依發布時間由新到舊回傳最多 limit 筆
+        
+        query 以 / 、 \\ 或空白分隔成數個詞，每個詞都必須是路徑中某一段的開頭（不分大小寫），
+        例如 "app.js"、"css/site" 或 "web.config"。先由 path_terms 的索引找出符合的路徑，
+        再以 file_ops 的路徑索引取出各次發布的操作，查詢時間與歷史筆數無關。
+        """
+        terms = sorted({term.lower() for term in re.split(r'[\\/\s]+', query) if term})
+        if not terms:
+            return []
+        
+        results = []
+        with self.connect() as connection:
+            # 以符合路徑最少的詞從索引帶出候選路徑，其餘的詞直接比對路徑各段；
+            # 計數與候選路徑都只取到 HISTORY_SEARCH_TERM_SCAN 筆為止，每個詞都很籠統時結果可能不完整
+            def term_count(term):
+                return connection.execute(
+                    'SELECT COUNT(*) FROM (SELECT 1 FROM path_terms WHERE term >= ? AND term < ? LIMIT ?)',
+                    (term, term + '\U0010ffff', HISTORY_SEARCH_TERM_SCAN)).fetchone()[0]
+            
+            lead_term = min(terms, key=term_count)
+            other_terms = [term for term in terms if term != lead_term]
+            path_ids = {}
+            candidates = connection.execute(
+                'SELECT paths.id, paths.path FROM path_terms JOIN paths ON paths.id = path_terms.path_id '
+                'WHERE path_terms.term >= ? AND path_terms.term < ? LIMIT ?',
+                (lead_term, lead_term + '\U0010ffff', HISTORY_SEARCH_TERM_SCAN))
+            for path_id, path in candidates:
+                if path_id in path_ids:
+                    continue
+                if other_terms:
+                    segments = self._path_terms(path)
+                    if not all(any(segment.startswith(term) for segment in segments) for term in other_terms):
+                        continue
+                path_ids[path_id] = None
+                if len(path_ids) >= HISTORY_SEARCH_MAX_PATHS:
+                    break
+            if not path_ids:
+                return []
+            
+            operation_filter = '' if include_skipped else "AND file_ops.operation != 'skipped'"
+            placeholders = ', '.join('?' * len(path_ids))
+            rows = connection.execute(
+                'SELECT runs.id, runs.record_id, runs.start_time, runs.status, servers.server_key, projects.project_name, '
+                'file_ops.operation, file_ops.path, file_ops.note, file_ops.size, file_ops.mtime, file_ops.time, '
+                'file_ops.bytes_saved, file_ops.bytes_transferred, file_ops.transfer_seconds, file_ops.attempts '
+                'FROM paths JOIN file_ops ON file_ops.path = paths.path '
+                'JOIN projects ON projects.id = file_ops.project_id '
+                'JOIN servers ON servers.id = projects.server_id '
+                'JOIN runs ON runs.id = servers.run_id '
+                f'WHERE paths.id IN ({placeholders}) {operation_filter} '
+                'ORDER BY runs.start_time DESC, file_ops.rowid DESC LIMIT ?', list(path_ids) + [limit])
+            for row in rows:
+                file_record = build_file_record(*row[6:])
+                file_record.update(run_id=row[0], id=row[1], start_time=row[2], status=row[3], server=row[4],
+                                   project=row[5], size=row[9], mtime=row[10])
+                results.append(file_record)
+        return results
+    
+    def delete_runs(self, run_ids):
+        with self.connect() as connection:
+            connection.executemany('DELETE FROM runs WHERE id = ?', [(run_id,) for run_id in run_ids])
+            # 移除已沒有任何操作記錄的路徑索引
+            stale_paths = connection.execute(
+                'SELECT id, path FROM paths WHERE NOT EXISTS (SELECT 1 FROM file_ops WHERE file_ops.path = paths.path)'
+            ).fetchall()
+            connection.executemany('DELETE FROM path_terms WHERE term = ? AND path_id = ?',
+                                   ((term, path_id) for path_id, path in stale_paths for term in self._path_terms(path)))
+            connection.executemany('DELETE FROM paths WHERE id = ?', ((path_id,) for path_id, _ in stale_paths))
+    
+    def clear(self):
+        with self.connect() as connection:
+            connection.execute('DELETE FROM runs')
+            connection.execute('DELETE FROM path_terms')
+            connection.execute('DELETE FROM paths')
+
+
+class PublishProgress:
+    """發布進度：各伺服器已處理的檔案數與位元組數，以及平滑後的處理速率與預估剩餘時間
+    
+    複製執行緒只在鎖內累加計數，GUI 與命令列以固定間隔呼叫 sample() 取得快照，
+    不需要每處理一個檔案就通知畫面。位元組數以完成檔案的大小計算，傳輸中的檔案
+    依已寫入的區塊即時累加，大檔案也能平順前進。
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset([])
+    
+    def reset(self, server_keys, files_per_server=0, bytes_per_server=0):
+        """開始新的發布；每台伺服器都要處理同一份來源清單"""
+        with self.lock:
+            self.servers = {server_key: self._new_counter(files_per_server, bytes_per_server) for server_key in server_keys}
+            self.total = self._new_counter(files_per_server * len(server_keys), bytes_per_server * len(server_keys))
+            self.sample_time = time.monotonic()
+    
+    def _new_counter(self, total_files, total_bytes):
+        return {'files': 0, 'bytes': 0, 'inflight': 0, 'transferred': 0,
+                'total_files': total_files, 'total_bytes': total_bytes,
+                'sampled_bytes': 0, 'sampled_transferred': 0, 'rate': None, 'transfer_rate': None}
+    
+    def file_done(self, server_key, size):
+        """一個檔案處理完成（複製、跳過或續傳）"""
+        with self.lock:
+            for counter in (self.servers.get(server_key), self.total):
+                if counter is not None:
+                    counter['files'] += 1
+                    counter['bytes'] += size
+    
+    def add_streamed(self, server_key, amount):
+        """傳輸中的檔案寫入一個區塊；檔案結束後以負值扣回，改由 file_done 計入完整大小"""
+        with self.lock:
+            for counter in (self.servers.get(server_key), self.total):
+                if counter is not None:
+                    counter['inflight'] += amount
+                    if amount > 0:
+                        counter['transferred'] += amount
+    
+    def sample(self):
+        """取得進度快照並更新平滑速率；應由單一呼叫者以固定間隔呼叫"""
+        with self.lock:
+            now = time.monotonic()
+            elapsed = now - self.sample_time
+            self.sample_time = now
+            # 依取樣間隔換算的指數移動平均係數，取樣頻率不同時平滑程度一致
+            alpha = 1 - math.exp(-elapsed / PROGRESS_RATE_WINDOW) if elapsed > 0 else 0
+            
+            snapshot = self._sample_counter(self.total, elapsed, alpha)
+            snapshot['servers'] = {server_key: self._sample_counter(counter, elapsed, alpha)
+                                   for server_key, counter in self.servers.items()}
+            return snapshot
+    
+    def _sample_counter(self, counter, elapsed, alpha):
+        processed_bytes = counter['bytes'] + max(0, counter['inflight'])
+        if elapsed > 0:
+            for rate_key, value_key, value in (('rate', 'sampled_bytes', processed_bytes),
+                                               ('transfer_rate', 'sampled_transferred', counter['transferred'])):
+                current = max(0, value - counter[value_key]) / elapsed
+                previous = counter[rate_key]
+                counter[rate_key] = current if previous is None else previous + alpha * (current - previous)
+                counter[value_key] = value
+        
+        total_bytes = counter['total_bytes']
+        processed_bytes = min(processed_bytes, total_bytes)
+        remaining = total_bytes - processed_bytes
+        if counter['files'] >= counter['total_files']:
+            eta = 0
+        elif counter['rate']:
+            eta = remaining / counter['rate']
+        else:
+            eta = None
+        
+        return {
+            'files': counter['files'],
+            'total_files': counter['total_files'],
+            'bytes': processed_bytes,
+            'total_bytes': total_bytes,
+            'rate': counter['rate'] or 0,
+            'transfer_rate': counter['transfer_rate'] or 0,
+            'eta': eta
+        }
+
+
+class ServerLogAdapter(logging.LoggerAdapter):
+    """在日誌訊息前加上伺服器標記，方便辨識並行發布時交錯的日誌"""
+    def process(self, msg, kwargs):
+        return f"[{self.extra['server']}] {msg}", kwargs
+
+class PublishListener:
+    """發布事件的回呼介面，只需覆寫用到的方法
+
+    回呼在發布執行緒中執行（並行發布時可能同時來自多個執行緒），
+    需要更新 GUI 的接收者應自行轉交主線程。
+    """
+    def on_status(self, text):
+        """發布狀態文字更新"""
+        pass
+
+    def on_progress_start(self, progress):
+        """開始處理檔案；progress 為 PublishProgress，以固定間隔呼叫 progress.sample() 取得進度"""
+        pass
+
+    def on_server_finished(self, server_key, server_report):
+        """單一伺服器發布結束（server_report['status'] 為 成功／失敗）"""
+        pass
+
+    def on_finished(self, result):
+        """發布或預覽結束，result 為 PublishResult"""
+        pass
+
+
+class PublishResult:
+    """一次發布或預覽的結果
+
+    report 為完整的發布報告（各伺服器、各專案的統計與檔案操作），
+    plan 只在預覽成功時建立，error 為 None 表示成功。
+    """
+    def __init__(self, report, error=None, plan=None):
+        self.report = report
+        self.error = error
+        self.plan = plan
+
+    @property
+    def success(self):
+        return self.error is None
+
+    @property
+    def dry_run(self):
+        return self.report.get('dry_run', False)
+
+    @property
+    def start_time(self):
+        return self.report['start_time']
+
+    @property
+    def end_time(self):
+        return self.report['end_time']
+
+    @property
+    def duration(self):
+        """耗時秒數"""
+        if not self.report['end_time']:
+            return 0
+        return (self.report['end_time'] - self.report['start_time']).total_seconds()
+
+
+class PublishEngine:
+    """發布引擎，不建立任何 GUI 元件
+
+    execute() 執行發布、plan() 預覽發布計畫，兩者都阻塞到結束並回傳 PublishResult；
+    過程中的狀態與進度經由 add_listener() 註冊的 PublishListener 回報。
+    """
+    def __init__(self, config_file=CONFIG_FILE, share_sessions=None, logger=None):
+        self.config_file = config_file
+        self.listeners = []
+        
+        # 設置LOG記錄（由外部提供 logger 時不更動全域日誌設定）
+        if logger is None:
+            self.setup_logging()
+        else:
+            self.logger = logger
+            self.log_file_handler = None
+        
+        # 設定數據
+        self.config = {
+            'source_files': [],
+            'delete_files': [],
+            'servers': [],
+            'schedule_time': None,
+            'smtp_config': {
+                'smtp_server': '',
+                'smtp_port': 587,
+                'username': '',
+                'password': '',
+                'use_tls': True
+            },
+            'notification_emails': [],
+            'publish_options': dict(DEFAULT_PUBLISH_OPTIONS)
+        }
+        self._apply_log_options()
+        
+        # 發布報告與進度計數的共用鎖（並行發布時多個執行緒會同時寫入）
+        self.report_lock = threading.Lock()
+        
+        # 同一時間只允許一次發布或預覽（兩者共用報告、進度、複製引擎與逐檔記錄檔）
+        self.run_lock = threading.Lock()
+        
+        # 內容雜湊快取（使用雜湊比對時才載入）
+        self.hash_cache = None
+        self.delta_cache = None
+        self.publish_journal = None
+        self.operation_run_file = None
+        self.file_copier = FileCopier()
+        
+        # 正在寫入發布歷史的逐檔記錄檔（背景保存歷史時，下一次發布不會刪除）
+        self.run_files_lock = threading.Lock()
+        self.saving_run_files = set()
+        
+        # 發布歷史（第一次使用時才建立資料庫）
+        self.history = HistoryStore(HISTORY_DB_FILE, LEGACY_HISTORY_FILE)
+        
+        # 網路共享連線：跨發布與連線測試沿用，閒置超過保留時間才中斷
+        self.share_sessions = share_sessions if share_sessions is not None else NetUseSessionManager()
+        
+        # 頻寬限制：所有伺服器共用的總限速器與各伺服器的限速器（以伺服器識別名稱為鍵）
+        self.global_bucket = TokenBucket()
+        self.server_buckets = {}
+        
+        # 發布進度（檔案數、位元組數、速率與預估剩餘時間）
+        self.progress = PublishProgress()
+        
+        # 初始化發布報告變數
+        self.publish_report = {
+            'servers': {},
+            'start_time': None,
+            'end_time': None,
+            'total_stats': {
+                'new_files': 0,
+                'updated_files': 0,
+                'skipped_files': 0,
+                'deleted_files': 0
+            }
+        }
+    
+    def setup_logging(self):
+        """設置LOG記錄
+        
+        發布執行緒只把記錄放入佇列（QueueHandler），由背景執行緒（QueueListener）寫入日誌檔案與主控台，
+        複製速度不受磁碟或主控台寫入影響。同一程序內只設定一次，多個引擎共用。
+        """
+        global _log_listener, _log_file_handler
+        with _log_setup_lock:
+            if _log_listener is None:
+                # 創建logs目錄
+                if not os.path.exists(LOG_DIR):
+                    os.makedirs(LOG_DIR)
+                
+                # 設置日誌格式
+                formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+                _log_file_handler = DailyLogFileHandler(LOG_DIR)
+                stream_handler = logging.StreamHandler()
+                _log_file_handler.setFormatter(formatter)
+                stream_handler.setFormatter(formatter)
+                
+                log_queue = queue.Queue()
+                _log_listener = logging.handlers.QueueListener(log_queue, _log_file_handler, stream_handler)
+                _log_listener.start()
+                # 程式結束前寫完佇列中剩餘的記錄
+                atexit.register(_log_listener.stop)
+                
+                # 配置日誌（QueueHandler 只合併訊息參數，時間與等級由背景執行緒的處理器格式化）
+                queue_handler = logging.handlers.QueueHandler(log_queue)
+                queue_handler.setFormatter(logging.Formatter('%(message)s'))
+                logging.basicConfig(level=logging.INFO, handlers=[queue_handler])
+        
+        self.log_file_handler = _log_file_handler
+        self.logger = logging.getLogger(__name__)
+        
+        self.logger.info("網站發布助手啟動")
+
+    def _build_source_manifest(self):
+        """掃描所有發行來源一次，建立本次發布共用的來源清單
+        
+        每個來源對應一個專案，entries 依走訪順序記錄（父目錄一定排在其內容之前），
+        所有伺服器的計數、比對與複製都使用此清單，不再重複讀取本地檔案資訊。
+        """
+        source_manifest = []
+        
+        for source in self.config['source_files']:
+            if os.path.isfile(source):
+                stat = os.stat(source)
+                source_manifest.append({
+                    'source': source,
+                    'project_name': os.path.splitext(os.path.basename(source))[0],
+                    'is_file': True,
+                    'entries': [SourceEntry(os.path.basename(source), stat.st_size, stat.st_mtime, stat.st_mtime_ns, False)],
+                    'excluded': []
+                })
+            elif os.path.isdir(source):
+                project_manifest = {
+                    'source': source,
+                    'project_name': os.path.basename(source),
+                    'is_file': False,
+                    'entries': [],
+                    'excluded': []
+                }
+                self._scan_source_directory(source, "", project_manifest)
+                source_manifest.append(project_manifest)
+        
+        return source_manifest
+    
+    def _scan_source_directory(self, directory, relative_path, project_manifest):
+        """使用 os.scandir 遞迴掃描來源目錄，將結果加入專案清單"""
+        with os.scandir(directory) as scanner:
+            dir_entries = sorted(scanner, key=lambda entry: entry.name)
+        
+        for entry in dir_entries:
+            item_relative_path = os.path.join(relative_path, entry.name) if relative_path else entry.name
+            
+            # 需要刪除的檔案或資料夾不複製，也不再往下掃描
+            if entry.name in self.config['delete_files']:
+                project_manifest['excluded'].append(item_relative_path)
+                continue
+            
+            if entry.is_dir():
+                project_manifest['entries'].append(SourceEntry(item_relative_path, 0, 0, 0, True))
+                self._scan_source_directory(entry.path, item_relative_path, project_manifest)
+            elif entry.is_file():
+                stat = entry.stat()
+                project_manifest['entries'].append(SourceEntry(item_relative_path, stat.st_size, stat.st_mtime, stat.st_mtime_ns, False))
+    
+    def _count_source_totals(self, source_manifest):
+        """計算單一伺服器需處理的檔案數與位元組數（每個伺服器都要複製一遍）"""
+        total_files = 0
+        total_bytes = 0
+        
+        for project_manifest in source_manifest:
+            for entry in project_manifest['entries']:
+                if not entry.is_dir:
+                    total_files += 1
+                    total_bytes += entry.size
+        
+        return total_files, total_bytes
+
+    def add_listener(self, listener):
+        """註冊發布事件接收者"""
+        self.listeners.append(listener)
+    
+    def remove_listener(self, listener):
+        """移除發布事件接收者"""
+        if listener in self.listeners:
+            self.listeners.remove(listener)
+    
+    def _emit(self, event, *args):
+        """通知所有接收者；接收者的錯誤只記錄，不中斷發布"""
+        for listener in list(self.listeners):
+            try:
+                getattr(listener, event)(*args)
+            except Exception as e:
+                self.logger.warning(f"發布事件 {event} 處理失敗: {str(e)}")
+    
+    @property
+    def is_running(self):
+        """是否有發布或預覽正在執行"""
+        return self.run_lock.locked()
+    
+    def plan(self):
+        """預覽發布計畫：以與發布相同的比對邏輯檢查所有伺服器，不寫入任何遠端檔案"""
+        return self.execute(dry_run=True)
+    
+    def execute(self, dry_run=False):
+        """執行發布並回傳 PublishResult；dry_run 為 True 時只比對並記錄預計的檔案操作，不寫入任何遠端檔案
+        
+        本方法會阻塞到發布結束，GUI 在背景執行緒呼叫，命令列模式直接呼叫。
+        已有發布或預覽正在執行時拋出 RuntimeError，不影響執行中的發布。
+        """
+        if not self.run_lock.acquire(blocking=False):
+            raise RuntimeError("已有發布或預覽正在執行，請等待完成後再試")
+        try:
+            result = self._execute(dry_run)
+        finally:
+            self.run_lock.release()
+        
+        # 釋放後才通知結果，接收者收到時已可開始下一次發布
+        self._emit('on_finished', result)
+        return result
+    
+    def _execute(self, dry_run):
+        """execute 的實際流程（在 run_lock 內執行），回傳 PublishResult"""
+        start_time = datetime.now()
+        error_msg = None
+        # 上一次發布的報告可能還沒寫入歷史，其記錄檔不可刪除
+        previous_run_file = self.publish_report.get('operations_file')
+        
+        # 初始化發布報告
+        self.publish_report = {
+            'servers': {},
+            'start_time': start_time,
+            'end_time': None,
+            'dry_run': dry_run,
+            'bytes_saved': 0,
+            'bytes_transferred': 0,
+            'retried_files': 0,
+            'total_stats': {
+                'new_files': 0,
+                'updated_files': 0,
+                'skipped_files': 0,
+                'deleted_files': 0
+            }
+        }
+        
+        # 串流模式：逐檔操作直接寫入本次發布的記錄檔（預覽的計畫不寫入歷史，一律保存在記憶體）
+        if not dry_run and self.config['publish_options'].get('stream_file_operations'):
+            # 檔名加上隨機碼，同一秒開始的兩次發布不會共用記錄檔
+            self.operation_run_file = FileOperationRunFile(os.path.join(
+                RUN_OPERATIONS_DIR, f"{start_time.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}.jsonl"))
+            self.publish_report['operations_file'] = self.operation_run_file.path
+        
+        if dry_run:
+            self.logger.info("=== 開始預覽發布計畫（不寫入任何檔案）===")
+        else:
+            self.logger.info("=== 開始發布作業 ===")
+        self.logger.info(f"發布時間: {start_time.strftime('%Y-%m-%d %H:%M:%S')}")
+        self.logger.info(f"源文件數量: {len(self.config['source_files'])}")
+        self.logger.info(f"目標伺服器數量: {len(self.config['servers'])}")
+        
+        try:
+            if self.operation_run_file is not None:
+                self._remove_stale_run_files(previous_run_file)
+                self.operation_run_file.open()
+            
+            # 掃描發行來源一次，所有伺服器共用
+            scan_start = time.time()
+            source_manifest = self._build_source_manifest()
+            self.logger.info(f"來源掃描完成，耗時 {time.time() - scan_start:.2f} 秒")
+            
+            # 使用內容雜湊比對時載入雜湊快取
+            if self.config['publish_options'].get('compare_mode') == 'hash' and self.hash_cache is None:
+                self.hash_cache = HashCache(HASH_CACHE_FILE)
+            
+            # 依設定建立本次發布使用的複製引擎與限速器
+            self.file_copier = self._create_file_copier()
+            self.server_buckets = {}
+            self._apply_bandwidth_limits()
+            
+            # 使用差異傳輸時載入區塊簽章快取
+            if self.config['publish_options'].get('delta_transfer') and self.delta_cache is None:
+                self.delta_cache = BlockSignatureCache(DELTA_SIGNATURE_CACHE_FILE)
+            
+            # 檢查點日誌：記錄已完成的檔案，失敗或中斷後重新發布時只處理剩餘的檔案
+            if not dry_run and self.config['publish_options'].get('resume_interrupted'):
+                self.publish_journal = PublishJournal(JOURNAL_FILE, self._get_journal_fingerprint())
+                resumed_files = self.publish_journal.open(resume=True)
+                if resumed_files:
+                    self.logger.info(f"發現未完成的發布，續傳模式：已完成的 {resumed_files} 個檔案將直接跳過")
+            
+            # 計算總檔案數與位元組數並初始化進度
+            files_per_server, bytes_per_server = self._count_source_totals(source_manifest)
+            server_count = len(self.config['servers'])
+            self.logger.info(f"預計處理檔案總數: {files_per_server * server_count}，"
+                             f"共 {format_file_size(bytes_per_server * server_count)}")
+            self.progress.reset([self._get_server_key(server) for server in self.config['servers']],
+                                files_per_server, bytes_per_server)
+            self._emit('on_progress_start', self.progress)
+            
+            servers = self.config['servers']
+            max_parallel = int(self.config['publish_options'].get('max_parallel_servers', 1))
+            max_parallel = max(1, min(max_parallel, len(servers)))
+            
+            if max_parallel > 1:
+                # 並行發布：每台伺服器獨立執行，失敗互不影響
+                self.logger.info(f"並行發布模式，同時處理 {max_parallel} 台伺服器")
+                failed_servers = self._publish_servers_concurrently(servers, source_manifest, max_parallel)
+                success_count = len(servers) - len(failed_servers)
+                if failed_servers:
+                    raise Exception(f"{len(failed_servers)}/{len(servers)} 台伺服器發布失敗: " + "; ".join(failed_servers))
+            else:
+                # 依序發布：任一伺服器失敗即中止
+                success_count = 0
+                for i, server in enumerate(servers, 1):
+                    self._emit('on_status', f"正在發布到 {server['ip']} ({i}/{len(servers)})...")
+                    self._publish_server_task(server, source_manifest, i, len(servers))
+                    success_count += 1
+            
+            end_time = datetime.now()
+            total_duration = (end_time - start_time).total_seconds()
+            
+            # 更新報告結束時間
+            self.publish_report['end_time'] = end_time
+            
+            # 全部成功，不再需要續傳
+            if self.publish_journal is not None:
+                self.publish_journal.discard()
+            
+            if dry_run:
+                self._emit('on_status', "發布計畫已建立")
+                self.logger.info(f"=== 發布計畫預覽完成，耗時 {total_duration:.2f} 秒 ===")
+            else:
+                self._emit('on_status', "發布完成")
+                self.logger.info(f"=== 發布作業完成 ===")
+                self.logger.info(f"成功發布到 {success_count}/{len(servers)} 個伺服器")
+                self.logger.info(f"總耗時: {total_duration:.2f} 秒")
+            
+        except Exception as e:
+            error_msg = str(e)
+            end_time = datetime.now()
+            total_duration = (end_time - start_time).total_seconds()
+            self.publish_report['end_time'] = end_time
+            
+            if dry_run:
+                self._emit('on_status', f"建立發布計畫失敗: {error_msg}")
+                self.logger.error(f"=== 發布計畫預覽失敗: {error_msg} ===")
+            else:
+                self._emit('on_status', f"發布失敗: {error_msg}")
+                self.logger.error(f"=== 發布作業失敗 ===")
+                self.logger.error(f"錯誤訊息: {error_msg}")
+                self.logger.error(f"失敗時間: {end_time.strftime('%Y-%m-%d %H:%M:%S')}")
+                self.logger.error(f"已執行時間: {total_duration:.2f} 秒")
+            
+        finally:
+            # 失敗時保留檢查點日誌供下次續傳
+            if self.publish_journal is not None:
+                self.publish_journal.close()
+                self.publish_journal = None
+            
+            # 記錄檔寫完後關閉，之後由報告與歷史檢視逐行讀取
+            if self.operation_run_file is not None:
+                self.operation_run_file.close()
+                self.operation_run_file = None
+            
+            # 保存本次計算的內容雜湊，下次發布時未變動的檔案不必重新計算
+            if self.hash_cache is not None:
+                try:
+                    self.hash_cache.save()
+                except Exception as e:
+                    self.logger.warning(f"保存雜湊快取失敗: {str(e)}")
+            if self.delta_cache is not None:
+                try:
+                    self.delta_cache.save()
+                except Exception as e:
+                    self.logger.warning(f"保存區塊簽章快取失敗: {str(e)}")
+        
+        # 預覽成功時整理為發布計畫，並依歷史傳輸速率估算耗時
+        result = PublishResult(self.publish_report, error_msg)
+        if dry_run and result.success:
+            result.plan = self._build_publish_plan(self.publish_report)
+        return result
+    
+    def _remove_stale_run_files(self, previous_run_file=None):
+        """刪除殘留的逐檔操作記錄檔（寫入歷史後刪除失敗、或發布中斷未寫入歷史的檔案）
+        
+        上一次發布的記錄檔與正在寫入歷史的記錄檔保留，由 save_history_record 寫入後刪除。
+        """
+        with self.run_files_lock:
+            keep = set(self.saving_run_files)
+        if previous_run_file:
+            keep.add(previous_run_file)
+        keep = {os.path.normcase(os.path.abspath(path)) for path in keep}
+        for path in glob.glob(os.path.join(RUN_OPERATIONS_DIR, '*.jsonl')):
+            if os.path.normcase(os.path.abspath(path)) in keep:
+                continue
+            try:
+                os.remove(path)
+            except OSError as e:
+                self.logger.warning(f"刪除逐檔操作記錄檔失敗: {path} - {str(e)}")
+    
+    def _create_file_copier(self):
+        """依進階設定建立複製引擎"""
+        publish_options = self.config['publish_options']
+        return FileCopier(chunk_size=int(publish_options.get('copy_chunk_kb', COPY_CHUNK_SIZE // 1024)) * 1024,
+                          preallocate=publish_options.get('copy_preallocate', True),
+                          use_offload=publish_options.get('copy_offload', True))
+    
+    def apply_runtime_options(self):
+        """將目前設定中可即時生效的選項（頻寬限制、網路連線保留時間、日誌檔案大小上限）套用到引擎
+        
+        發布進行中修改設定後呼叫，限速立即生效。
+        """
+        self._apply_bandwidth_limits()
+        self._apply_share_session_idle()
+        self._apply_log_options()
+    
+    def _apply_bandwidth_limits(self):
+        """將目前的頻寬設定套用到限速器（發布進行中修改設定時立即生效）"""
+        self.global_bucket.set_rate(self._mbps_to_bytes(self.config['publish_options'].get('global_bandwidth_limit_mbps', 0)))
+        for server in self.config['servers']:
+            bucket = self.server_buckets.get(self._get_server_key(server))
+            if bucket is not None:
+                bucket.set_rate(self._mbps_to_bytes(server.get('bandwidth_limit_mbps', 0)))
+    
+    def _apply_log_options(self):
+        """套用日誌檔案大小上限設定"""
+        if self.log_file_handler is not None:
+            self.log_file_handler.max_bytes = int(float(self.config['publish_options'].get('log_max_size_mb', 0)) * 1024 * 1024)
+    
+    def flush_logs(self):
+        """等待佇列中的日誌都寫入檔案（讀取日誌檔案前呼叫）"""
+        if _log_listener is not None and self.log_file_handler is not None:
+            _log_listener.queue.join()
+    
+    def _apply_share_session_idle(self):
+        """套用網路連線保留時間設定"""
+        self.share_sessions.idle_seconds = float(self.config['publish_options'].get('share_session_idle_minutes', 0)) * 60
+    
+    def _mbps_to_bytes(self, mbps):
+        """Mbps 轉換為 bytes/秒"""
+        return float(mbps or 0) * 1000 * 1000 / 8
+    
+    def _create_throttle(self, server):
+        """建立伺服器的限速函式，同時受該伺服器與全域頻寬限制"""
+        server_key = self._get_server_key(server)
+        with self.report_lock:
+            bucket = self.server_buckets.get(server_key)
+            if bucket is None:
+                bucket = TokenBucket(self._mbps_to_bytes(server.get('bandwidth_limit_mbps', 0)))
+                self.server_buckets[server_key] = bucket
+        
+        def throttle(amount):
+            bucket.consume(amount)
+            self.global_bucket.consume(amount)
+        return throttle
+    
+    def _get_journal_fingerprint(self):
+        """以發行來源、目標伺服器與排除檔案產生設定指紋，設定不同時不續傳舊日誌"""
+        fingerprint_source = {
+            'source_files': self.config['source_files'],
+            'servers': [self._get_server_key(server) for server in self.config['servers']],
+            'delete_files': self.config.get('delete_files', [])
+        }
+        return hashlib.sha256(json.dumps(fingerprint_source, sort_keys=True).encode('utf-8')).hexdigest()
+    
+    def _publish_servers_concurrently(self, servers, source_manifest, max_parallel):
+        """並行發布到多台伺服器，回傳失敗的伺服器清單"""
+        failed_servers = []
+        completed = 0
+        
+        with ThreadPoolExecutor(max_workers=max_parallel, thread_name_prefix='publish') as executor:
+            futures = {
+                executor.submit(self._publish_server_task, server, source_manifest, i, len(servers)): server
+                for i, server in enumerate(servers, 1)
+            }
+            self._emit('on_status', f"正在並行發布到 {len(servers)} 台伺服器...")
+            
+            for future in as_completed(futures):
+                server = futures[future]
+                completed += 1
+                try:
+                    future.result()
+                except Exception as e:
+                    failed_servers.append(f"{server['ip']} ({e})")
+                self._emit('on_status', f"正在並行發布... 已完成 {completed}/{len(servers)} 台伺服器")
+        
+        return failed_servers
+    
+    def _publish_server_task(self, server, source_manifest, index, total):
+        """發布到單一伺服器並記錄該伺服器的狀態與耗時"""
+        self.logger.info(f"開始發布到伺服器 {index}/{total}: {server['ip']}")
+        
+        server_start = datetime.now()
+        try:
+            self._publish_to_server(server, source_manifest)
+        except Exception as e:
+            server_report = self.publish_report['servers'].get(self._get_server_key(server))
+            if server_report is not None:
+                server_report['status'] = '失敗'
+                server_report['error'] = str(e)
+                server_report['duration'] = (datetime.now() - server_start).total_seconds()
+                self._emit('on_server_finished', self._get_server_key(server), server_report)
+            raise
+        
+        server_duration = (datetime.now() - server_start).total_seconds()
+        server_report = self.publish_report['servers'][self._get_server_key(server)]
+        server_report['status'] = '成功'
+        server_report['duration'] = server_duration
+        
+        # 實際達到的平均傳輸速率（含比對與連線時間）
+        if server_duration > 0:
+            server_report['throughput'] = server_report['bytes_transferred'] / server_duration
+            if server_report['bytes_transferred']:
+                self.logger.info(f"伺服器 {server['ip']} 傳輸 {format_file_size(server_report['bytes_transferred'])}，"
+                                 f"平均 {format_file_size(server_report['throughput'])}/s")
+        
+        self.logger.info(f"伺服器 {server['ip']} 發布完成，耗時 {server_duration:.2f} 秒")
+        self._emit('on_server_finished', self._get_server_key(server), server_report)
+    
+    def _get_server_key(self, server):
+        """取得伺服器在發布報告中的識別名稱"""
+        return f"{server['ip']} ({server['path']})"
+
+    def _build_publish_plan(self, report):
+        """將預覽執行的報告整理為發布計畫，並依歷史傳輸速率估算耗時"""
+        try:
+            server_transfers = self.history.recent_server_transfers(PLAN_HISTORY_RECORDS)
+        except Exception as e:
+            self.logger.warning(f"讀取歷史傳輸速率失敗: {str(e)}")
+            server_transfers = []
+        
+        plan = {
+            'generated_at': report['start_time'].isoformat(),
+            'compare_mode': self.config['publish_options'].get('compare_mode', 'mtime'),
+            'servers': [],
+            'total_stats': report['total_stats'].copy(),
+            'bytes_to_transfer': report['bytes_transferred'],
+            'estimated_seconds': None
+        }
+        
+        server_estimates = []
+        for server_key, server_data in report['servers'].items():
+            throughput = self._estimate_throughput(server_transfers, server_key)
+            bytes_to_transfer = server_data['bytes_transferred']
+            estimated_seconds = bytes_to_transfer / throughput if throughput else None
+            if estimated_seconds is not None:
+                server_estimates.append(estimated_seconds)
+            
+            plan['servers'].append({
+                'server': server_key,
+                'status': server_data.get('status'),
+                'error': server_data.get('error'),
+                'stats': server_data['stats'].copy(),
+                'bytes_to_transfer': bytes_to_transfer,
+                'throughput_bytes_per_second': throughput,
+                'estimated_seconds': estimated_seconds,
+                'projects': [
+                    {
+                        'project': project_name,
+                        'stats': project_data['stats'].copy(),
+                        'bytes_to_transfer': project_data['bytes_transferred'],
+                        'files': [
+                            {'path': f['path'], 'operation': f['operation'], 'bytes': f.get('bytes_transferred', 0)}
+                            for f in project_data['files'].records(('new', 'updated'))
+                        ]
+                    }
+                    for project_name, project_data in server_data['projects'].items()
+                ]
+            })
+        
+        # 所有伺服器都有估算值時才估算總耗時；並行發布時以最慢的伺服器與平均分攤取較大值
+        if report['servers'] and len(server_estimates) == len(report['servers']):
+            max_parallel = max(1, int(self.config['publish_options'].get('max_parallel_servers', 1)))
+            max_parallel = min(max_parallel, len(server_estimates))
+            plan['estimated_seconds'] = max(max(server_estimates), sum(server_estimates) / max_parallel)
+        
+        return plan
+    
+    def _estimate_throughput(self, server_transfers, server_key):
+        """依近期成功發布各伺服器的 (識別名稱, 傳輸位元組數, 耗時秒數) 估算傳輸速率（bytes/秒）
+        
+        優先使用同一台伺服器的記錄，沒有時使用所有伺服器的平均，完全沒有資料時回傳 None。
+        """
+        server_bytes = server_seconds = 0
+        all_bytes = all_seconds = 0
+        
+        for key, transferred, duration in server_transfers:
+            if not transferred or not duration:
+                continue
+            all_bytes += transferred
+            all_seconds += duration
+            if key == server_key:
+                server_bytes += transferred
+                server_seconds += duration
+        
+        if server_bytes:
+            return server_bytes / server_seconds
+        if all_bytes:
+            return all_bytes / all_seconds
+        return None
+    
+    def save_history_record(self, report, is_success=True):
+        """保存發布記錄到歷史，回傳記錄的 run_id（失敗時回傳 None）
+        
+        串流模式的逐檔記錄檔寫入資料庫後刪除，報告中的檔案清單改由資料庫讀取。
+        """
+        run_file = report.get('operations_file')
+        if run_file:
+            with self.run_files_lock:
+                self.saving_run_files.add(run_file)
+        try:
+            run_id = self.history.add_run(report, '成功' if is_success else '失敗')
+            self.logger.info(f"發布記錄已保存到歷史 ID: {report['start_time'].strftime('%Y%m%d_%H%M%S')}（#{run_id}）")
+            if run_file:
+                self._release_run_file(report, run_id, run_file)
+            return run_id
+            
+        except Exception as e:
+            self.logger.error(f"保存歷史記錄失敗: {str(e)}")
+            return None
+        finally:
+            if run_file:
+                with self.run_files_lock:
+                    self.saving_run_files.discard(run_file)
+    
+    def _release_run_file(self, report, run_id, run_file):
+        """記錄檔已寫入歷史：報告的檔案清單改由資料庫讀取，再刪除記錄檔（失敗時留待下次發布清理）
+        
+        報告正在讀取記錄檔時（GUI 顯示發布報告）延後到讀取結束才刪除。
+        """
+        record = self.history.get_run(run_id)
+        streams = [(server_key, project_name, project_data['files'])
+                   for server_key, server_data in report['servers'].items()
+                   for project_name, project_data in server_data['projects'].items()
+                   if isinstance(project_data['files'], FileOperationStream)]
+        if not streams:
+            return
+        
+        def use_history():
+            for server_key, project_name, files in streams:
+                files.history = record['servers'][server_key]['projects'][project_name]['files']
+        
+        try:
+            streams[0][2].run_file.release(use_history)
+        except OSError as e:
+            self.logger.warning(f"刪除逐檔操作記錄檔失敗: {run_file} - {str(e)}")
+    
+    def load_history_records(self, limit=HISTORY_PAGE_SIZE, offset=0, status=None):
+        """依發布時間由新到舊載入一頁歷史摘要（不含伺服器與檔案資料）"""
+        try:
+            return self.history.list_runs(limit, offset, status)
+        except Exception as e:
+            self.logger.error(f"載入歷史記錄失敗: {str(e)}")
+            return []
+    
+    def count_history_records(self, status=None):
+        """歷史記錄總筆數"""
+        try:
+            return self.history.count_runs(status)
+        except Exception as e:
+            self.logger.error(f"載入歷史記錄失敗: {str(e)}")
+            return 0
+    
+    def load_history_summary(self, run_id):
+        """載入單筆歷史摘要（與 load_history_records 的項目相同），找不到時回傳 None"""
+        return self.history.get_run_summary(run_id)
+    
+    def load_history_record(self, run_id):
+        """載入單筆歷史記錄的完整資料，找不到時回傳 None"""
+        return self.history.get_run(run_id)
+    
+    def search_file_history(self, query, include_skipped=False, limit=HISTORY_SEARCH_LIMIT):
+        """查詢檔案路徑的部署記錄（哪次發布、哪台伺服器、何種操作），依發布時間由新到舊"""
+        return self.history.search_file_ops(query, include_skipped, limit)
+    
+    def delete_history_records(self, run_ids):
+        """刪除指定的歷史記錄（含各伺服器、專案與逐檔操作）"""
+        self.history.delete_runs(run_ids)
+    
+    def clear_history(self):
+        """清除所有歷史記錄"""
+        self.history.clear()
+    
+    def history_detail_text(self, record):
+        """生成歷史記錄詳細文字"""
+        lines = []
+        
+        # 基本資訊
+        start_time = datetime.fromisoformat(record['start_time']).strftime('%Y-%m-%d %H:%M:%S')
+        end_time = datetime.fromisoformat(record['end_time']).strftime('%Y-%m-%d %H:%M:%S') if record['end_time'] else '未知'
+        
+        lines.append(f"📋 發布資訊")
+        lines.append(f"   記錄ID: {record['id']}")
+        lines.append(f"   開始時間: {start_time}")
+        lines.append(f"   結束時間: {end_time}")
+        lines.append(f"   總耗時: {record['duration']:.2f} 秒")
+        lines.append(f"   狀態: {record['status']}")
+        lines.append("")
+        
+        # 總體統計
+        stats = record['total_stats']
+        lines.append(f"📊 總體統計")
+        lines.append(f"   新增檔案: {stats['new_files']} 個")
+        lines.append(f"   覆蓋檔案: {stats['updated_files']} 個")
+        lines.append(f"   跳過檔案: {stats['skipped_files']} 個")
+        lines.append(f"   刪除檔案: {stats['deleted_files']} 個")
+        if record.get('bytes_saved'):
+            lines.append(f"   差異傳輸節省: {format_file_size(record['bytes_saved'])}")
+        if record.get('retried_files'):
+            lines.append(f"   重試後成功: {record['retried_files']} 個檔案")
+        lines.append("")
+        
+        # 各伺服器詳情
+        lines.append(f"🖥️ 伺服器詳情")
+        for server_key, server_data in record['servers'].items():
+            lines.append(f"   ── {server_key} ──")
+            if server_data.get('status'):
+                status_line = f"   狀態: {server_data['status']}"
+                if server_data.get('duration') is not None:
+                    status_line += f"，耗時 {server_data['duration']:.2f} 秒"
+                if server_data.get('switch_duration') is not None:
+                    status_line += f"（檔案切換 {server_data['switch_duration']:.2f} 秒）"
+                lines.append(status_line)
+            if server_data.get('error'):
+                lines.append(f"   錯誤: {server_data['error']}")
+            server_stats = server_data['stats']
+            lines.append(f"   統計: 新增 {server_stats['new_files']}, 覆蓋 {server_stats['updated_files']}, 跳過 {server_stats['skipped_files']}, 刪除 {server_stats['deleted_files']}")
+            if server_data.get('bytes_transferred'):
+                transfer_line = f"   傳輸量: {format_file_size(server_data['bytes_transferred'])}"
+                if server_data.get('throughput'):
+                    transfer_line += f"，平均速率 {format_file_size(server_data['throughput'])}/s"
+                if server_data.get('transfer_seconds'):
+                    transfer_line += f"（平均每檔速率 {format_file_size(server_data['bytes_transferred'] / server_data['transfer_seconds'])}/s）"
+                lines.append(transfer_line)
+            if server_data.get('bytes_saved'):
+                lines.append(f"   差異傳輸節省: {format_file_size(server_data['bytes_saved'])}")
+            if server_data.get('retried_files'):
+                lines.append(f"   重試後成功: {server_data['retried_files']} 個檔案")
+            
+            for project_name, project_data in server_data['projects'].items():
+                lines.append(f"   📁 {project_name}")
+                project_stats = project_data['stats']
+                lines.append(f"      統計: 新增 {project_stats['new_files']}, 覆蓋 {project_stats['updated_files']}, 跳過 {project_stats['skipped_files']}, 刪除 {project_stats['deleted_files']}")
+                
+                # 過濾並顯示有實際操作的檔案 (排除跳過的檔案)；只讀取前10筆，其餘只計數
+                files = project_data['files']
+                actual_operations = list(files.records(('new', 'updated', 'deleted'), limit=10))
+                actual_count = project_stats['new_files'] + project_stats['updated_files'] + project_stats['deleted_files']
+                retried = list(files.records(retried_only=True, limit=10))
+                retried_count = files.count(retried_only=True) if len(retried) == 10 else len(retried)
+                
+                if actual_operations:
+                    lines.append(f"      檔案操作 (顯示前10個實際操作):")
+                    for file_info in actual_operations:
+                        operation_name = {
+                            'new': '新增',
+                            'updated': '覆蓋',
+                            'deleted': '刪除'
+                        }.get(file_info['operation'], '未知')
+                        lines.append(f"        [{file_info['timestamp']}] {operation_name}: {file_info['path']}")
+                    
+                    if actual_count > 10:
+                        lines.append(f"        ... 還有 {actual_count - 10} 個實際操作")
+                
+                # 列出重試過的檔案，方便找出連線不穩定的伺服器
+                if retried:
+                    lines.append(f"      重試過的檔案:")
+                    for file_info in retried:
+                        lines.append(f"        [{file_info['timestamp']}] {file_info['path']}（嘗試 {file_info['attempts']} 次）")
+                    if retried_count > 10:
+                        lines.append(f"        ... 還有 {retried_count - 10} 個重試過的檔案")
+                lines.append("")
+        
+        return '\n'.join(lines)
+
+    def send_email(self, recipients, subject, content):
+        """發送電子郵件"""
+        if not self.config['smtp_config']['smtp_server'] or not recipients:
+            return
+        
+        try:
+            smtp_config = self.config['smtp_config']
+            
+            # 創建郵件
+            msg = MIMEMultipart()
+            # 如果沒有配置用戶名，使用預設的 VSCC 發件人地址
+            from_email = smtp_config['username'] if smtp_config['username'].strip() else 'noreply@vscc.org.tw'
+            msg['From'] = from_email
+            msg['To'] = ', '.join(recipients)
+            msg['Subject'] = Header(subject, 'utf-8')
+            
+            # 添加郵件內容
+            msg.attach(MIMEText(content, 'plain', 'utf-8'))
+            
+            # 發送郵件
+            server = smtplib.SMTP(smtp_config['smtp_server'], smtp_config['smtp_port'])
+            if smtp_config['use_tls']:
+                # 檢查是否為 IP 地址
+                import re
+                is_ip = re.match(r'^\d+\.\d+\.\d+\.\d+$', smtp_config['smtp_server'])
+                if is_ip:
+                    # 對於 IP 地址，跳過主機名驗證
+                    import ssl
+                    context = ssl.create_default_context()
+                    context.check_hostname = False
+                    context.verify_mode = ssl.CERT_NONE
+                    server.starttls(context=context)
+                else:
+                    server.starttls()
+            
+            # 只有在提供用戶名時才進行身份驗證
+            if smtp_config['username'].strip():
+                server.login(smtp_config['username'], smtp_config['password'])
+            server.send_message(msg)
+            server.quit()
+            
+            self.logger.info(f"郵件發送成功，收件者: {', '.join(recipients)}")
+            
+        except Exception as e:
+            self.logger.error(f"郵件發送失敗: {str(e)}")
+    
+    def send_deployment_notification(self, is_success, start_time, end_time, error_msg=None, force=False):
+        """發送部署結果通知郵件；force 為 True 時非定時發布也發送（命令列 --notify）"""
+        if not self.config['notification_emails'] or not self.config['smtp_config']['smtp_server']:
+            return
+        
+        # 只對定時發布發送郵件通知
+        if not force and not self.config.get('schedule_time'):
+            return
+        
+        try:
+            date_str = datetime.now().strftime('%Y-%m-%d')
+            status = "成功" if is_success else "失敗"
+            subject = f"網站發布通知 - {date_str} - {status}"
+            
+            # 讀取日誌檔案內容（先等背景執行緒寫完本次發布的日誌）
+            log_content = ""
+            try:
+                self.flush_logs()
+                log_file = os.path.join(LOG_DIR, f'publish_{datetime.now().strftime("%Y%m%d")}.log')
+                if os.path.exists(log_file):
+                    with open(log_file, 'r', encoding='utf-8') as f:
+                        lines = f.readlines()
+                        # 獲取最近的發布日誌（從開始時間之後的日誌）
+                        relevant_lines = []
+                        for line in lines:
+                            if start_time.strftime('%Y-%m-%d %H:%M') in line:
+                                relevant_lines = lines[lines.index(line):]
+                                break
+                        log_content = ''.join(relevant_lines[-50:])  # 最後50行
+            except Exception as e:
+                log_content = f"無法讀取日誌檔案: {str(e)}"
+            
+            duration = (end_time - start_time).total_seconds()
+            
+            content = f"""網站發布助手自動部署通知
+
+部署狀態: {status}
+部署日期: {date_str}
+開始時間: {start_time.strftime('%Y-%m-%d %H:%M:%S')}
+結束時間: {end_time.strftime('%Y-%m-%d %H:%M:%S')}
+執行時間: {duration:.2f} 秒
+目標伺服器數量: {len(self.config['servers'])}
+
+"""
+            
+            if error_msg:
+                content += f"錯誤訊息: {error_msg}\n\n"
+            
+            content += f"""伺服器列表:
+"""
+            for i, server in enumerate(self.config['servers'], 1):
+                content += f"{i}. {server['ip']} - {server['path']}\n"
+            
+            content += f"""
+
+發布日誌:
+==========================================
+{log_content}
+==========================================
+
+此為系統自動發送的通知郵件。
+網站發布助手 v2.0
+"""
+            
+            # 發送郵件
+            self.send_email(self.config['notification_emails'], subject, content)
+            self.logger.info(f"部署通知郵件已發送給 {len(self.config['notification_emails'])} 位收件者")
+            
+        except Exception as e:
+            self.logger.error(f"發送部署通知郵件失敗: {str(e)}")
+    
+    def send_error_notification(self, error_type, error_msg):
+        """發送程式異常通知郵件"""
+        if not self.config['notification_emails'] or not self.config['smtp_config']['smtp_server']:
+            return
+        
+        try:
+            date_str = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            subject = f"網站發布助手異常通知 - {error_type} - {date_str}"
+            
+            content = f"""網站發布助手程式異常通知
+
+異常類型: {error_type}
+發生時間: {date_str}
+錯誤訊息: {error_msg}
+
+程式狀態: 異常終止
+
+請檢查系統狀態並重新啟動程式。
+
+此為系統自動發送的異常通知郵件。
+網站發布助手 v2.0
+"""
+            
+            # 發送郵件
+            self.send_email(self.config['notification_emails'], subject, content)
+            self.logger.error(f"異常通知郵件已發送: {error_type}")
+            
+        except Exception as e:
+            self.logger.error(f"發送異常通知郵件失敗: {str(e)}")
+            
+    def _publish_to_server(self, server, source_manifest):
+        """合併式發布到伺服器
+        
+        預設使用 Windows 網路共享（連線由 share_sessions 管理），伺服器設定 transport 為 'sftp' 時改用 SFTP；
+        遠端檔案操作都經由 context['transport']，比對與複製流程與傳輸方式無關。
+        """
+        try:
+            # 初始化伺服器報告
+            server_key = self._get_server_key(server)
+            server_report = {
+                'projects': {},
+                'stats': {
+                    'new_files': 0,
+                    'updated_files': 0,
+                    'skipped_files': 0,
+                    'deleted_files': 0
+                },
+                'bytes_saved': 0,
+                'bytes_transferred': 0,
+                'transfer_seconds': 0,
+                'retried_files': 0,
+                'status': '進行中'
+            }
+            with self.report_lock:
+                self.publish_report['servers'][server_key] = server_report
+            
+            # 每台伺服器各自的發布上下文（並行發布時互不干擾）
+            context = {
+                'server_key': server_key,
+                'server_report': server_report,
+                'logger': ServerLogAdapter(self.logger, {'server': server['ip']}),
+                # 需要逐檔記錄日誌的操作類型
+                'file_log_operations': FILE_LOG_OPERATIONS.get(
+                    self.config['publish_options'].get('file_log_detail', 'all'), FILE_LOG_OPERATIONS['all']),
+                # 預覽模式只比對不寫入
+                'dry_run': self.publish_report.get('dry_run', False),
+                'journal': self.publish_journal,
+                'throttle': self._create_throttle(server),
+                # 遠端檔案操作（LocalTransport 或 SftpTransport），連線建立後設定
+                'transport': None,
+                # 部署清單與暫存目錄所在的中繼資料目錄（不在網站目錄內），需要時才設定
+                'meta_root': None,
+                # 分段部署的暫存根目錄與待切換的 (暫存路徑, 正式路徑)
+                'staging_root': None,
+                'staged_dirs': set(),
+                'staged_files': [],
+                'staging_switched': False,
+                # 分段部署時延後到切換完成才寫入的部署清單
+                'pending_manifests': []
+            }
+            logger = context['logger']
+            
+            # 1. 取得連線：SFTP 每台伺服器一條 SSH 連線；網路共享仍在保留期間的連線直接沿用，不必重新驗證
+            try:
+                logger.info(f"正在連線至 {server['ip']}...")
+                transport, full_unc_path, reused = self.share_sessions.open_transport(server, self.file_copier)
+                context['transport'] = transport
+                logger.info("✅ 沿用既有的遠端連線" if reused else "✅ 遠端主機連線成功")
+            except ValueError as e:
+                raise Exception(str(e))
+            except subprocess.CalledProcessError as e:
+                error_message = e.stderr.decode('cp950', errors='ignore') if e.stderr else str(e)
+                logger.error("❌ 錯誤: 建立遠端連線失敗")
+                logger.error("請確認：1.帳號密碼正確 2.防火牆設定 3.遠端主機已啟用系統管理分享(C$, D$)")
+                logger.error(f"詳細錯誤: {error_message.strip()}")
+                raise Exception(f"網路連線失敗: {error_message.strip()}")
+            
+            publish_failed = True
+            try:
+                # 2. 確保遠端目標目錄存在（預覽模式不建立）
+                if not transport.exists(full_unc_path) and not context['dry_run']:
+                    logger.info(f"⚠️ 警告: 遠端目錄 '{full_unc_path}' 不存在，正在嘗試建立...")
+                    transport.makedirs(full_unc_path)
+                
+                publish_options = self.config['publish_options']
+                if publish_options.get('use_remote_manifest') or publish_options.get('staged_deploy'):
+                    context['meta_root'] = self._resolve_meta_root(context, full_unc_path,
+                                                                   self.share_sessions.share_root(server))
+                
+                # 分段部署：變動的檔案先寫入同一分享上的暫存目錄，全部完成後再以更名切換
+                if publish_options.get('staged_deploy') and not context['dry_run']:
+                    context['staging_root'] = transport.join(context['meta_root'], STAGING_DIR_NAME)
+                    # 清除先前中斷時殘留的暫存檔案（續傳時保留已完成的暫存檔案）
+                    if context['journal'] is None or not context['journal'].completed:
+                        self._remove_staging_tree(context)
+                    logger.info(f"分段部署模式，暫存目錄: {context['staging_root']}")
+                
+                # 3. 合併式部署 - 覆蓋衝突檔案，保留其餘檔案
+                for project_manifest in source_manifest:
+                    source = project_manifest['source']
+                    project_name = project_manifest['project_name']
+                    remote_target_dir = transport.join(full_unc_path, project_name)
+                    
+                    # 初始化專案報告
+                    server_report['projects'][project_name] = {
+                        'files': (FileOperationStream(self.operation_run_file, server_key, project_name)
+                                  if self.operation_run_file is not None else FileOperationLog()),
+                        'stats': {
+                            'new_files': 0,
+                            'updated_files': 0,
+                            'skipped_files': 0,
+                            'deleted_files': 0
+                        },
+                        'bytes_saved': 0,
+                        'bytes_transferred': 0,
+                        'transfer_seconds': 0
+                    }
+                    
+                    logger.info(f"正在合併部署 '{source}' 至 '{remote_target_dir}'...")
+                    
+                    try:
+                        # 確保目標專案目錄存在
+                        if not transport.exists(remote_target_dir) and not context['dry_run']:
+                            logger.info(f"  建立目標專案目錄: {remote_target_dir}")
+                            transport.makedirs(remote_target_dir)
+                        
+                        if project_manifest['is_file']:
+                            # 單一檔案處理 - 直接複製覆蓋
+                            self._deploy_single_file(context, project_manifest, remote_target_dir)
+                            
+                        else:
+                            # 目錄處理 - 合併複製，保留不衝突的檔案
+                            logger.info(f"  📁 開始合併目錄內容...")
+                            self._merge_directory_to_target(context, project_manifest, remote_target_dir)
+                        
+                        logger.info(f"  ✅ 專案 '{project_name}' 合併部署成功！")
+                        
+                    except Exception as e:
+                        logger.error(f"  ❌ 合併部署失敗: {e}")
+                        raise  # 重新拋出異常以中止後續操作
+                
+                if context['dry_run']:
+                    logger.info("✅ 發布計畫比對完成（未寫入任何檔案）")
+                    publish_failed = False
+                    return
+                
+                # 所有專案複製完成後才一次切換暫存檔案，縮短新舊版本混合的時間
+                if context['staging_root']:
+                    self._switch_staged_files(context)
+                    context['staging_switched'] = True
+                for pending_manifest in context['pending_manifests']:
+                    self._write_remote_manifest(context, *pending_manifest)
+                
+                logger.info("✅ 所有專案合併式部署成功！")
+                publish_failed = False
+            
+            finally:
+                # 清除暫存目錄（失敗時正式檔案維持舊版本；啟用續傳時保留已完成的暫存檔案）
+                if context['staging_root'] and (context['journal'] is None or context['staging_switched']):
+                    self._remove_staging_tree(context)
+                
+                # 4. 釋放連線：網路共享保留供下次發布或連線測試使用，發布失敗時立即中斷，下次重新連線
+                self.share_sessions.close_transport(server, transport, discard=publish_failed)
+                logger.info("--- 遠端傳輸流程結束 ---")
+                
+        except Exception as e:
+            self.logger.error(f"發布到伺服器失敗: {server['ip']} - {str(e)}")
+            raise
+    
+    def _resolve_meta_root(self, context, target_root, share_root):
+        """取得目標根目錄旁的中繼資料目錄（例如 D:\\websites 對應 D:\\websites.publish）
+        
+        部署清單列出所有檔案的大小與雜湊，暫存目錄含尚未上線的檔案，都不應放在網站提供的目錄內。
+        目標根目錄即為分享根目錄（share_root，例如 D:\\）或無權限建立時，改用目標根目錄下的子目錄並提示設定拒絕存取規則。
+        """
+        transport = context['transport']
+        logger = context['logger']
+        target = target_root.rstrip('/\\')
+        parent = transport.dirname(target)
+        name = target[len(parent):].strip('/\\')
+        if parent and name and parent != target and target != share_root.rstrip('/\\'):
+            meta_root = transport.join(parent, name + PUBLISH_META_SUFFIX)
+            try:
+                if not context['dry_run']:
+                    transport.makedirs(meta_root, exist_ok=True)
+                return meta_root
+            except OSError as e:
+                logger.warning(f"無法建立中繼資料目錄 {meta_root}: {e}")
+        
+        meta_root = transport.join(target_root, PUBLISH_META_SUFFIX)
+        logger.warning(f"部署清單與暫存目錄改放在目標根目錄下的 {meta_root}；"
+                       f"若目標根目錄本身由網站提供，請設定拒絕存取 {PUBLISH_META_SUFFIX} 的規則")
+        return meta_root
+    
+    def _log_file_operation(self, context, operation_type, message, *args):
+        """依 file_log_detail 設定記錄單一檔案的操作；不記錄的操作連訊息都不組合"""
+        if operation_type in context['file_log_operations']:
+            context['logger'].info(message, *args)
+    
+    def _record_file_operation(self, context, project_name, operation_type, relative_path, filename, note=None,
+                               source_entry=None, bytes_saved=0, bytes_transferred=0, transfer_seconds=0, attempts=1):
+        """記錄檔案操作到報告中
+        
+        note 為跳過或刪除的說明鍵（FILE_OPERATION_NOTES），新增與更新則傳入 source_entry 記錄大小與修改時間；
+        bytes_saved 為差異傳輸節省的位元組數，bytes_transferred 為實際（或預計）傳輸量，
+        transfer_seconds 為傳輸耗時，attempts 為含重試在內的嘗試次數。說明文字在顯示時才組合。
+        """
+        key = OPERATION_STAT_KEYS.get(operation_type)
+        size, mtime = (source_entry.size, source_entry.mtime) if source_entry is not None else (0, 0.0)
+        
+        with self.report_lock:
+            # 記錄到專案報告
+            project_report = context['server_report']['projects'][project_name]
+            project_report['files'].append(operation_type, relative_path, filename, note, size, mtime,
+                                           bytes_saved, bytes_transferred, transfer_seconds, attempts)
+            if bytes_saved:
+                project_report['bytes_saved'] += bytes_saved
+                context['server_report']['bytes_saved'] += bytes_saved
+                self.publish_report['bytes_saved'] += bytes_saved
+            if bytes_transferred:
+                project_report['bytes_transferred'] += bytes_transferred
+                context['server_report']['bytes_transferred'] += bytes_transferred
+                self.publish_report['bytes_transferred'] += bytes_transferred
+            if transfer_seconds:
+                project_report['transfer_seconds'] += transfer_seconds
+                context['server_report']['transfer_seconds'] += transfer_seconds
+            if attempts > 1:
+                context['server_report']['retried_files'] += 1
+                self.publish_report['retried_files'] += 1
+            
+            if key is None:
+                return
+                
+            # 更新專案統計
+            project_report['stats'][key] += 1
+            
+            # 更新伺服器統計
+            context['server_report']['stats'][key] += 1
+            
+            # 更新總體統計
+            self.publish_report['total_stats'][key] += 1
+    
+    def _deploy_single_file(self, context, project_manifest, remote_target_dir):
+        """部署單一檔案專案：與目標比對後直接複製覆蓋，並與目錄專案相同地記錄到檢查點日誌"""
+        transport = context['transport']
+        source = project_manifest['source']
+        project_name = project_manifest['project_name']
+        source_entry = project_manifest['entries'][0]
+        filename = source_entry.rel_path
+        target_file = transport.join(remote_target_dir, filename)
+        src_size = source_entry.size
+        
+        # 續傳：上次中斷前已完成的檔案直接跳過，不需再與目標比對
+        if self._resume_completed_file(context, project_name, source_entry, target_file, {}):
+            return
+        
+        # 檢查是否為覆蓋還是新增
+        copy_result = CopyResult(0, 0)
+        attempts = 1
+        remote_info = self._run_with_retry(
+            context, f"列出目錄 {remote_target_dir}",
+            lambda: transport.list_directory(remote_target_dir))[0].get(filename)
+        if remote_info is not None and self._is_same_file(context, source, source_entry, target_file, remote_info):
+            self._log_file_operation(context, 'skipped', "  ⏭️ 跳過相同檔案: %s", filename)
+            self._record_file_operation(context, project_name, 'skipped', "", filename, self._get_skip_note())
+            self.progress.file_done(context['server_key'], src_size)
+            return
+        
+        if remote_info is not None:
+            operation_type = 'updated'
+            self._log_file_operation(context, 'updated', "  🔄 覆蓋檔案: %s", filename)
+        else:
+            operation_type = 'new'
+            self._log_file_operation(context, 'new', "  ➕ 新增檔案: %s", filename)
+        
+        if not context['dry_run']:
+            stage_path = self._get_stage_path(context, project_name, filename)
+            copy_result, attempts = self._run_with_retry(
+                context, f"複製 {filename}",
+                lambda: self._deploy_file(context, source, target_file, source_entry, remote_info, stage_path))
+            self._journal_file_done(context, project_name, source_entry, stage_path is not None)
+        
+        # 記錄檔案操作並更新進度
+        bytes_transferred = src_size - copy_result.bytes_saved
+        self._record_file_operation(context, project_name, operation_type, "", filename,
+                                    source_entry=source_entry, bytes_saved=copy_result.bytes_saved,
+                                    bytes_transferred=bytes_transferred,
+                                    transfer_seconds=copy_result.seconds, attempts=attempts)
+        self.progress.file_done(context['server_key'], src_size)
+    
+    def _merge_directory_to_target(self, context, project_manifest, dst_dir):
+        """合併式複製目錄到目標位置，覆蓋衝突檔案，保留不衝突檔案
+        
+        目前執行緒依來源清單與目標比對（生產者），需要複製的檔案放入有界佇列，
+        由多個複製執行緒同時傳輸，避免高延遲連線在逐檔複製時閒置。
+        """
+        project_name = project_manifest['project_name']
+        copy_workers = max(1, int(self.config['publish_options'].get('copy_workers', 1)))
+        copy_queue = queue.Queue(maxsize=copy_workers * COPY_QUEUE_SIZE_PER_WORKER)
+        copy_errors = []
+        
+        # 部署後各檔案在目標端的狀態，用於寫入部署清單
+        remote_state = {}
+        
+        workers = []
+        for i in range(copy_workers):
+            worker = threading.Thread(
+                target=self._copy_worker,
+                args=(context, project_name, copy_queue, copy_errors, remote_state),
+                name=f"copy-{context['server_key']}-{i + 1}"
+            )
+            worker.daemon = True
+            worker.start()
+            workers.append(worker)
+        
+        try:
+            self._compare_directory_to_target(context, project_manifest, dst_dir, copy_queue, copy_errors, remote_state)
+        finally:
+            # 通知所有複製執行緒結束並等待佇列清空
+            for _ in workers:
+                copy_queue.put(None)
+            for worker in workers:
+                worker.join()
+        
+        if copy_errors:
+            raise copy_errors[0]
+        
+        # 專案完整部署成功後才更新部署清單（分段部署時延後到切換完成）
+        if self.config['publish_options'].get('use_remote_manifest') and not context['dry_run']:
+            if context['staging_root']:
+                context['pending_manifests'].append((project_manifest, dst_dir, remote_state))
+            else:
+                self._write_remote_manifest(context, project_manifest, dst_dir, remote_state)
+    
+    def _compare_directory_to_target(self, context, project_manifest, dst_dir, copy_queue, copy_errors, remote_state):
+        """依來源清單與目標比對，將需要複製的檔案放入複製佇列
+        
+        啟用部署清單時直接與上次部署寫入的清單比對，只有變動的檔案會存取網路；
+        清單不存在、無法讀取或驗證不符時，改為實際列出目標目錄比對。
+        """
+        logger = context['logger']
+        project_name = project_manifest['project_name']
+        source = project_manifest['source']
+        compare_by_hash = self._compare_by_hash()
+        
+        # 需要刪除的檔案已在掃描時排除，只需記錄
+        for item_relative_path in project_manifest['excluded']:
+            relative_path, item = os.path.split(item_relative_path)
+            self._log_file_operation(context, 'deleted', "    ⏭️ 跳過複製需刪除的檔案: %s", item)
+            self._record_file_operation(context, project_name, 'deleted', relative_path, item, 'excluded')
+        
+        transport = context['transport']
+        
+        # 確保目標目錄存在（預覽模式不建立）
+        if not transport.exists(dst_dir) and not context['dry_run']:
+            transport.makedirs(dst_dir)
+        
+        # 載入上次部署的清單
+        remote_manifest = None
+        if self.config['publish_options'].get('use_remote_manifest'):
+            remote_manifest = self._load_remote_manifest(context, project_name, dst_dir)
+            if (remote_manifest is not None and self.config['publish_options'].get('verify_remote_manifest')
+                    and not self._verify_remote_manifest(context, dst_dir, remote_manifest)):
+                logger.warning("    遠端部署清單與實際檔案不符（可能已過期），改用實際掃描")
+                remote_manifest = None
+        
+        if remote_manifest is not None:
+            # 清單中檔案所在的目錄必定存在
+            manifest_dirs = set()
+            for rel_path in remote_manifest['files']:
+                parent = posixpath.dirname(rel_path)
+                while parent and parent not in manifest_dirs:
+                    manifest_dirs.add(parent)
+                    parent = posixpath.dirname(parent)
+        else:
+            # 目標端每個目錄只列出一次，之後的比對都使用列表中快取的檔案資訊
+            remote_listings = {"": self._run_with_retry(context, f"列出目錄 {dst_dir}",
+                                                        lambda: transport.list_directory(dst_dir))[0]}
+        
+        for entry in project_manifest['entries']:
+            # 任一複製執行緒失敗時停止比對
+            if copy_errors:
+                return
+            
+            relative_path, item = os.path.split(entry.rel_path)
+            dst_item = transport.join(dst_dir, entry.rel_path)
+            
+            # 續傳：上次中斷前已完成的檔案直接跳過，不需再與目標比對
+            if not entry.is_dir and self._resume_completed_file(context, project_name, entry, dst_item, remote_state):
+                continue
+            
+            if remote_manifest is not None:
+                manifest_path = entry.rel_path.replace(os.sep, '/')
+                if entry.is_dir:
+                    remote_info = RemoteEntry(0, 0, 0, True) if manifest_path in manifest_dirs else None
+                else:
+                    remote_info = remote_manifest['files'].get(manifest_path)
+                    # 清單記錄的雜湊視為目標檔案的已知雜湊，比對時不必讀取遠端檔案
+                    digest = remote_manifest['hashes'].get(manifest_path)
+                    if compare_by_hash and remote_info is not None and digest:
+                        self.hash_cache.put(remote_cache_key(context['server_key'], dst_item),
+                                            remote_info.size, remote_info.mtime_ns, digest)
+            else:
+                # 取得父目錄的遠端列表（清單中父目錄一定先於其內容出現）
+                parent_listing = remote_listings.get(relative_path)
+                if parent_listing is None:
+                    parent_dir = transport.join(dst_dir, relative_path)
+                    parent_listing = self._run_with_retry(context, f"列出目錄 {parent_dir}",
+                                                          lambda: transport.list_directory(parent_dir))[0]
+                    remote_listings[relative_path] = parent_listing
+                remote_info = parent_listing.get(item)
+            
+            if entry.is_dir:
+                # 目錄處理：新建立的目錄內容必定為空，不需再列出
+                if remote_info is not None and remote_info.is_dir:
+                    self._log_file_operation(context, 'directory', "    📁 合併目錄: %s", entry.rel_path)
+                else:
+                    self._log_file_operation(context, 'directory', "    📁 建立目錄: %s", entry.rel_path)
+                    # 使用部署清單時目錄可能存在但沒有記錄的檔案
+                    if not context['dry_run']:
+                        transport.makedirs(dst_item, exist_ok=remote_manifest is not None)
+                    if remote_manifest is None:
+                        remote_listings[entry.rel_path] = {}
+                continue
+            
+            # 檔案處理：檢查是否需要複製
+            src_size = entry.size
+            
+            src_item = os.path.join(source, entry.rel_path)
+            verify = False
+            
+            if remote_info is not None:
+                if src_size == remote_info.size and compare_by_hash:
+                    # 大小相同時交由複製執行緒比對內容雜湊，避免讀取檔案拖慢比對
+                    verify = True
+                elif self._is_same_file(context, src_item, entry, dst_item, remote_info):
+                    # 檔案相同，跳過複製
+                    self._log_file_operation(context, 'skipped', "    ⏭️ 跳過相同檔案: %s", item)
+                    self._record_file_operation(context, project_name, 'skipped', relative_path, item, self._get_skip_note())
+                    remote_state[entry.rel_path] = remote_info
+                    # 更新進度
+                    self.progress.file_done(context['server_key'], src_size)
+                    continue
+                else:
+                    self._log_file_operation(context, 'updated', "    🔄 覆蓋檔案: %s (大小或時間不同)", item)
+                operation_type = 'updated'
+            else:
+                self._log_file_operation(context, 'new', "    ➕ 新增檔案: %s", item)
+                operation_type = 'new'
+            
+            # 交給複製執行緒處理（佇列已滿時會在此等待）
+            stage_path = self._get_stage_path(context, project_name, entry.rel_path)
+            copy_queue.put(CopyTask(src_item, dst_item, operation_type, relative_path, item,
+                                    entry, remote_info, verify, stage_path))
+    
+    def _run_with_retry(self, context, description, operation):
+        """執行遠端操作，暫時性錯誤時以指數退避重試，回傳 (結果, 嘗試次數)
+        
+        第 n 次重試前等待 retry_base_delay × 2^(n-1) 秒（上限 RETRY_MAX_DELAY）乘上 0.5～1 的隨機係數，
+        避免多個複製執行緒同時重新連線；致命錯誤或已達嘗試次數上限時拋出最後一次的錯誤。
+        """
+        publish_options = self.config['publish_options']
+        max_attempts = max(1, int(publish_options.get('retry_attempts', 1)))
+        base_delay = max(0.0, float(publish_options.get('retry_base_delay', 0)))
+        
+        attempt = 1
+        while True:
+            try:
+                return operation(), attempt
+            except Exception as e:
+                if attempt >= max_attempts or not self._is_retryable_error(e):
+                    raise
+                delay = min(RETRY_MAX_DELAY, base_delay * 2 ** (attempt - 1)) * random.uniform(0.5, 1.0)
+                context['logger'].warning(f"    ⚠️ {description} 失敗（第 {attempt}/{max_attempts} 次）: {e}，{delay:.1f} 秒後重試")
+                time.sleep(delay)
+                attempt += 1
+    
+    def _is_retryable_error(self, error):
+        """判斷錯誤是否為暫時性錯誤（網路中斷、逾時、檔案暫時被鎖定）
+        
+        權限不足、磁碟空間不足、來源檔案不存在等錯誤重試也不會成功，視為致命錯誤。
+        """
+        if not isinstance(error, OSError):
+            return False
+        # Windows 上共用違規會以 PermissionError、找不到網路路徑會以 FileNotFoundError 拋出，需依 winerror 判斷
+        winerror = getattr(error, 'winerror', None)
+        if winerror is not None:
+            return winerror in RETRYABLE_WINERRORS
+        if isinstance(error, (TimeoutError, ConnectionError)):
+            return True
+        return error.errno in RETRYABLE_ERRNOS
+    
+    def _copy_worker(self, context, project_name, copy_queue, copy_errors, remote_state):
+        """複製執行緒：從佇列取出檔案並複製到目標"""
+        logger = context['logger']
+        
+        while True:
+            task = copy_queue.get()
+            if task is None:
+                break
+            
+            # 已有其他檔案複製失敗，只清空佇列不再複製
+            if copy_errors:
+                continue
+            
+            try:
+                if task.verify:
+                    # 大小相同的檔案先比對內容雜湊，內容相同則跳過
+                    if self._is_same_file(context, task.src_path, task.source_entry, task.dst_path, task.remote_info):
+                        self._log_file_operation(context, 'skipped', "    ⏭️ 跳過相同檔案: %s", task.filename)
+                        self._record_file_operation(context, project_name, 'skipped', task.relative_path,
+                                                    task.filename, self._get_skip_note())
+                        remote_state[task.source_entry.rel_path] = task.remote_info
+                        self._journal_file_done(context, project_name, task.source_entry)
+                        self.progress.file_done(context['server_key'], task.source_entry.size)
+                        continue
+                    self._log_file_operation(context, 'updated', "    🔄 覆蓋檔案: %s (內容不同)", task.filename)
+                
+                # 預覽模式只記錄預計的操作
+                copy_result = CopyResult(0, 0)
+                attempts = 1
+                if not context['dry_run']:
+                    copy_result, attempts = self._run_with_retry(
+                        context, f"複製 {task.filename}",
+                        lambda: self._deploy_file(context, task.src_path, task.dst_path, task.source_entry,
+                                                  task.remote_info, task.stage_path))
+                    remote_state[task.source_entry.rel_path] = self._remote_entry_after_copy(task.source_entry)
+                    self._journal_file_done(context, project_name, task.source_entry, task.stage_path is not None)
+            except Exception as e:
+                logger.error(f"    ❌ 複製失敗: {task.filename} - {e}")
+                copy_errors.append(e)
+                continue
+            
+            # 記錄檔案操作
+            bytes_transferred = task.source_entry.size - copy_result.bytes_saved
+            self._record_file_operation(context, project_name, task.operation_type, task.relative_path, task.filename,
+                                        source_entry=task.source_entry, bytes_saved=copy_result.bytes_saved,
+                                        bytes_transferred=bytes_transferred, transfer_seconds=copy_result.seconds,
+                                        attempts=attempts)
+            
+            # 更新進度
+            self.progress.file_done(context['server_key'], task.source_entry.size)
+    
+    def _resume_completed_file(self, context, project_name, source_entry, dst_path, remote_state):
+        """檔案已於上次中斷的發布完成時記錄為跳過並回傳 True"""
+        journal = context['journal']
+        if journal is None:
+            return False
+        
+        staged = journal.get_completed(context['server_key'], project_name, source_entry)
+        if staged is None:
+            return False
+        
+        if staged:
+            # 已完成的是暫存檔案，需確認仍存在並加入本次的切換清單
+            stage_path = self._get_stage_path(context, project_name, source_entry.rel_path)
+            if stage_path is None or not context['transport'].exists(stage_path):
+                return False
+            with self.report_lock:
+                context['staged_files'].append((stage_path, dst_path))
+        
+        relative_path, filename = os.path.split(source_entry.rel_path)
+        self._record_file_operation(context, project_name, 'skipped', relative_path, filename, 'resumed')
+        remote_state[source_entry.rel_path] = self._remote_entry_after_copy(source_entry)
+        self.progress.file_done(context['server_key'], source_entry.size)
+        return True
+    
+    def _journal_file_done(self, context, project_name, source_entry, staged=False):
+        """將已完成的檔案寫入檢查點日誌"""
+        if context['journal'] is not None:
+            context['journal'].record(context['server_key'], project_name, source_entry, staged)
+    
+    def _remote_entry_after_copy(self, source_entry):
+        """複製完成後目標檔案的狀態（shutil.copy2 會保留來源的修改時間）"""
+        return RemoteEntry(source_entry.size, source_entry.mtime, source_entry.mtime_ns, False)
+    
+    def _remote_manifest_path(self, context, project_name):
+        """專案部署清單在中繼資料目錄中的路徑"""
+        return context['transport'].join(context['meta_root'], REMOTE_MANIFEST_DIR_NAME, f"{project_name}.json")
+    
+    def _load_remote_manifest(self, context, project_name, dst_dir):
+        """讀取專案的部署清單，回傳 {相對路徑: RemoteEntry} 與雜湊，不存在或格式不符時回傳 None
+        
+        中繼資料目錄中沒有清單時讀取舊版寫在專案目標目錄中的清單（下次寫入清單時移除）。
+        """
+        logger = context['logger']
+        transport = context['transport']
+        
+        try:
+            try:
+                with transport.open(self._remote_manifest_path(context, project_name), 'rb') as f:
+                    manifest = json.loads(f.read().decode('utf-8'))
+            except FileNotFoundError:
+                with transport.open(transport.join(dst_dir, LEGACY_REMOTE_MANIFEST_NAME), 'rb') as f:
+                    manifest = json.loads(f.read().decode('utf-8'))
+        except FileNotFoundError:
+            logger.info("    遠端部署清單不存在，改用實際掃描")
+            return None
+        except Exception as e:
+            logger.warning(f"    遠端部署清單無法讀取，改用實際掃描: {str(e)}")
+            return None
+        
+        if manifest.get('version') != REMOTE_MANIFEST_VERSION or not isinstance(manifest.get('files'), dict):
+            logger.warning("    遠端部署清單版本或格式不符，改用實際掃描")
+            return None
+        
+        remote_files = {}
+        remote_hashes = {}
+        for rel_path, (size, mtime_ns, digest) in manifest['files'].items():
+            remote_files[rel_path] = RemoteEntry(size, mtime_ns / 1e9, mtime_ns, False)
+            if digest:
+                remote_hashes[rel_path] = digest
+        
+        logger.info(f"    已載入遠端部署清單（{len(remote_files)} 個檔案，建立於 {manifest.get('generated_at', '未知')}）")
+        return {'files': remote_files, 'hashes': remote_hashes}
+    
+    def _verify_remote_manifest(self, context, dst_dir, remote_manifest):
+        """抽樣比對部署清單與遠端實際檔案，任一檔案不符即視為清單已過期"""
+        remote_files = remote_manifest['files']
+        samples = random.sample(sorted(remote_files), min(REMOTE_MANIFEST_VERIFY_SAMPLES, len(remote_files)))
+        
+        listings = {}
+        for rel_path in samples:
+            parent, name = posixpath.split(rel_path)
+            if parent not in listings:
+                listings[parent] = context['transport'].list_directory(context['transport'].join(dst_dir, *parent.split('/')))
+            
+            expected = remote_files[rel_path]
+            actual = listings[parent].get(name)
+            if actual is None or actual.is_dir or actual.size != expected.size or abs(actual.mtime - expected.mtime) >= 2:
+                return False
+        
+        return True
+    
+    def _write_remote_manifest(self, context, project_manifest, dst_dir, remote_state):
+        """將本次部署後的目標檔案狀態寫入部署清單，供下次發布直接比對"""
+        files = {}
+        for entry in project_manifest['entries']:
+            remote_info = remote_state.get(entry.rel_path)
+            if entry.is_dir or remote_info is None:
+                continue
+            
+            # 使用雜湊比對時，目標內容與來源相同，記錄來源雜湊（已在快取中）
+            digest = None
+            if self._compare_by_hash():
+                src_path = os.path.join(project_manifest['source'], entry.rel_path)
+                digest = self.hash_cache.get_hash(src_path, entry.size, entry.mtime_ns)
+            files[entry.rel_path.replace(os.sep, '/')] = [remote_info.size, remote_info.mtime_ns, digest]
+        
+        manifest = {
+            'version': REMOTE_MANIFEST_VERSION,
+            'project': project_manifest['project_name'],
+            'generated_at': datetime.now().isoformat(),
+            'files': files
+        }
+        
+        # 先寫入暫存檔再取代，避免中斷時留下不完整的清單
+        transport = context['transport']
+        manifest_path = self._remote_manifest_path(context, project_manifest['project_name'])
+        transport.makedirs(transport.dirname(manifest_path), exist_ok=True)
+        temp_path = manifest_path + '.tmp'
+        with transport.open(temp_path, 'wb') as f:
+            f.write(json.dumps(manifest, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+        transport.replace(temp_path, manifest_path)
+        # 移除舊版寫在網站目錄中的清單
+        transport.remove(transport.join(dst_dir, LEGACY_REMOTE_MANIFEST_NAME))
+        context['logger'].info(f"    已寫入遠端部署清單（{len(files)} 個檔案）")
+    
+    def _is_same_file(self, context, src_path, source_entry, dst_path, remote_info):
+        """判斷目標檔案是否與來源相同
+        
+        預設比對大小與修改時間（容許 2 秒誤差）；使用內容雜湊比對時，
+        大小相同的檔案以雜湊決定，重新建置但內容未變的檔案也會被跳過。
+        """
+        if source_entry.size != remote_info.size:
+            return False
+        
+        if self._compare_by_hash():
+            src_hash = self.hash_cache.get_hash(src_path, source_entry.size, source_entry.mtime_ns)
+            dst_hash = self.hash_cache.get_hash(dst_path, remote_info.size, remote_info.mtime_ns,
+                                                opener=context['transport'].open,
+                                                key=remote_cache_key(context['server_key'], dst_path))
+            return src_hash == dst_hash
+        
+        return abs(source_entry.mtime - remote_info.mtime) < 2
+    
+    def _compare_by_hash(self):
+        """是否使用內容雜湊比對（發布中途切換設定時，未載入快取則維持原比對方式）"""
+        return self.config['publish_options'].get('compare_mode') == 'hash' and self.hash_cache is not None
+    
+    def _get_skip_note(self):
+        """取得跳過檔案時的說明鍵"""
+        if self._compare_by_hash():
+            return 'same_hash'
+        return 'same'
+    
+    def _copy_file(self, context, src_path, dst_path, source_entry, remote_info=None, record_path=None):
+        """複製單一檔案到目標，回傳 CopyResult（差異傳輸節省的位元組數、傳輸耗時）
+        
+        使用雜湊比對時同時記錄目標檔案的雜湊供下次比對；啟用差異傳輸時，
+        超過門檻的檔案記錄區塊簽章，下次更新只寫入內容有變動的區塊。
+        record_path 為快取記錄使用的路徑（寫入暫存路徑時為切換後的正式路徑）。
+        """
+        transport = context['transport']
+        server_throttle = context['throttle']
+        server_key = context['server_key']
+        cache_key = remote_cache_key(server_key, record_path or dst_path)
+        bytes_saved = 0
+        use_delta = self._use_delta_transfer(source_entry.size)
+        streamed = [0]
+        
+        def throttle(amount):
+            # 限速後計入傳輸中的位元組，大檔案的進度與速率也能即時更新
+            if server_throttle:
+                server_throttle(amount)
+            streamed[0] += amount
+            self.progress.add_streamed(server_key, amount)
+        
+        signatures = None
+        copy_start = time.perf_counter()
+        try:
+            if use_delta and remote_info is not None:
+                result = self._delta_copy_file(transport, src_path, dst_path, remote_info, cache_key, throttle)
+                if result is not None:
+                    signatures, bytes_saved = result
+            if signatures is None:
+                transport.upload(src_path, dst_path, throttle)
+        finally:
+            # 檔案結束（或失敗重試）時扣回，完成後由 file_done 計入完整大小
+            self.progress.add_streamed(server_key, -streamed[0])
+        copy_seconds = time.perf_counter() - copy_start
+        
+        if use_delta or self._compare_by_hash():
+            dst_stat = transport.stat(dst_path)
+        
+        if use_delta:
+            # 完整複製的檔案從本機來源計算簽章，不需讀取遠端檔案
+            if signatures is None:
+                signatures = BlockSignatureCache.compute_signatures(src_path)
+            self.delta_cache.put_signatures(cache_key, dst_stat.size, dst_stat.mtime_ns, signatures)
+        
+        if self._compare_by_hash():
+            digest = self.hash_cache.get_hash(src_path, source_entry.size, source_entry.mtime_ns)
+            self.hash_cache.put(cache_key, dst_stat.size, dst_stat.mtime_ns, digest)
+        
+        return CopyResult(bytes_saved, copy_seconds)
+    
+    def _deploy_file(self, context, src_path, dst_path, source_entry, remote_info, stage_path=None):
+        """複製檔案到目標，回傳 CopyResult
+        
+        分段部署時寫入暫存路徑並登記待切換，正式檔案在切換前維持不變；
+        暫存檔案為全新檔案，因此不使用差異傳輸。
+        """
+        if stage_path is None:
+            return self._copy_file(context, src_path, dst_path, source_entry, remote_info)
+        
+        copy_result = self._copy_file(context, src_path, stage_path, source_entry, record_path=dst_path)
+        with self.report_lock:
+            context['staged_files'].append((stage_path, dst_path))
+        return copy_result
+    
+    def _get_stage_path(self, context, project_name, relative_path):
+        """取得檔案在暫存目錄中的路徑並確保其父目錄存在，非分段部署時回傳 None"""
+        if not context['staging_root']:
+            return None
+        
+        transport = context['transport']
+        stage_path = transport.join(context['staging_root'], project_name, relative_path)
+        stage_dir = transport.dirname(stage_path)
+        if stage_dir not in context['staged_dirs']:
+            transport.makedirs(stage_dir, exist_ok=True)
+            context['staged_dirs'].add(stage_dir)
+        return stage_path
+    
+    def _switch_staged_files(self, context):
+        """以更名方式將暫存檔案切換為正式檔案（同一分享內更名不需重新傳輸內容）"""
+        logger = context['logger']
+        staged_files = context['staged_files']
+        if not staged_files:
+            logger.info("沒有需要切換的暫存檔案")
+            return
+        
+        logger.info(f"正在切換 {len(staged_files)} 個暫存檔案...")
+        switch_start = time.time()
+        for stage_path, live_path in staged_files:
+            try:
+                context['transport'].replace(stage_path, live_path)
+            except OSError as e:
+                raise Exception(f"切換檔案失敗: {live_path} - {e}")
+        
+        switch_duration = time.time() - switch_start
+        context['server_report']['switch_duration'] = switch_duration
+        logger.info(f"✅ 暫存檔案切換完成，耗時 {switch_duration:.2f} 秒")
+    
+    def _remove_staging_tree(self, context):
+        """刪除暫存目錄"""
+        context['transport'].rmtree(context['staging_root'])
+        context['staged_dirs'].clear()
+    
+    def _use_delta_transfer(self, size):
+        """檔案是否使用差異傳輸（發布中途開啟設定時，未載入快取則維持完整複製）"""
+        publish_options = self.config['publish_options']
+        return (publish_options.get('delta_transfer') and self.delta_cache is not None
+                and size >= int(publish_options.get('delta_min_size_kb', 0)) * 1024)
+    
+    def _delta_copy_file(self, transport, src_path, dst_path, remote_info, cache_key, throttle=None):
+        """以區塊差異更新目標檔案，回傳 (新簽章, 節省位元組數)；沒有可用的簽章時回傳 None
+        
+        網路共享無法在遠端計算校驗碼，因此以上次寫入時記錄的區塊簽章代表遠端內容，
+        逐一比對來源區塊：弱校驗碼相同時再比對強雜湊，只有不同的區塊才寫入遠端。
+        """
+        old_signatures = self.delta_cache.get_signatures(cache_key, remote_info.size, remote_info.mtime_ns)
+        if old_signatures is None:
+            return None
+        
+        signatures = []
+        bytes_written = 0
+        with open(src_path, 'rb') as src, transport.open(dst_path, 'r+b') as dst:
+            for index, block in enumerate(iter(lambda: src.read(DELTA_BLOCK_SIZE), b'')):
+                weak = zlib.adler32(block)
+                if index < len(old_signatures) and old_signatures[index][0] == weak:
+                    signature = BlockSignatureCache.block_signature(block)
+                    if signature[1] == old_signatures[index][1]:
+                        signatures.append(signature)
+                        continue
+                else:
+                    signature = [weak, hashlib.blake2b(block, digest_size=16).hexdigest()]
+                
+                if throttle:
+                    throttle(len(block))
+                dst.seek(index * DELTA_BLOCK_SIZE)
+                dst.write(block)
+                bytes_written += len(block)
+                signatures.append(signature)
+            
+            dst.truncate(src.tell())
+            file_size = src.tell()
+        
+        # 與 shutil.copy2 相同，保留來源的修改時間與屬性
+        transport.copystat(src_path, dst_path)
+        return signatures, file_size - bytes_written
+    
+    def read_config_file(self):
+        """讀取設定檔並合併到目前設定，補齊舊設定檔缺少的鍵；設定檔不存在時回傳 False"""
+        if not os.path.exists(self.config_file):
+            return False
+        
+        with open(self.config_file, 'r', encoding='utf-8') as f:
+            self.apply_config(json.load(f))
+        return True
+    
+    def apply_config(self, loaded_config):
+        """將設定合併到目前設定（其他工具可直接傳入設定 dict，不必經過設定檔）"""
+        # 合併配置，確保新鍵不會丟失
+        for key, value in loaded_config.items():
+            self.config[key] = value
+        
+        # 確保所有必要的鍵都存在
+        if 'notification_emails' not in self.config:
+            self.config['notification_emails'] = []
+        if 'smtp_config' not in self.config:
+            self.config['smtp_config'] = {
+                'smtp_server': '',
+                'smtp_port': 587,
+                'username': '',
+                'password': '',
+                'use_tls': True
+            }
+        
+        # 補齊發布選項，確保舊設定檔升級後仍有預設值
+        publish_options = dict(DEFAULT_PUBLISH_OPTIONS)
+        publish_options.update(self.config.get('publish_options') or {})
+        self.config['publish_options'] = publish_options
+        self._apply_share_session_idle()
+        self._apply_log_options()
+    
+    def save_config(self):
+        try:
+            with open(self.config_file, 'w', encoding='utf-8') as f:
+                json.dump(self.config, f, ensure_ascii=False, indent=2)
+        except Exception as e:
+            print(f"儲存配置失敗: {e}")
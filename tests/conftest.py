@@ -0,0 +1,77 @@
+"""測試共用設定：將專案根目錄加入匯入路徑，並提供建立發布報告的輔助函式"""
+import logging
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from publish_engine import FileOperationLog, LocalDirectorySessionManager, PublishEngine  # noqa: E402
+
+STATS_KEYS = ('new_files', 'updated_files', 'skipped_files', 'deleted_files')
+OPERATION_STATS = {'new': 'new_files', 'updated': 'updated_files', 'skipped': 'skipped_files', 'deleted': 'deleted_files'}
+
+
+def make_report(start_time, servers):
+    """建立與 PublishEngine.publish_report 相同格式的報告
+
+    servers 為 {伺服器識別名稱: {專案名稱: [(操作, 路徑, 大小), ...]}}。
+    """
+    total_stats = dict.fromkeys(STATS_KEYS, 0)
+    report_servers = {}
+    for server_key, projects in servers.items():
+        server_stats = dict.fromkeys(STATS_KEYS, 0)
+        report_projects = {}
+        for project_name, operations in projects.items():
+            files = FileOperationLog()
+            project_stats = dict.fromkeys(STATS_KEYS, 0)
+            for operation, path, size in operations:
+                relative_path, filename = os.path.split(path)
+                files.append(operation, relative_path, filename, note='same' if operation == 'skipped' else None,
+                             size=size, mtime=start_time.timestamp(), bytes_transferred=size)
+                for stats in (project_stats, server_stats, total_stats):
+                    stats[OPERATION_STATS[operation]] += 1
+            report_projects[project_name] = {'files': files, 'stats': project_stats}
+        report_servers[server_key] = {'status': '成功', 'stats': server_stats, 'projects': report_projects}
+    return {
+        'servers': report_servers,
+        'start_time': start_time,
+        'end_time': start_time + timedelta(seconds=5),
+        'total_stats': total_stats
+    }
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """切換到暫存目錄，引擎寫入的 history、journal、cache 都留在其中"""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def quiet_logger():
+    logger = logging.getLogger('publish_engine_tests')
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+    return logger
+
+
+@pytest.fixture
+def local_engine(workdir, quiet_logger):
+    """以本機目錄模擬網路共享的發布引擎，回傳 (引擎, 來源目錄, 模擬遠端根目錄)"""
+    source_dir = workdir / 'src'
+    source_dir.mkdir()
+    remote_root = workdir / 'remote'
+    engine = PublishEngine(share_sessions=LocalDirectorySessionManager(str(remote_root)), logger=quiet_logger)
+    engine.apply_config({
+        'source_files': [],
+        'servers': [{'ip': '10.0.0.1', 'path': 'D:\\www', 'username': '', 'password': ''}]
+    })
+    return engine, source_dir, remote_root
+
+
+def run_time(minutes):
+    """測試用的固定發布時間（依分鐘遞增）"""
+    return datetime(2026, 1, 1, 8, 0) + timedelta(minutes=minutes)
@@ -0,0 +1,86 @@
+import os
+
+import pytest
+
+from publish_engine import DELTA_BLOCK_SIZE
+
+BLOCKS = 5
+
+
+def block_data(seed, count=BLOCKS):
+    return b''.join(bytes([(seed + index) % 251]) * DELTA_BLOCK_SIZE for index in range(count))
+
+
+def touch(path, offset):
+    """將修改時間移到第一次發布之後，確保以大小與修改時間比對時視為已變更"""
+    mtime = os.stat(path).st_mtime + offset
+    os.utime(path, (mtime, mtime))
+
+
+@pytest.fixture
+def delta_engine(local_engine):
+    engine, source_dir, remote_root = local_engine
+    site = source_dir / 'site'
+    site.mkdir()
+    (site / 'bundle.bin').write_bytes(block_data(1))
+    engine.config['source_files'] = [str(site)]
+    engine.config['publish_options'].update(delta_transfer=True, delta_min_size_kb=0)
+    assert engine.execute().success
+    return engine, site / 'bundle.bin', remote_root / '10.0.0.1' / 'D$' / 'www' / 'site' / 'bundle.bin'
+
+
+def bundle_record(engine, result):
+    files = result.report['servers'][engine._get_server_key(engine.config['servers'][0])]['projects']['site']['files']
+    records = list(files.records())
+    assert len(records) == 1
+    return records[0]
+
+
+def test_updated_file_writes_only_changed_blocks(delta_engine):
+    engine, source, remote = delta_engine
+    data = bytearray(source.read_bytes())
+    data[2 * DELTA_BLOCK_SIZE + 10] ^= 0xFF
+    source.write_bytes(bytes(data))
+    touch(source, 10)
+
+    result = engine.execute()
+
+    assert result.success, result.error
+    assert remote.read_bytes() == bytes(data)
+    record = bundle_record(engine, result)
+    assert record['operation'] == 'updated'
+    # 只有第 3 個區塊需要寫入
+    assert record['bytes_saved'] == (BLOCKS - 1) * DELTA_BLOCK_SIZE
+    assert result.report['bytes_saved'] == (BLOCKS - 1) * DELTA_BLOCK_SIZE
+
+
+def test_shorter_file_is_truncated(delta_engine):
+    engine, source, remote = delta_engine
+    data = block_data(1, BLOCKS - 2) + b'tail'
+    source.write_bytes(data)
+    touch(source, 10)
+
+    result = engine.execute()
+
+    assert remote.read_bytes() == data
+    assert bundle_record(engine, result)['bytes_saved'] == (BLOCKS - 2) * DELTA_BLOCK_SIZE
+
+
+def test_remote_changed_since_signatures_falls_back_to_full_copy(delta_engine):
+    engine, source, remote = delta_engine
+    # 遠端檔案被其他人改寫，記錄的簽章已不代表遠端內容
+    remote.write_bytes(block_data(9))
+    touch(remote, -10)
+    data = bytearray(source.read_bytes())
+    data[0] ^= 0xFF
+    source.write_bytes(bytes(data))
+    touch(source, 10)
+
+    result = engine.execute()
+
+    assert result.success, result.error
+    assert remote.read_bytes() == bytes(data)
+    record = bundle_record(engine, result)
+    assert record['operation'] == 'updated'
+    assert 'bytes_saved' not in record
+    assert result.report['bytes_saved'] == 0
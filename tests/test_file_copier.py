@@ -0,0 +1,84 @@
+import os
+
+import pytest
+
+import publish_engine
+from publish_engine import FileCopier
+
+
+def write_file(path, size, seed=7):
+    data = bytes((seed + i * 31) % 251 for i in range(size))
+    path.write_bytes(data)
+    os.utime(path, ns=(1_700_000_000_000_000_000, 1_700_000_000_000_000_000))
+    return data
+
+
+@pytest.mark.parametrize('use_offload', [True, False])
+@pytest.mark.parametrize('size', [0, 1, 64 * 1024 - 1, 3 * 1024 * 1024 + 17])
+def test_copy_preserves_content_and_mtime(tmp_path, use_offload, size):
+    src = tmp_path / 'src.bin'
+    dst = tmp_path / 'dst.bin'
+    data = write_file(src, size)
+
+    copied, seconds = FileCopier(chunk_size=64 * 1024, use_offload=use_offload).copy(str(src), str(dst))
+
+    assert copied == size
+    assert seconds >= 0
+    assert dst.read_bytes() == data
+    assert os.stat(dst).st_mtime_ns == os.stat(src).st_mtime_ns
+
+
+def test_copy_overwrites_larger_destination(tmp_path):
+    src = tmp_path / 'src.bin'
+    dst = tmp_path / 'dst.bin'
+    data = write_file(src, 1000)
+    dst.write_bytes(b'x' * 5000)
+
+    FileCopier().copy(str(src), str(dst))
+
+    assert dst.read_bytes() == data
+
+
+@pytest.mark.parametrize('use_offload', [True, False])
+def test_throttle_receives_every_chunk(tmp_path, use_offload):
+    src = tmp_path / 'src.bin'
+    dst = tmp_path / 'dst.bin'
+    size = 5 * 64 * 1024 + 123
+    write_file(src, size)
+    amounts = []
+
+    FileCopier(chunk_size=64 * 1024, use_offload=use_offload).copy(str(src), str(dst), amounts.append)
+
+    assert sum(amounts) == size
+    assert max(amounts) <= 64 * 1024
+
+
+def test_preallocated_destination_is_truncated_to_content(tmp_path, monkeypatch):
+    monkeypatch.setattr(publish_engine, 'PREALLOCATE_MIN_SIZE', 1024)
+    src = tmp_path / 'src.bin'
+    dst = tmp_path / 'dst.bin'
+    data = write_file(src, 300 * 1024)
+
+    FileCopier(preallocate=True, use_offload=False).copy(str(src), str(dst))
+
+    assert dst.read_bytes() == data
+
+
+def test_offload_unsupported_falls_back_to_buffered_copy(tmp_path, monkeypatch):
+    def unsupported(*args):
+        raise OSError(publish_engine.errno.EXDEV, 'cross-device')
+
+    monkeypatch.setattr(os, 'copy_file_range', unsupported, raising=False)
+    monkeypatch.setattr(os, 'sendfile', unsupported, raising=False)
+    src = tmp_path / 'src.bin'
+    dst = tmp_path / 'dst.bin'
+    data = write_file(src, 200 * 1024)
+
+    copied, _ = FileCopier(use_offload=True).copy(str(src), str(dst))
+
+    assert copied == len(data)
+    assert dst.read_bytes() == data
+
+
+def test_chunk_size_has_lower_bound():
+    assert FileCopier(chunk_size=1).chunk_size == 64 * 1024
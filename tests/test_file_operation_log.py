@@ -0,0 +1,72 @@
+import sys
+from datetime import datetime
+
+from publish_engine import FILE_OPERATION_NOTES, FileOperationLog
+
+MTIME = datetime(2026, 1, 1, 8, 30).timestamp()
+
+
+def sample_log():
+    files = FileOperationLog()
+    files.append('new', 'css', 'site.css', size=100, mtime=MTIME, bytes_transferred=100)
+    files.append('skipped', '', 'index.html', note='same')
+    files.append('updated', 'js', 'app.js', size=2048, mtime=MTIME, bytes_saved=1024, bytes_transferred=1024,
+                 transfer_seconds=0.5, attempts=2)
+    files.append('deleted', 'old', 'page.html', note='excluded')
+    return files
+
+
+def test_records_keep_append_order():
+    files = sample_log()
+
+    assert len(files) == 4
+    assert [(r['operation'], r['path']) for r in files] == [
+        ('new', 'css/site.css'), ('skipped', 'index.html'), ('updated', 'js/app.js'), ('deleted', 'old/page.html')]
+
+
+def test_detail_is_built_from_raw_values():
+    new, skipped, updated, deleted = sample_log().records()
+
+    assert new['detail'] == '大小: 100 bytes, 修改時間: 2026-01-01 08:30:00'
+    assert new['bytes_transferred'] == 100
+    assert 'attempts' not in new and 'bytes_saved' not in new
+    assert skipped['detail'] == FILE_OPERATION_NOTES['same']
+    assert deleted['detail'] == FILE_OPERATION_NOTES['excluded']
+    # 差異傳輸節省量與重試次數另存在 extras，只有出現時才附加到記錄
+    assert updated['bytes_saved'] == 1024
+    assert updated['attempts'] == 2
+    assert updated['transfer_seconds'] == 0.5
+    assert updated['detail'].endswith('差異傳輸節省 1.0 KB, 嘗試 2 次')
+
+
+def test_operations_filter():
+    files = sample_log()
+
+    assert [r['path'] for r in files.records(('new', 'updated'))] == ['css/site.css', 'js/app.js']
+    assert list(files.records(())) == []
+
+
+def test_raw_records_match_history_columns():
+    rows = list(sample_log().raw_records(('updated',)))
+
+    assert len(rows) == 1
+    operation, path, note, size, mtime, _, bytes_saved, bytes_transferred, seconds, attempts = rows[0]
+    assert (operation, path, note, size, mtime) == ('updated', 'js/app.js', None, 2048, MTIME)
+    assert (bytes_saved, bytes_transferred, seconds, attempts) == (1024, 1024, 0.5, 2)
+
+
+def test_only_rare_values_use_extras():
+    files = sample_log()
+
+    assert set(files.extras) == {2}
+
+
+def test_paths_are_shared_between_logs():
+    first = FileOperationLog()
+    second = FileOperationLog()
+    directory = ''.join(['assets/', 'images'])
+    for files in (first, second):
+        files.append('new', directory, 'logo.png', size=1, mtime=MTIME)
+
+    assert first.dirs[0] is second.dirs[0] is sys.intern('assets/images')
+    assert first.names[0] is second.names[0]
@@ -0,0 +1,117 @@
+import json
+import os
+
+import pytest
+
+from conftest import make_report, run_time
+from publish_engine import HistoryStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return HistoryStore(str(tmp_path / 'history' / 'publish_history.db'))
+
+
+def add_run(store, minutes, servers, status='成功'):
+    return store.add_run(make_report(run_time(minutes), servers), status)
+
+
+def test_add_and_read_run(store):
+    run_id = add_run(store, 0, {
+        'web01': {'site': [('new', 'css/site.css', 100), ('skipped', 'index.html', 50)]},
+        'web02': {'site': [('updated', 'css/site.css', 120)]}
+    })
+    add_run(store, 1, {'web01': {'site': [('deleted', 'old.html', 0)]}}, status='失敗')
+
+    assert store.count_runs() == 2
+    assert store.count_runs('失敗') == 1
+    assert [run['id'] for run in store.list_runs()] == ['20260101_080100', '20260101_080000']
+    assert [run['id'] for run in store.list_runs(limit=1, offset=1)] == ['20260101_080000']
+
+    record = store.get_run(run_id)
+    assert record['status'] == '成功'
+    assert record['total_stats'] == {'new_files': 1, 'updated_files': 1, 'skipped_files': 1, 'deleted_files': 0}
+    assert list(record['servers']) == ['web01', 'web02']
+    files = list(record['servers']['web01']['projects']['site']['files'])
+    assert [(f['operation'], f['path'], f['detail']) for f in files] == [
+        ('new', 'css/site.css', files[0]['detail']), ('skipped', 'index.html', '檔案內容相同')]
+    assert files[0]['detail'].startswith('大小: 100 bytes')
+    assert store.get_run(9999) is None
+
+
+def test_file_records_filter(store):
+    run_id = add_run(store, 0, {'web01': {'site': [('new', 'a.html', 1), ('skipped', 'b.html', 1), ('new', 'c.html', 1)]}})
+    project_id = store.get_run(run_id)['servers']['web01']['projects']['site']['files'].project_id
+
+    assert [f['path'] for f in store.file_records(project_id, operations=('new',))] == ['a.html', 'c.html']
+    assert [f['path'] for f in store.file_records(project_id, limit=2)] == ['a.html', 'b.html']
+    assert store.count_file_records(project_id) == 3
+    assert store.count_file_records(project_id, operations=('skipped',)) == 1
+
+
+def test_legacy_json_is_imported_once(tmp_path):
+    legacy_file = tmp_path / 'history' / 'publish_history.json'
+    legacy_file.parent.mkdir()
+    records = [
+        {
+            'id': '20250102_090000',
+            'start_time': '2025-01-02T09:00:00',
+            'end_time': '2025-01-02T09:00:30',
+            'duration': 30,
+            'server_count': 1,
+            'status': '成功',
+            'total_stats': {'new_files': 0, 'updated_files': 1, 'skipped_files': 0, 'deleted_files': 0},
+            'servers': {
+                'web01': {
+                    'status': '成功',
+                    'stats': {'new_files': 0, 'updated_files': 1, 'skipped_files': 0, 'deleted_files': 0},
+                    'projects': {
+                        'site': {
+                            'stats': {'new_files': 0, 'updated_files': 1, 'skipped_files': 0, 'deleted_files': 0},
+                            'files': [{'operation': 'updated', 'path': 'index.html', 'timestamp': '09:00:10',
+                                       'detail': '大小: 10 bytes, 嘗試 2 次', 'attempts': 2}]
+                        }
+                    }
+                }
+            }
+        },
+        {
+            'id': '20250101_090000',
+            'start_time': '2025-01-01T09:00:00',
+            'end_time': '2025-01-01T09:00:10',
+            'duration': 10,
+            'server_count': 1,
+            'status': '失敗',
+            'total_stats': {'new_files': 1, 'updated_files': 0, 'skipped_files': 0, 'deleted_files': 0},
+            'servers': {
+                'web01': {
+                    'status': '失敗',
+                    'stats': {'new_files': 1, 'updated_files': 0, 'skipped_files': 0, 'deleted_files': 0},
+                    'projects': {
+                        'site': {
+                            'stats': {'new_files': 1, 'updated_files': 0, 'skipped_files': 0, 'deleted_files': 0},
+                            'files': [{'operation': 'new', 'path': 'index.html', 'timestamp': '09:00:05',
+                                       'detail': '大小: 9 bytes'}]
+                        }
+                    }
+                }
+            }
+        }
+    ]
+    legacy_file.write_text(json.dumps(records, ensure_ascii=False), encoding='utf-8')
+    db_file = str(tmp_path / 'history' / 'publish_history.db')
+
+    store = HistoryStore(db_file, str(legacy_file))
+    runs = store.list_runs()
+
+    assert [run['id'] for run in runs] == ['20250102_090000', '20250101_090000']
+    assert [run['status'] for run in runs] == ['成功', '失敗']
+    assert not legacy_file.exists()
+    assert os.path.exists(str(legacy_file) + '.bak')
+    files = list(store.get_run(runs[0]['run_id'])['servers']['web01']['projects']['site']['files'])
+    # 說明文字中的重試次數不會重複附加
+    assert files == [{'path': 'index.html', 'operation': 'updated', 'detail': '大小: 10 bytes, 嘗試 2 次',
+                      'timestamp': '09:00:10', 'attempts': 2}]
+
+    # 再次開啟時不會重複匯入
+    assert HistoryStore(db_file, str(legacy_file)).count_runs() == 2
@@ -0,0 +1,110 @@
+import os
+import sqlite3
+
+import pytest
+
+from conftest import make_report, run_time
+from publish_engine import HistoryStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return HistoryStore(str(tmp_path / 'history' / 'publish_history.db'))
+
+
+def add_run(store, minutes, servers, status='成功'):
+    return store.add_run(make_report(run_time(minutes), servers), status)
+
+
+def test_search_by_path_segment_prefix(store):
+    add_run(store, 0, {'web01': {'site': [('new', 'js/app.js', 10), ('new', 'js/vendor/jquery.js', 10)]}})
+    add_run(store, 1, {'web01': {'site': [('updated', 'js/app.js', 11)], 'admin': [('new', 'Admin/App.config', 5)]},
+                       'web02': {'site': [('updated', 'js/app.js', 11)]}})
+
+    results = store.search_file_ops('app.js')
+    # 由新到舊，同一次發布依寫入順序的反向
+    assert [(r['id'], r['server'], r['operation']) for r in results] == [
+        ('20260101_080100', 'web02', 'updated'),
+        ('20260101_080100', 'web01', 'updated'),
+        ('20260101_080000', 'web01', 'new')]
+    assert results[0]['size'] == 11
+
+    # 每個詞都必須是某一段的開頭，不分大小寫
+    assert {r['path'] for r in store.search_file_ops('app')} == {'js/app.js', 'Admin/App.config'}
+    assert {r['path'] for r in store.search_file_ops('ADMIN/app')} == {'Admin/App.config'}
+    assert {r['path'] for r in store.search_file_ops('js jq')} == {'js/vendor/jquery.js'}
+    assert store.search_file_ops('query') == []
+    assert store.search_file_ops('  / ') == []
+    assert len(store.search_file_ops('app.js', limit=2)) == 2
+
+
+def test_search_skips_unchanged_files_by_default(store):
+    add_run(store, 0, {'web01': {'site': [('new', 'index.html', 10)]}})
+    add_run(store, 1, {'web01': {'site': [('skipped', 'index.html', 10)]}})
+
+    assert [r['operation'] for r in store.search_file_ops('index')] == ['new']
+    assert [r['operation'] for r in store.search_file_ops('index', include_skipped=True)] == ['skipped', 'new']
+
+
+def test_delete_runs_prunes_path_index(store):
+    first = add_run(store, 0, {'web01': {'site': [('new', 'old.html', 1), ('new', 'keep.html', 1)]}})
+    add_run(store, 1, {'web01': {'site': [('updated', 'keep.html', 1)]}})
+
+    store.delete_runs([first])
+
+    assert store.search_file_ops('old') == []
+    assert [r['operation'] for r in store.search_file_ops('keep')] == ['updated']
+    with sqlite3.connect(store.db_file) as connection:
+        assert [row[0] for row in connection.execute('SELECT path FROM paths')] == ['keep.html']
+        assert 'old.html' not in {row[0] for row in connection.execute('SELECT term FROM path_terms')}
+
+    store.clear()
+    assert store.count_runs() == 0
+    assert store.search_file_ops('keep') == []
+    with sqlite3.connect(store.db_file) as connection:
+        assert connection.execute('SELECT COUNT(*) FROM path_terms').fetchone()[0] == 0
+
+
+def test_old_database_is_indexed_on_open(store):
+    add_run(store, 0, {'web01': {'site': [('new', 'css/site.css', 1)]}})
+    # 模擬沒有路徑索引的第 1 版資料庫
+    with sqlite3.connect(store.db_file) as connection:
+        connection.execute('DROP TABLE path_terms')
+        connection.execute('DROP TABLE paths')
+        connection.execute('PRAGMA user_version = 1')
+
+    upgraded = HistoryStore(store.db_file)
+    assert [r['path'] for r in upgraded.search_file_ops('site.css')] == ['css/site.css']
+    with sqlite3.connect(store.db_file) as connection:
+        assert connection.execute('PRAGMA user_version').fetchone()[0] == HistoryStore.SCHEMA_VERSION
+
+    # 已是目前版本時不會重建索引
+    add_run(upgraded, 1, {'web01': {'site': [('updated', 'css/site.css', 2)]}})
+    assert len(HistoryStore(store.db_file).search_file_ops('site.css')) == 2
+
+
+@pytest.mark.parametrize('stream', [False, True])
+def test_engine_search_finds_published_files(local_engine, stream):
+    engine, source_dir, _ = local_engine
+    site = source_dir / 'site'
+    (site / 'css').mkdir(parents=True)
+    (site / 'index.html').write_text('index')
+    (site / 'css' / 'site.css').write_text('body {}')
+    engine.config['source_files'] = [str(site)]
+    engine.config['publish_options']['stream_file_operations'] = stream
+    server_key = engine._get_server_key(engine.config['servers'][0])
+
+    first = engine.execute()
+    engine.save_history_record(first.report, first.success)
+    (site / 'css' / 'site.css').write_text('body { margin: 0 }')
+    os.utime(site / 'css' / 'site.css', (os.stat(site / 'index.html').st_mtime + 10,) * 2)
+    second = engine.execute()
+    engine.save_history_record(second.report, second.success)
+
+    results = engine.search_file_history('css/site')
+    assert [(r['operation'], r['server'], r['project'], r['path']) for r in results] == [
+        ('updated', server_key, 'site', 'css/site.css'), ('new', server_key, 'site', 'css/site.css')]
+    assert results[0]['size'] == len('body { margin: 0 }')
+    # 未變動的檔案預設不列出
+    assert [r['operation'] for r in engine.search_file_history('index.html')] == ['new']
+    assert [r['operation'] for r in engine.search_file_history('index.html', include_skipped=True)] == ['skipped', 'new']
@@ -0,0 +1,157 @@
+import json
+import os
+
+from publish_engine import JOURNAL_FILE, PublishJournal, SourceEntry
+
+
+def entry(rel_path, size=10, mtime_ns=1_000_000_000):
+    return SourceEntry(rel_path, size, mtime_ns / 1e9, mtime_ns, False)
+
+
+def test_completed_files_survive_reopen(tmp_path):
+    journal_file = str(tmp_path / 'journal' / 'publish_journal.jsonl')
+    journal = PublishJournal(journal_file, 'abc')
+    assert journal.open(resume=True) == 0
+    journal.record('srv', 'site', entry(os.path.join('css', 'site.css')))
+    journal.record('srv', 'site', entry('index.html', size=20), staged=True)
+    journal.close()
+
+    resumed = PublishJournal(journal_file, 'abc')
+    assert resumed.open(resume=True) == 2
+    assert resumed.get_completed('srv', 'site', entry(os.path.join('css', 'site.css'))) is False
+    assert resumed.get_completed('srv', 'site', entry('index.html', size=20)) is True
+    assert resumed.get_completed('other', 'site', entry('index.html', size=20)) is None
+
+    # 續傳後新增的記錄附加在原日誌之後
+    resumed.record('srv', 'site', entry('app.js'))
+    resumed.close()
+    again = PublishJournal(journal_file, 'abc')
+    assert again.open(resume=True) == 3
+    again.close()
+
+
+def test_changed_source_is_not_completed(tmp_path):
+    journal = PublishJournal(str(tmp_path / 'journal.jsonl'), 'abc')
+    journal.open()
+    journal.record('srv', 'site', entry('index.html', size=20, mtime_ns=5))
+    journal.close()
+
+    resumed = PublishJournal(str(tmp_path / 'journal.jsonl'), 'abc')
+    resumed.open()
+    assert resumed.get_completed('srv', 'site', entry('index.html', size=21, mtime_ns=5)) is None
+    assert resumed.get_completed('srv', 'site', entry('index.html', size=20, mtime_ns=6)) is None
+    resumed.close()
+
+
+def test_other_fingerprint_starts_over(tmp_path):
+    journal_file = str(tmp_path / 'journal.jsonl')
+    journal = PublishJournal(journal_file, 'abc')
+    journal.open()
+    journal.record('srv', 'site', entry('index.html'))
+    journal.close()
+
+    other = PublishJournal(journal_file, 'def')
+    assert other.open(resume=True) == 0
+    other.close()
+    with open(journal_file, encoding='utf-8') as f:
+        lines = f.read().splitlines()
+    assert len(lines) == 1
+    assert json.loads(lines[0])['fingerprint'] == 'def'
+
+
+def test_open_without_resume_discards_previous_records(tmp_path):
+    journal_file = str(tmp_path / 'journal.jsonl')
+    journal = PublishJournal(journal_file, 'abc')
+    journal.open()
+    journal.record('srv', 'site', entry('index.html'))
+    journal.close()
+
+    fresh = PublishJournal(journal_file, 'abc')
+    assert fresh.open(resume=False) == 0
+    fresh.close()
+    assert PublishJournal(journal_file, 'abc').open(resume=True) == 0
+
+
+def test_truncated_last_line_is_ignored(tmp_path):
+    journal_file = str(tmp_path / 'journal.jsonl')
+    journal = PublishJournal(journal_file, 'abc')
+    journal.open()
+    journal.record('srv', 'site', entry('a.html'))
+    journal.record('srv', 'site', entry('b.html'))
+    journal.close()
+    with open(journal_file, 'rb+') as f:
+        f.seek(-10, os.SEEK_END)
+        f.truncate()
+
+    resumed = PublishJournal(journal_file, 'abc')
+    assert resumed.open(resume=True) == 1
+    assert resumed.get_completed('srv', 'site', entry('a.html')) is False
+    assert resumed.get_completed('srv', 'site', entry('b.html')) is None
+    resumed.close()
+
+
+def test_discard_removes_journal(tmp_path):
+    journal_file = str(tmp_path / 'journal.jsonl')
+    journal = PublishJournal(journal_file, 'abc')
+    journal.open()
+    journal.record('srv', 'site', entry('index.html'))
+    journal.discard()
+    assert not os.path.exists(journal_file)
+    # 關閉後的記錄直接忽略
+    journal.record('srv', 'site', entry('other.html'))
+    assert not os.path.exists(journal_file)
+
+
+def write_journal(engine, server_key, project_name, paths):
+    """建立與中斷的發布相同的日誌：paths 為已完成的來源檔案"""
+    journal = PublishJournal(JOURNAL_FILE, engine._get_journal_fingerprint())
+    journal.open(resume=False)
+    for rel_path, path in paths:
+        stat = os.stat(path)
+        journal.record(server_key, project_name, SourceEntry(rel_path, stat.st_size, stat.st_mtime, stat.st_mtime_ns, False))
+    journal.close()
+
+
+def remote_files(remote_root):
+    return {name for _, _, files in os.walk(remote_root) for name in files}
+
+
+def test_engine_resumes_interrupted_directory_publish(local_engine):
+    engine, source_dir, remote_root = local_engine
+    site = source_dir / 'site'
+    site.mkdir()
+    (site / 'done.html').write_text('done')
+    (site / 'todo.html').write_text('todo')
+    engine.config['source_files'] = [str(site)]
+    server_key = engine._get_server_key(engine.config['servers'][0])
+    write_journal(engine, server_key, 'site', [('done.html', str(site / 'done.html'))])
+
+    result = engine.execute()
+
+    assert result.success, result.error
+    files = result.report['servers'][server_key]['projects']['site']['files']
+    operations = {record['path']: (record['operation'], record['detail']) for record in files}
+    assert operations['done.html'] == ('skipped', '已於上次中斷的發布完成（續傳）')
+    assert operations['todo.html'][0] == 'new'
+    # 日誌記錄已完成的檔案不會再複製；發布成功後刪除日誌
+    assert remote_files(remote_root) >= {'todo.html'}
+    assert 'done.html' not in remote_files(remote_root)
+    assert not os.path.exists(JOURNAL_FILE)
+
+
+def test_engine_resumes_single_file_project(local_engine):
+    engine, source_dir, remote_root = local_engine
+    page = source_dir / 'page.html'
+    page.write_text('page')
+    engine.config['source_files'] = [str(page)]
+    server_key = engine._get_server_key(engine.config['servers'][0])
+    # 單一檔案專案以不含副檔名的檔名為專案名稱
+    write_journal(engine, server_key, 'page', [('page.html', str(page))])
+
+    result = engine.execute()
+
+    assert result.success, result.error
+    files = list(result.report['servers'][server_key]['projects']['page']['files'])
+    assert [(record['operation'], record['detail']) for record in files] == [
+        ('skipped', '已於上次中斷的發布完成（續傳）')]
+    assert 'page.html' not in remote_files(remote_root)
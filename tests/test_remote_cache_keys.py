@@ -0,0 +1,28 @@
+import hashlib
+import os
+
+from publish_engine import BlockSignatureCache, HashCache, remote_cache_key
+
+
+def test_same_remote_path_on_two_servers_is_hashed_separately(tmp_path):
+    remote_file = tmp_path / 'index.html'
+    remote_file.write_bytes(b'web02 content')
+    stat = os.stat(remote_file)
+    cache = HashCache(str(tmp_path / 'hash_cache.json'))
+    # SFTP 的目標路徑在每台伺服器都相同
+    cache.put(remote_cache_key('web01', '/www/index.html'), stat.st_size, stat.st_mtime_ns, 'web01-digest')
+
+    digest = cache.get_hash(str(remote_file), stat.st_size, stat.st_mtime_ns,
+                            key=remote_cache_key('web02', '/www/index.html'))
+
+    assert digest == hashlib.sha256(b'web02 content').hexdigest()
+    assert cache.get_hash(str(remote_file), stat.st_size, stat.st_mtime_ns,
+                          key=remote_cache_key('web01', '/www/index.html')) == 'web01-digest'
+
+
+def test_block_signatures_are_kept_per_server(tmp_path):
+    cache = BlockSignatureCache(str(tmp_path / 'delta_cache.json'))
+    cache.put_signatures(remote_cache_key('web01', '/www/app.js'), 10, 1, [[1, 'a']])
+
+    assert cache.get_signatures(remote_cache_key('web02', '/www/app.js'), 10, 1) is None
+    assert cache.get_signatures(remote_cache_key('web01', '/www/app.js'), 10, 1) == [[1, 'a']]
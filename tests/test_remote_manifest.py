@@ -0,0 +1,92 @@
+import json
+import os
+
+import pytest
+
+from publish_engine import LEGACY_REMOTE_MANIFEST_NAME, LocalTransport
+
+
+@pytest.fixture
+def manifest_engine(local_engine):
+    engine, source_dir, remote_root = local_engine
+    site = source_dir / 'site'
+    (site / 'css').mkdir(parents=True)
+    (site / 'index.html').write_text('index')
+    (site / 'css' / 'site.css').write_text('body {}')
+    engine.config['source_files'] = [str(site)]
+    engine.config['publish_options'].update(use_remote_manifest=True, verify_remote_manifest=False)
+    share = remote_root / '10.0.0.1' / 'D$'
+    return engine, site, share / 'www' / 'site', share / 'www.publish' / 'manifests' / 'site.json'
+
+
+def count_listings(monkeypatch):
+    listed = []
+    original = LocalTransport.list_directory
+
+    def list_directory(self, path):
+        listed.append(path)
+        return original(self, path)
+
+    monkeypatch.setattr(LocalTransport, 'list_directory', list_directory)
+    return listed
+
+
+def operations(engine, result):
+    files = result.report['servers'][engine._get_server_key(engine.config['servers'][0])]['projects']['site']['files']
+    return {record['path']: record['operation'] for record in files}
+
+
+def test_manifest_is_written_outside_web_root(manifest_engine):
+    engine, _, live_dir, manifest_file = manifest_engine
+
+    assert engine.execute().success
+
+    manifest = json.loads(manifest_file.read_text(encoding='utf-8'))
+    assert manifest['project'] == 'site'
+    assert sorted(manifest['files']) == ['css/site.css', 'index.html']
+    assert manifest['files']['index.html'][0] == len('index')
+    assert not (live_dir / LEGACY_REMOTE_MANIFEST_NAME).exists()
+
+
+def test_unchanged_publish_skips_remote_walk(manifest_engine, monkeypatch):
+    engine, site, _, _ = manifest_engine
+    engine.execute()
+    (site / 'index.html').write_text('index v2')
+    listed = count_listings(monkeypatch)
+
+    result = engine.execute()
+
+    assert result.success, result.error
+    assert operations(engine, result) == {'css/site.css': 'skipped', 'index.html': 'updated'}
+    # 有部署清單時不列出遠端目錄
+    assert listed == []
+
+
+def test_stale_manifest_falls_back_to_scan(manifest_engine):
+    engine, _, live_dir, _ = manifest_engine
+    engine.config['publish_options']['verify_remote_manifest'] = True
+    engine.execute()
+    # 有人直接修改了遠端檔案，清單記錄的大小已不符
+    (live_dir / 'index.html').write_text('edited on the server')
+
+    result = engine.execute()
+
+    assert operations(engine, result)['index.html'] == 'updated'
+    assert (live_dir / 'index.html').read_text() == 'index'
+
+
+def test_legacy_manifest_is_read_and_migrated(manifest_engine, monkeypatch):
+    engine, _, live_dir, manifest_file = manifest_engine
+    engine.execute()
+    # 模擬舊版：清單寫在網站目錄中
+    legacy_file = live_dir / LEGACY_REMOTE_MANIFEST_NAME
+    os.replace(manifest_file, legacy_file)
+    listed = count_listings(monkeypatch)
+
+    result = engine.execute()
+
+    assert result.success, result.error
+    assert operations(engine, result) == {'css/site.css': 'skipped', 'index.html': 'skipped'}
+    assert listed == []
+    assert not legacy_file.exists()
+    assert sorted(json.loads(manifest_file.read_text(encoding='utf-8'))['files']) == ['css/site.css', 'index.html']
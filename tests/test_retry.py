@@ -0,0 +1,88 @@
+import errno
+
+import pytest
+
+import publish_engine
+from publish_engine import RETRY_MAX_DELAY, LocalTransport, PublishEngine
+
+
+@pytest.fixture
+def retry_engine(local_engine):
+    engine, source_dir, remote_root = local_engine
+    site = source_dir / 'site'
+    site.mkdir()
+    for name in ('index.html', 'app.js', 'site.css'):
+        (site / name).write_text(name)
+    engine.config['source_files'] = [str(site)]
+    engine.config['publish_options'].update(retry_attempts=3, retry_base_delay=0)
+    return engine, remote_root / '10.0.0.1' / 'D$' / 'www' / 'site'
+
+
+def failing_upload(monkeypatch, name, errors):
+    """name 的前幾次上傳依序拋出 errors 中的錯誤，回傳各檔案的上傳次數"""
+    calls = {}
+    errors = list(errors)
+    original = LocalTransport.upload
+
+    def upload(self, src_path, dst_path, throttle=None):
+        filename = dst_path.replace('\\', '/').rsplit('/', 1)[-1]
+        calls[filename] = calls.get(filename, 0) + 1
+        if filename == name and errors:
+            raise errors.pop(0)
+        return original(self, src_path, dst_path, throttle)
+
+    monkeypatch.setattr(LocalTransport, 'upload', upload)
+    return calls
+
+
+def test_transient_error_is_retried(retry_engine, monkeypatch):
+    engine, live_dir = retry_engine
+    calls = failing_upload(monkeypatch, 'app.js', [TimeoutError('timed out'), ConnectionResetError('reset')])
+
+    result = engine.execute()
+
+    assert result.success, result.error
+    assert calls == {'index.html': 1, 'app.js': 3, 'site.css': 1}
+    assert (live_dir / 'app.js').read_text() == 'app.js'
+    server_report = result.report['servers'][engine._get_server_key(engine.config['servers'][0])]
+    attempts = {record['path']: record.get('attempts', 1) for record in server_report['projects']['site']['files']}
+    assert attempts == {'index.html': 1, 'app.js': 3, 'site.css': 1}
+    assert server_report['retried_files'] == 1
+    assert result.report['retried_files'] == 1
+
+
+def test_fatal_error_is_not_retried(retry_engine, monkeypatch):
+    engine, _ = retry_engine
+    calls = failing_upload(monkeypatch, 'app.js', [PermissionError(errno.EACCES, 'access denied')])
+
+    result = engine.execute()
+
+    assert not result.success
+    assert calls['app.js'] == 1
+
+
+def test_gives_up_after_retry_attempts(retry_engine, monkeypatch):
+    engine, _ = retry_engine
+    calls = failing_upload(monkeypatch, 'app.js', [TimeoutError('timed out')] * 5)
+
+    result = engine.execute()
+
+    assert not result.success
+    assert calls['app.js'] == 3
+
+
+def test_backoff_doubles_up_to_max_delay(monkeypatch, quiet_logger):
+    engine = PublishEngine(logger=quiet_logger)
+    engine.config['publish_options'].update(retry_attempts=4, retry_base_delay=RETRY_MAX_DELAY / 3)
+    delays = []
+    monkeypatch.setattr(publish_engine.time, 'sleep', delays.append)
+    monkeypatch.setattr(publish_engine.random, 'uniform', lambda low, high: high)
+    failures = [OSError(errno.ETIMEDOUT, 'timed out')] * 3
+
+    def operation():
+        if failures:
+            raise failures.pop()
+        return 'done'
+
+    assert engine._run_with_retry({'logger': quiet_logger}, 'copy', operation) == ('done', 4)
+    assert delays == [RETRY_MAX_DELAY / 3, RETRY_MAX_DELAY * 2 / 3, RETRY_MAX_DELAY]
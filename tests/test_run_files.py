@@ -0,0 +1,153 @@
+import glob
+import os
+
+import pytest
+
+from publish_engine import RUN_OPERATIONS_DIR, FileOperationRunFile, group_report_records
+
+
+def run_files():
+    return sorted(glob.glob(os.path.join(RUN_OPERATIONS_DIR, '*.jsonl')))
+
+
+@pytest.fixture
+def streaming_engine(local_engine):
+    engine, source_dir, remote_root = local_engine
+    for name in ('site', 'admin'):
+        project = source_dir / name
+        project.mkdir()
+        for index in range(3):
+            (project / f'page{index}.html').write_text(f'{name} {index}')
+    engine.config['source_files'] = [str(source_dir / 'site'), str(source_dir / 'admin')]
+    engine.config['servers'].append({'ip': '10.0.0.2', 'path': 'D:\\www', 'username': '', 'password': ''})
+    engine.config['publish_options']['stream_file_operations'] = True
+    return engine
+
+
+def server_keys(engine):
+    return [engine._get_server_key(server) for server in engine.config['servers']]
+
+
+def count_reads(monkeypatch):
+    reads = []
+    original = FileOperationRunFile.project_raw_records
+
+    def project_raw_records(self, operations=None):
+        reads.append(self.path)
+        return original(self, operations)
+
+    monkeypatch.setattr(FileOperationRunFile, 'project_raw_records', project_raw_records)
+    return reads
+
+
+def test_runs_in_same_second_use_separate_files(streaming_engine):
+    first = streaming_engine.execute()
+    second = streaming_engine.execute()
+
+    assert first.report['operations_file'] != second.report['operations_file']
+    # 上一次發布的記錄檔可能還在背景寫入歷史，下一次發布不會刪除
+    assert run_files() == sorted([first.report['operations_file'], second.report['operations_file']])
+
+
+def test_saved_run_file_is_removed_and_report_reads_history(streaming_engine):
+    result = streaming_engine.execute()
+    run_file = result.report['operations_file']
+    first_server, second_server = server_keys(streaming_engine)
+    files = result.report['servers'][first_server]['projects']['site']['files']
+    before = list(files.records())
+
+    run_id = streaming_engine.save_history_record(result.report, result.success)
+
+    assert run_id is not None
+    assert not os.path.exists(run_file)
+    assert [(f['operation'], f['path']) for f in files.records()] == [(f['operation'], f['path']) for f in before]
+    assert len(before) == 3
+    stored = streaming_engine.load_history_record(run_id)['servers'][second_server]['projects']['admin']['files']
+    assert sorted(f['path'] for f in stored) == ['page0.html', 'page1.html', 'page2.html']
+
+
+def test_history_save_reads_run_file_once(streaming_engine, monkeypatch):
+    result = streaming_engine.execute()
+    reads = count_reads(monkeypatch)
+
+    run_id = streaming_engine.save_history_record(result.report, result.success)
+
+    assert reads == [result.report['operations_file']]
+    record = streaming_engine.load_history_record(run_id)
+    counts = {(server_key, project_name): project_data['files'].count()
+              for server_key, server_data in record['servers'].items()
+              for project_name, project_data in server_data['projects'].items()}
+    assert counts == {(server, project): 3 for server in server_keys(streaming_engine) for project in ('site', 'admin')}
+
+
+def test_group_report_records_reads_run_file_once(streaming_engine, monkeypatch):
+    result = streaming_engine.execute()
+    expected = {(server_key, project_name): list(project_data['files'].records(('new', 'updated')))
+                for server_key, server_data in result.report['servers'].items()
+                for project_name, project_data in server_data['projects'].items()}
+    reads = count_reads(monkeypatch)
+
+    grouped = group_report_records(result.report, ('new', 'updated'))
+
+    assert reads == [result.report['operations_file']]
+    assert grouped == expected
+    assert all(len(records) == 3 for records in grouped.values())
+
+
+def test_run_file_being_saved_is_kept(streaming_engine):
+    first = streaming_engine.execute()
+    streaming_engine.execute()
+    stale = os.path.join(RUN_OPERATIONS_DIR, '20250101_000000_deadbeef.jsonl')
+    open(stale, 'w').close()
+    streaming_engine.saving_run_files.add(first.report['operations_file'])
+
+    third = streaming_engine.execute()
+
+    remaining = run_files()
+    assert first.report['operations_file'] in remaining
+    assert third.report['operations_file'] in remaining
+    assert stale not in remaining
+
+
+def test_history_saved_while_report_reads_run_file(streaming_engine, monkeypatch):
+    result = streaming_engine.execute()
+    run_file = result.report['operations_file']
+    expected = {(server_key, project_name): list(project_data['files'].records(('new',)))
+                for server_key, server_data in result.report['servers'].items()
+                for project_name, project_data in server_data['projects'].items()}
+    original = FileOperationRunFile.project_raw_records
+    saved = []
+
+    def project_raw_records(self, operations=None):
+        for index, item in enumerate(original(self, operations)):
+            yield item
+            if index == 0 and operations == ('new',) and not saved:
+                # 背景執行緒在報告讀到一半時寫入歷史
+                saved.append(streaming_engine.save_history_record(result.report, result.success))
+                assert os.path.exists(run_file)
+
+    monkeypatch.setattr(FileOperationRunFile, 'project_raw_records', project_raw_records)
+
+    grouped = group_report_records(result.report, ('new',))
+
+    assert saved and saved[0] is not None
+    assert grouped == expected
+    # 讀取結束後才刪除記錄檔，之後的報告改由資料庫讀取
+    assert not os.path.exists(run_file)
+    assert group_report_records(result.report, ('new',)) == expected
+
+
+def test_project_records_keep_run_file_until_read(streaming_engine):
+    result = streaming_engine.execute()
+    run_file = result.report['operations_file']
+    files = result.report['servers'][server_keys(streaming_engine)[0]]['projects']['site']['files']
+    records = files.records()
+    first = next(records)
+
+    streaming_engine.save_history_record(result.report, result.success)
+
+    assert os.path.exists(run_file)
+    paths = [first['path']] + [record['path'] for record in records]
+    assert sorted(paths) == ['page0.html', 'page1.html', 'page2.html']
+    assert not os.path.exists(run_file)
+    assert [record['path'] for record in files.records()] == paths
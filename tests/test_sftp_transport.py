@@ -0,0 +1,234 @@
+import os
+import re
+import socket
+import threading
+
+import pytest
+
+paramiko = pytest.importorskip('paramiko')
+
+from publish_engine import LocalDirectorySessionManager, SftpTransport  # noqa: E402
+
+
+class StubServer(paramiko.ServerInterface):
+    """只接受 deploy/secret 密碼登入的 SSH 伺服器，記錄收到的登入要求"""
+    def __init__(self):
+        self.auth_attempts = []
+
+    def get_allowed_auths(self, username):
+        return 'password'
+
+    def check_auth_password(self, username, password):
+        self.auth_attempts.append(username)
+        if (username, password) == ('deploy', 'secret'):
+            return paramiko.AUTH_SUCCESSFUL
+        return paramiko.AUTH_FAILED
+
+    def check_channel_request(self, kind, chanid):
+        if kind == 'session':
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+
+class LocalHandle(paramiko.SFTPHandle):
+    def stat(self):
+        try:
+            return paramiko.SFTPAttributes.from_stat(os.fstat(self.readfile.fileno()))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+    def chattr(self, attr):
+        try:
+            paramiko.SFTPServer.set_file_attr(self.filename, attr)
+            return paramiko.SFTP_OK
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+
+class LocalSFTPServer(paramiko.SFTPServerInterface):
+    """以本機目錄作為根目錄的 SFTP 子系統"""
+    def __init__(self, server, root, *args, **kwargs):
+        super().__init__(server, *args, **kwargs)
+        self.root = root
+
+    def _path(self, path):
+        return os.path.join(self.root, path.lstrip('/'))
+
+    def _call(self, operation, *args):
+        try:
+            operation(*args)
+            return paramiko.SFTP_OK
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+    def list_folder(self, path):
+        path = self._path(path)
+        try:
+            return [paramiko.SFTPAttributes.from_stat(os.stat(os.path.join(path, name)), name)
+                    for name in os.listdir(path)]
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+    def stat(self, path):
+        try:
+            return paramiko.SFTPAttributes.from_stat(os.stat(self._path(path)))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+    lstat = stat
+
+    def open(self, path, flags, attr):
+        path = self._path(path)
+        try:
+            fd = os.open(path, flags, 0o644)
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+        if flags & os.O_WRONLY:
+            mode = 'ab' if flags & os.O_APPEND else 'wb'
+        elif flags & os.O_RDWR:
+            mode = 'a+b' if flags & os.O_APPEND else 'r+b'
+        else:
+            mode = 'rb'
+        handle = LocalHandle(flags)
+        handle.filename = path
+        handle.readfile = handle.writefile = os.fdopen(fd, mode)
+        return handle
+
+    def remove(self, path):
+        return self._call(os.remove, self._path(path))
+
+    def rename(self, oldpath, newpath):
+        return self._call(os.rename, self._path(oldpath), self._path(newpath))
+
+    def posix_rename(self, oldpath, newpath):
+        return self._call(os.replace, self._path(oldpath), self._path(newpath))
+
+    def mkdir(self, path, attr):
+        return self._call(os.mkdir, self._path(path))
+
+    def rmdir(self, path):
+        return self._call(os.rmdir, self._path(path))
+
+    def chattr(self, path, attr):
+        return self._call(paramiko.SFTPServer.set_file_attr, self._path(path), attr)
+
+
+@pytest.fixture(scope='module')
+def host_key():
+    return paramiko.RSAKey.generate(1024)
+
+
+@pytest.fixture
+def sftp_server(tmp_path, host_key):
+    """在 socketpair 上啟動本機 SFTP 伺服器，回傳 (用戶端 socket, 伺服器介面, 遠端根目錄)"""
+    root = tmp_path / 'remote'
+    root.mkdir()
+    client_sock, server_sock = socket.socketpair()
+    server_transport = paramiko.Transport(server_sock)
+    server_transport.add_server_key(host_key)
+    server_transport.set_subsystem_handler('sftp', paramiko.SFTPServer, LocalSFTPServer, str(root))
+    stub = StubServer()
+    server_transport.start_server(threading.Event(), stub)
+    yield client_sock, stub, root
+    server_transport.close()
+    client_sock.close()
+
+
+def server_config(**options):
+    return dict({'ip': 'web01.example', 'path': '/www', 'username': 'deploy', 'password': 'secret',
+                 'transport': 'sftp'}, **options)
+
+
+def write_known_hosts(path, host, key):
+    path.write_text(f"{host} {key.get_name()} {key.get_base64()}\n")
+    return str(path)
+
+
+def test_configured_fingerprint_allows_transfer(sftp_server, host_key, tmp_path):
+    client_sock, stub, root = sftp_server
+    server = server_config(host_key_fingerprint=SftpTransport.fingerprint(host_key))
+    source = tmp_path / 'index.html'
+    source.write_bytes(b'<html>' * 1000)
+    os.utime(source, (1_700_000_000, 1_700_000_000))
+
+    transport, target, reused = LocalDirectorySessionManager(str(tmp_path)).open_transport(server, sock=client_sock)
+    try:
+        assert (target, reused) == ('/www', False)
+        transport.makedirs('/www/css', exist_ok=True)
+        copied, _ = transport.upload(str(source), '/www/index.html.tmp')
+        transport.replace('/www/index.html.tmp', '/www/index.html')
+
+        assert copied == 6000
+        assert (root / 'www' / 'index.html').read_bytes() == source.read_bytes()
+        listing = transport.list_directory('/www')
+        assert set(listing) == {'css', 'index.html'}
+        assert listing['css'].is_dir
+        assert listing['index.html'].size == 6000
+        assert transport.stat('/www/index.html').mtime == 1_700_000_000
+        assert transport.exists('/www/index.html')
+        transport.remove('/www/index.html')
+        assert not transport.exists('/www/index.html')
+    finally:
+        transport.close()
+    assert stub.auth_attempts == ['deploy']
+
+
+def test_fingerprint_without_prefix_is_accepted(sftp_server, host_key):
+    client_sock, _, _ = sftp_server
+    fingerprint = SftpTransport.fingerprint(host_key)[len('SHA256:'):] + '='
+
+    SftpTransport(server_config(host_key_fingerprint=fingerprint), sock=client_sock).close()
+
+
+def test_known_hosts_entry_allows_connection(sftp_server, host_key, tmp_path):
+    client_sock, stub, _ = sftp_server
+    known_hosts = write_known_hosts(tmp_path / 'known_hosts', 'web01.example', host_key)
+
+    transport = SftpTransport(server_config(), sock=client_sock, known_hosts_file=known_hosts)
+    try:
+        assert transport.list_directory('/www') == {}
+    finally:
+        transport.close()
+    assert stub.auth_attempts == ['deploy']
+
+
+def test_known_hosts_uses_port_in_host_name(sftp_server, host_key, tmp_path):
+    client_sock, _, _ = sftp_server
+    known_hosts = write_known_hosts(tmp_path / 'known_hosts', '[web01.example]:2222', host_key)
+
+    SftpTransport(server_config(port=2222), sock=client_sock, known_hosts_file=known_hosts).close()
+
+
+def test_mismatched_fingerprint_is_rejected_before_login(sftp_server):
+    client_sock, stub, _ = sftp_server
+    other_key = paramiko.RSAKey.generate(1024)
+
+    with pytest.raises(paramiko.SSHException, match='不符'):
+        SftpTransport(server_config(host_key_fingerprint=SftpTransport.fingerprint(other_key)), sock=client_sock)
+    assert stub.auth_attempts == []
+
+
+def test_mismatched_known_hosts_entry_is_rejected(sftp_server, tmp_path):
+    client_sock, stub, _ = sftp_server
+    known_hosts = write_known_hosts(tmp_path / 'known_hosts', 'web01.example', paramiko.RSAKey.generate(1024))
+
+    with pytest.raises(paramiko.SSHException, match='不符'):
+        SftpTransport(server_config(), sock=client_sock, known_hosts_file=known_hosts)
+    assert stub.auth_attempts == []
+
+
+def test_unknown_host_is_rejected(sftp_server, host_key, tmp_path):
+    client_sock, stub, _ = sftp_server
+    known_hosts = write_known_hosts(tmp_path / 'known_hosts', 'web02.example', host_key)
+
+    with pytest.raises(paramiko.SSHException, match=re.escape(SftpTransport.fingerprint(host_key))):
+        SftpTransport(server_config(), sock=client_sock, known_hosts_file=known_hosts)
+    assert stub.auth_attempts == []
+
+
+def test_missing_known_hosts_file_rejects_connection(sftp_server, tmp_path):
+    client_sock, stub, _ = sftp_server
+
+    with pytest.raises(paramiko.SSHException, match='已拒絕連線'):
+        SftpTransport(server_config(), sock=client_sock, known_hosts_file=str(tmp_path / 'missing'))
+    assert stub.auth_attempts == []
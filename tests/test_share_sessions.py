@@ -0,0 +1,158 @@
+import os
+import time
+
+import pytest
+
+from publish_engine import LocalDirectorySessionManager
+
+
+class RecordingSessionManager(LocalDirectorySessionManager):
+    """記錄中斷了哪些分享的本機目錄連線管理"""
+    def __init__(self, root, idle_seconds):
+        super().__init__(root, idle_seconds)
+        self.disconnected = []
+
+    def _disconnect(self, share):
+        self.disconnected.append(os.path.basename(os.path.dirname(share)))
+
+
+def server(ip, path='D:\\www'):
+    return {'ip': ip, 'path': path, 'username': 'deploy', 'password': 'secret'}
+
+
+def wait_until(condition, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return condition()
+
+
+@pytest.fixture
+def manager(tmp_path):
+    manager = RecordingSessionManager(str(tmp_path), idle_seconds=60)
+    yield manager
+    manager.close_all()
+
+
+def test_session_is_reused_while_idle(manager, tmp_path):
+    target, reused = manager.acquire(server('10.0.0.1'))
+    assert target == os.path.join(str(tmp_path), '10.0.0.1', 'D$', 'www')
+    assert reused is False
+    manager.release(server('10.0.0.1'))
+
+    # 同一分享的其他資料夾沿用同一個連線
+    _, reused = manager.acquire(server('10.0.0.1', 'D:\\api'))
+    assert reused is True
+    manager.release(server('10.0.0.1', 'D:\\api'))
+    assert manager.connect_count == 1
+    assert manager.disconnected == []
+
+
+def test_changed_credentials_reconnect(manager):
+    manager.acquire(server('10.0.0.1'))
+    manager.release(server('10.0.0.1'))
+
+    _, reused = manager.acquire(dict(server('10.0.0.1'), password='changed'))
+
+    assert reused is False
+    assert manager.connect_count == 2
+    assert manager.disconnected == ['10.0.0.1']
+    manager.release(server('10.0.0.1'))
+
+
+def test_idle_sessions_expire_with_single_reaper(tmp_path):
+    manager = RecordingSessionManager(str(tmp_path), idle_seconds=0.3)
+    for ip in ('10.0.0.1', '10.0.0.2', '10.0.0.3'):
+        manager.acquire(server(ip))
+    manager.release(server('10.0.0.1'))
+    reaper = manager.reaper
+    assert reaper is not None
+    time.sleep(0.15)
+    manager.release(server('10.0.0.2'))
+    # 多次釋放只使用同一個計時器
+    assert manager.reaper is reaper
+
+    assert wait_until(lambda: manager.disconnected == ['10.0.0.1'])
+    # 仍在保留期間的連線由同一個計時器稍後中斷，使用中的連線不受影響
+    assert wait_until(lambda: manager.disconnected == ['10.0.0.1', '10.0.0.2'])
+    assert wait_until(lambda: manager.reaper is None)
+    time.sleep(0.4)
+    assert manager.disconnected == ['10.0.0.1', '10.0.0.2']
+
+    manager.release(server('10.0.0.3'))
+    manager.close_all()
+    assert manager.disconnected == ['10.0.0.1', '10.0.0.2', '10.0.0.3']
+    assert manager.reaper is None
+
+
+def test_reacquired_session_is_kept(tmp_path):
+    manager = RecordingSessionManager(str(tmp_path), idle_seconds=0.2)
+    manager.acquire(server('10.0.0.1'))
+    manager.release(server('10.0.0.1'))
+    _, reused = manager.acquire(server('10.0.0.1'))
+    assert reused is True
+
+    time.sleep(0.4)
+    assert manager.disconnected == []
+    manager.release(server('10.0.0.1'))
+    assert wait_until(lambda: manager.disconnected == ['10.0.0.1'])
+
+
+def test_discard_drops_only_released_share(manager):
+    for ip in ('10.0.0.1', '10.0.0.2'):
+        manager.acquire(server(ip))
+        manager.release(server(ip))
+    manager.acquire(server('10.0.0.3'))
+
+    manager.acquire(server('10.0.0.1'))
+    manager.release(server('10.0.0.1'), discard=True)
+
+    assert manager.disconnected == ['10.0.0.1']
+    _, reused = manager.acquire(server('10.0.0.2'))
+    assert reused is True
+    manager.release(server('10.0.0.2'))
+    manager.release(server('10.0.0.3'))
+
+
+def test_discard_keeps_session_with_other_users(manager):
+    manager.acquire(server('10.0.0.1'))
+    manager.acquire(server('10.0.0.1', 'D:\\api'))
+
+    manager.release(server('10.0.0.1'), discard=True)
+
+    assert manager.disconnected == []
+    manager.release(server('10.0.0.1', 'D:\\api'), discard=True)
+    assert manager.disconnected == ['10.0.0.1']
+
+
+def test_failed_connect_does_not_drop_other_sessions(manager, monkeypatch):
+    manager.acquire(server('10.0.0.1'))
+    manager.release(server('10.0.0.1'))
+
+    def refuse(share, server):
+        raise OSError('access denied')
+
+    monkeypatch.setattr(manager, '_connect', refuse)
+    with pytest.raises(OSError):
+        manager.acquire(server('10.0.0.2'))
+
+    assert manager.disconnected == []
+    assert manager.sessions[manager._resolve(server('10.0.0.2'))[0]]['refs'] == 0
+    monkeypatch.undo()
+    _, reused = manager.acquire(server('10.0.0.1'))
+    assert reused is True
+    manager.release(server('10.0.0.1'))
+
+
+def test_zero_idle_seconds_disconnects_on_release(tmp_path):
+    manager = RecordingSessionManager(str(tmp_path), idle_seconds=0)
+    manager.acquire(server('10.0.0.1'))
+    manager.acquire(server('10.0.0.2'))
+    manager.release(server('10.0.0.1'))
+
+    assert manager.disconnected == ['10.0.0.1']
+    assert manager.reaper is None
+    manager.release(server('10.0.0.2'))
+    assert manager.disconnected == ['10.0.0.1', '10.0.0.2']
@@ -0,0 +1,83 @@
+import os
+
+import pytest
+
+from publish_engine import LocalTransport, PublishEngine
+
+
+def read_tree(root):
+    """回傳目錄中所有檔案的 {相對路徑: 內容}"""
+    tree = {}
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            with open(path, encoding='utf-8') as f:
+                tree[os.path.relpath(path, root).replace(os.sep, '/')] = f.read()
+    return tree
+
+
+def write_sources(source_dir, version):
+    for project in ('site', 'admin'):
+        for name in ('index.html', 'app.js'):
+            path = source_dir / project / name
+            path.write_text(f'{project} {name} {version}')
+            # 每個版本的修改時間相差 10 秒，以大小與修改時間比對時視為已變更
+            os.utime(path, (1_700_000_000 + version * 10, 1_700_000_000 + version * 10))
+
+
+@pytest.fixture
+def staged_engine(local_engine):
+    engine, source_dir, remote_root = local_engine
+    for project in ('site', 'admin'):
+        (source_dir / project).mkdir()
+    write_sources(source_dir, 1)
+    engine.config['source_files'] = [str(source_dir / 'site'), str(source_dir / 'admin')]
+    engine.config['publish_options']['staged_deploy'] = True
+    assert engine.execute().success
+    write_sources(source_dir, 2)
+    share = remote_root / '10.0.0.1' / 'D$'
+    return engine, share / 'www', share / 'www.publish' / 'staging'
+
+
+def test_live_tree_is_unchanged_until_switch(staged_engine, monkeypatch):
+    engine, live_root, staging_root = staged_engine
+    before = read_tree(live_root)
+    seen = {}
+    original = PublishEngine._switch_staged_files
+
+    def switch(self, context):
+        seen['live'] = read_tree(live_root)
+        seen['staging'] = read_tree(staging_root)
+        original(self, context)
+
+    monkeypatch.setattr(PublishEngine, '_switch_staged_files', switch)
+
+    result = engine.execute()
+
+    assert result.success, result.error
+    # 兩個專案都複製完成才切換，切換前網站目錄仍是舊版本
+    assert seen['live'] == before
+    assert sorted(seen['staging']) == ['admin/app.js', 'admin/index.html', 'site/app.js', 'site/index.html']
+    assert set(seen['staging'].values()) == {f'{p} {n} 2' for p in ('site', 'admin') for n in ('index.html', 'app.js')}
+    assert read_tree(live_root) == {path: content.replace(' 1', ' 2') for path, content in before.items()}
+    assert not staging_root.exists()
+
+
+def test_failed_copy_leaves_live_tree_untouched(staged_engine, monkeypatch):
+    engine, live_root, _ = staged_engine
+    engine.config['publish_options']['retry_attempts'] = 1
+    before = read_tree(live_root)
+    original = LocalTransport.upload
+
+    def upload(self, src_path, dst_path, throttle=None):
+        if os.path.basename(os.path.dirname(dst_path)) == 'admin' and dst_path.endswith('app.js'):
+            raise PermissionError('access denied')
+        return original(self, src_path, dst_path, throttle)
+
+    monkeypatch.setattr(LocalTransport, 'upload', upload)
+
+    result = engine.execute()
+
+    assert not result.success
+    # site 已複製到暫存目錄，但沒有切換
+    assert read_tree(live_root) == before
@@ -0,0 +1,58 @@
+import threading
+import time
+
+from publish_engine import TOKEN_BUCKET_BURST_SECONDS, TokenBucket
+
+
+def test_unlimited_bucket_does_not_wait():
+    bucket = TokenBucket(0)
+    start = time.monotonic()
+    for _ in range(1000):
+        bucket.consume(10 * 1024 * 1024)
+    assert time.monotonic() - start < 0.1
+
+
+def test_consume_waits_for_tokens():
+    rate = 200_000
+    bucket = TokenBucket(rate)
+    start = time.monotonic()
+    # 桶一開始是空的，取得 0.3 秒的量需要等待約 0.3 秒
+    bucket.consume(int(rate * 0.3))
+    elapsed = time.monotonic() - start
+    assert 0.25 <= elapsed < 1.0
+
+
+def test_tokens_accumulate_up_to_burst_capacity():
+    rate = 1_000_000
+    bucket = TokenBucket(rate)
+    time.sleep(TOKEN_BUCKET_BURST_SECONDS + 0.2)
+    # 閒置期間最多累積 TOKEN_BUCKET_BURST_SECONDS 秒的量，在容量內的請求立即取得
+    start = time.monotonic()
+    bucket.consume(int(rate * TOKEN_BUCKET_BURST_SECONDS * 0.9))
+    assert time.monotonic() - start < 0.05
+    assert bucket.tokens <= bucket.capacity
+
+
+def test_request_larger_than_capacity_is_borrowed():
+    rate = 100_000
+    bucket = TokenBucket(rate)
+    time.sleep(TOKEN_BUCKET_BURST_SECONDS + 0.1)
+    # 超過容量的請求在桶滿時即放行，之後的請求需等待預支的量補回
+    bucket.consume(int(rate * TOKEN_BUCKET_BURST_SECONDS * 3))
+    assert bucket.tokens < 0
+
+
+def test_set_rate_zero_releases_waiting_consumer():
+    bucket = TokenBucket(1000)
+    finished = threading.Event()
+
+    def consume():
+        bucket.consume(100_000)
+        finished.set()
+
+    thread = threading.Thread(target=consume, daemon=True)
+    thread.start()
+    time.sleep(0.1)
+    assert not finished.is_set()
+    bucket.set_rate(0)
+    assert finished.wait(2)